@@ -1,23 +1,115 @@
-from django.contrib import admin
-from .models import Doctor, Patient, Appointment
+from django.contrib import admin, messages
+from django.utils import timezone
+from .models import ArchivedAppointment, Doctor, Patient, Appointment, Notification
+from . import exports, search, triage
+
+
+class FullTextSearchMixin:
+    """Answer the changelist search box from the full-text index."""
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term.strip():
+            return queryset, False
+        return search.matching(queryset, search_term), False
+
+
+class ExportMixin:
+    """Changelist actions that stream the selected rows as CSV or XLSX."""
+
+    actions = ("export_csv", "export_xlsx")
+
+    def _export(self, request, queryset, fmt):
+        name = exports.for_model(self.model)
+        return exports.response(
+            request, queryset, fmt, f"{name}-{timezone.localdate():%Y%m%d}"
+        )
+
+    @admin.action(description="Export selected %(verbose_name_plural)s as CSV")
+    def export_csv(self, request, queryset):
+        return self._export(request, queryset, "csv")
+
+    @admin.action(description="Export selected %(verbose_name_plural)s as XLSX")
+    def export_xlsx(self, request, queryset):
+        return self._export(request, queryset, "xlsx")
 
 
 @admin.register(Doctor)
-class DoctorAdmin(admin.ModelAdmin):
+class DoctorAdmin(FullTextSearchMixin, admin.ModelAdmin):
     list_display = ("name", "specialty", "phone", "email")
+    search_fields = ("name", "specialty")
 
 
 @admin.register(Patient)
-class PatientAdmin(admin.ModelAdmin):
+class PatientAdmin(ExportMixin, FullTextSearchMixin, admin.ModelAdmin):
     list_display = ("name", "age", "gender", "doctor", "admitted_date")
+    search_fields = ("name", "phone", "address")
 
 
 @admin.register(Appointment)
-class AppointmentAdmin(admin.ModelAdmin):
+class AppointmentAdmin(ExportMixin, FullTextSearchMixin, admin.ModelAdmin):
     list_display = ("patient", "doctor", "requested_date", "status", "created_at")
     list_filter = ("status", "doctor", "requested_date")
     search_fields = ("patient__name", "doctor__name", "symptoms")
     readonly_fields = ("created_at", "updated_at")
+    actions = ("approve_selected", "reject_selected", *ExportMixin.actions)
 
     def get_queryset(self, request):
         return super().get_queryset(request).select_related("patient", "doctor")
+
+    def _triage(self, request, queryset, status):
+        result = triage.apply(queryset, status)
+        level = messages.WARNING if result.conflicts else messages.SUCCESS
+        self.message_user(request, result.summary(), level)
+
+    @admin.action(description="Approve selected pending appointments")
+    def approve_selected(self, request, queryset):
+        self._triage(request, queryset, "approved")
+
+    @admin.action(description="Reject selected pending appointments")
+    def reject_selected(self, request, queryset):
+        self._triage(request, queryset, "rejected")
+
+    def get_search_results(self, request, queryset, search_term):
+        matches, may_have_duplicates = super().get_search_results(
+            request, queryset, search_term
+        )
+        if matches is queryset:
+            return matches, may_have_duplicates
+        # Also find appointments by the patient's or doctor's name.
+        patients = search.matching(Patient.objects.all(), search_term)
+        doctors = search.matching(Doctor.objects.all(), search_term)
+        return (
+            matches
+            | queryset.filter(patient__in=patients)
+            | queryset.filter(doctor__in=doctors),
+            may_have_duplicates,
+        )
+
+
+@admin.register(Notification)
+class NotificationAdmin(admin.ModelAdmin):
+    list_display = (
+        "appointment",
+        "recipient",
+        "status",
+        "state",
+        "attempts",
+        "sent_at",
+    )
+    list_filter = ("state", "recipient", "status")
+    list_select_related = ("appointment__patient", "appointment__doctor")
+    readonly_fields = ("created_at", "sent_at")
+
+
+@admin.register(ArchivedAppointment)
+class ArchivedAppointmentAdmin(admin.ModelAdmin):
+    list_display = ("id", "patient", "doctor", "requested_date", "status")
+    list_filter = ("status", "archive_month")
+    list_select_related = ("patient", "doctor")
+    date_hierarchy = "archive_month"
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
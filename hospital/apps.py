@@ -1,6 +1,12 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class HospitalConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'hospital'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+
+        post_migrate.connect(signals.install_search, sender=self)
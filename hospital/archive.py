@@ -0,0 +1,118 @@
+"""
+Archival of finished appointments.
+
+Completed and rejected appointments that have not changed for
+``HOSPITAL_ARCHIVE_AFTER_DAYS`` are moved, with their ids, from Appointment
+to :class:`~hospital.models.ArchivedAppointment`. Each row records the month
+of its requested date, so the archive is indexed and browsed a month at a
+time. The move runs in batches of ``HOSPITAL_ARCHIVE_BATCH_SIZE``. Each batch
+is copied and deleted in its own transaction, so an interrupted run leaves
+every appointment in exactly one table and the next run carries on. The
+Appointment table then only holds recent appointments and the ones still
+in play.
+
+Nothing that is still shown is lost:
+- Patient history reads both tables through
+  ``Appointment.objects.full_history_for_patient()``.
+- The daily rollups recompute a day from both tables.
+- Appointments with an undelivered notification stay until it is sent.
+- A change the rollups have not picked up yet keeps its row live.
+"""
+
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from . import reporting
+from .models import Appointment, ArchivedAppointment, ReportWatermark
+
+FINISHED = ("completed", "rejected")
+DEFAULT_AFTER_DAYS = 180
+DEFAULT_BATCH_SIZE = 1000
+
+
+def after_days():
+    return getattr(settings, "HOSPITAL_ARCHIVE_AFTER_DAYS", DEFAULT_AFTER_DAYS)
+
+
+def batch_size():
+    return getattr(settings, "HOSPITAL_ARCHIVE_BATCH_SIZE", DEFAULT_BATCH_SIZE)
+
+
+def cutoff(now=None, days=None):
+    """Finished appointments last changed before this are archived."""
+    if days is None:
+        days = after_days()
+    cutoff = (now or timezone.now()) - timedelta(days=days)
+    watermark = (
+        ReportWatermark.objects.filter(name=reporting.WATERMARK)
+        .values_list("value", flat=True)
+        .first()
+    )
+    # Rollups find changed days through Appointment.updated_at, so a change
+    # they have not seen yet must not leave the table.
+    if watermark is not None:
+        cutoff = min(cutoff, watermark)
+    return cutoff
+
+
+def candidates(before):
+    return Appointment.objects.filter(
+        status__in=FINISHED, updated_at__lt=before
+    ).exclude(notifications__state="pending")
+
+
+def month_of(value):
+    return timezone.localtime(value).date().replace(day=1)
+
+
+def archive_batch(before, size):
+    """Move up to ``size`` appointments; return a Counter of moved statuses."""
+    with transaction.atomic():
+        appointments = list(
+            candidates(before).select_for_update().order_by("pk")[:size]
+        )
+        if not appointments:
+            return Counter()
+        ArchivedAppointment.objects.bulk_create(
+            [
+                ArchivedAppointment(
+                    id=appointment.pk,
+                    patient_id=appointment.patient_id,
+                    doctor_id=appointment.doctor_id,
+                    requested_date=appointment.requested_date,
+                    symptoms=appointment.symptoms,
+                    status=appointment.status,
+                    receptionist_notes=appointment.receptionist_notes,
+                    doctor_notes=appointment.doctor_notes,
+                    created_at=appointment.created_at,
+                    updated_at=appointment.updated_at,
+                    archive_month=month_of(appointment.requested_date),
+                )
+                for appointment in appointments
+            ]
+        )
+        # A real delete, so the counters drop and delivered notifications
+        # go with their appointment.
+        Appointment.objects.filter(
+            pk__in=[appointment.pk for appointment in appointments]
+        ).delete()
+    return Counter(appointment.status for appointment in appointments)
+
+
+def archive(before=None, size=None):
+    """
+    Archive every finished appointment last changed before ``before``
+    (default: :func:`cutoff`). Returns a Counter of statuses moved.
+    """
+    before = before or cutoff()
+    size = size or batch_size()
+    moved = Counter()
+    while True:
+        batch = archive_batch(before, size)
+        moved += batch
+        if sum(batch.values()) < size:
+            return moved
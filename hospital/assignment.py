@@ -0,0 +1,282 @@
+"""
+Doctor workload and automatic patient assignment.
+
+A doctor's load is the number of patients assigned to them plus their
+upcoming approved appointments. Loads are kept in the cache the way the
+counters are (see hospital/counters.py): one value per doctor and a roster
+of doctor id -> specialty, computed with three queries and then adjusted
+from the model signals. The whole set expires after
+``HOSPITAL_ASSIGNMENT_LOAD_SECONDS`` so appointments that have since taken
+place stop counting.
+
+:class:`LoadTable` arranges a snapshot as one min-heap of (load, doctor id)
+per specialty. :func:`suggest` names the least-loaded doctor of a specialty
+for a new patient, and :func:`rebalance` moves patients from the busiest
+doctors of a specialty to the least busy until their loads are within a
+tolerance of each other.
+"""
+
+import heapq
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Exists, OuterRef
+from django.utils import timezone
+
+from . import fragments
+from .models import Appointment, Doctor, Patient
+
+KEY_PREFIX = "hospital:load:"
+ROSTER_KEY = "hospital:load-roster"
+DEFAULT_LOAD_SECONDS = 300
+
+
+def load_seconds():
+    return getattr(settings, "HOSPITAL_ASSIGNMENT_LOAD_SECONDS", DEFAULT_LOAD_SECONDS)
+
+
+def specialty_key(specialty):
+    """Specialties are matched case-insensitively, as in scheduling."""
+    return specialty.strip().casefold()
+
+
+def counts_toward_load(status, requested_date, now=None):
+    return status == "approved" and requested_date >= (now or timezone.now())
+
+
+def _load_from_db(now=None):
+    now = now or timezone.now()
+    roster = dict(Doctor.objects.order_by().values_list("pk", "specialty"))
+    loads = dict.fromkeys(roster, 0)
+    patients = (
+        Patient.objects.filter(doctor__isnull=False)
+        .order_by()
+        .values_list("doctor_id")
+        .annotate(n=Count("id"))
+    )
+    upcoming = (
+        Appointment.objects.filter(status="approved", requested_date__gte=now)
+        .order_by()
+        .values_list("doctor_id")
+        .annotate(n=Count("id"))
+    )
+    for rows in (patients, upcoming):
+        for doctor_id, n in rows:
+            loads[doctor_id] += n
+    return roster, loads
+
+
+def rebuild():
+    """Recompute every load from the database and store the result."""
+    roster, loads = _load_from_db()
+    timeout = load_seconds()
+    cache.set_many({KEY_PREFIX + str(pk): n for pk, n in loads.items()}, timeout)
+    # Stored last: a reader that finds the roster finds the loads too.
+    cache.set(ROSTER_KEY, roster, timeout)
+    return roster, loads
+
+
+def snapshot():
+    """Return (roster, loads), recomputing only if the cache has lost any."""
+    roster = cache.get(ROSTER_KEY)
+    if roster is not None:
+        keys = [KEY_PREFIX + str(pk) for pk in roster]
+        cached = cache.get_many(keys)
+        if len(cached) == len(keys):
+            return roster, {pk: cached[KEY_PREFIX + str(pk)] for pk in roster}
+    return rebuild()
+
+
+def invalidate():
+    cache.delete(ROSTER_KEY)
+
+
+def _apply(deltas):
+    for pk, delta in deltas.items():
+        try:
+            cache.incr(KEY_PREFIX + str(pk), delta)
+        except ValueError:
+            # Evicted or never built: the next read recomputes them all.
+            invalidate()
+            return
+
+
+def adjust(deltas):
+    """
+    Apply ``deltas`` (doctor id -> change in load) once the current
+    transaction commits.
+    """
+    deltas = {pk: delta for pk, delta in deltas.items() if pk is not None and delta}
+    if deltas:
+        transaction.on_commit(lambda: _apply(deltas))
+
+
+def appointment_deltas(appointment, previous_status, previous_doctor_id):
+    """Load changes for a saved appointment whose earlier state is known."""
+    deltas = defaultdict(int)
+    if counts_toward_load(previous_status, appointment.requested_date):
+        deltas[previous_doctor_id or appointment.doctor_id] -= 1
+    if counts_toward_load(appointment.status, appointment.requested_date):
+        deltas[appointment.doctor_id] += 1
+    return deltas
+
+
+class LoadTable:
+    """Doctor loads with a min-heap of (load, doctor id) per specialty."""
+
+    def __init__(self, roster, loads):
+        self.roster = roster
+        self.loads = dict(loads)
+        self.names = {}
+        self._heaps = defaultdict(list)
+        for pk, specialty in roster.items():
+            key = specialty_key(specialty)
+            self.names.setdefault(key, specialty.strip())
+            # None holds every doctor, for patients with no specialty given.
+            for heap_key in (key, None):
+                self._heaps[heap_key].append((self.loads[pk], pk))
+        for heap in self._heaps.values():
+            heapq.heapify(heap)
+
+    @classmethod
+    def current(cls):
+        return cls(*snapshot())
+
+    def specialties(self):
+        """Specialty keys, in order."""
+        return sorted(key for key in self._heaps if key is not None)
+
+    def doctors(self, key):
+        return [
+            pk
+            for pk, specialty in self.roster.items()
+            if specialty_key(specialty) == key
+        ]
+
+    def least_loaded(self, key=None):
+        """The doctor id with the lowest load for specialty ``key``, or None."""
+        heap = self._heaps.get(key, [])
+        while heap:
+            load, pk = heap[0]
+            if self.loads[pk] == load:
+                return pk
+            # Superseded by a later push for the same doctor.
+            heapq.heappop(heap)
+        return None
+
+    def add(self, pk, delta=1):
+        self.loads[pk] += delta
+        for heap_key in (specialty_key(self.roster[pk]), None):
+            heapq.heappush(self._heaps[heap_key], (self.loads[pk], pk))
+
+    def spread(self, key):
+        """Highest minus lowest load among the doctors of ``key``."""
+        loads = [self.loads[pk] for pk in self.doctors(key)]
+        return max(loads) - min(loads) if loads else 0
+
+
+def suggest(specialty=""):
+    """The least-loaded Doctor of ``specialty`` (any, if blank), or None."""
+    table = LoadTable.current()
+    key = specialty_key(specialty) if specialty else None
+    pk = table.least_loaded(key)
+    return Doctor.objects.filter(pk=pk).first() if pk is not None else None
+
+
+def suggestions():
+    """[(specialty, Doctor, load)] for the least-loaded doctor of each specialty."""
+    table = LoadTable.current()
+    picks = [(key, table.least_loaded(key)) for key in table.specialties()]
+    doctors = Doctor.objects.in_bulk([pk for _, pk in picks])
+    return [
+        (table.names[key], doctors[pk], table.loads[pk])
+        for key, pk in picks
+        if pk in doctors
+    ]
+
+
+def _movable(doctor_ids, now):
+    """Patients of ``doctor_ids`` with no upcoming approved appointment with them."""
+    booked = Appointment.objects.filter(
+        patient=OuterRef("pk"),
+        doctor=OuterRef("doctor"),
+        status="approved",
+        requested_date__gte=now,
+    )
+    movable = defaultdict(list)
+    rows = (
+        Patient.objects.filter(doctor__in=doctor_ids)
+        .exclude(Exists(booked))
+        .order_by("pk")
+        .values_list("pk", "doctor_id")
+    )
+    for pk, doctor_id in rows:
+        movable[doctor_id].append(pk)
+    return movable
+
+
+def plan(table, key, tolerance, movable):
+    """
+    Moves, as (patient id, from doctor id, to doctor id), bringing the loads
+    of specialty ``key`` within ``tolerance`` of each other. Patients are
+    taken newest first; ``table`` is updated as it goes.
+    """
+    moves = []
+    donors = [(-table.loads[pk], pk) for pk in table.doctors(key) if movable[pk]]
+    heapq.heapify(donors)
+    while donors:
+        load, high = heapq.heappop(donors)
+        if -load != table.loads[high]:
+            continue
+        low = table.least_loaded(key)
+        if table.loads[high] - table.loads[low] <= tolerance:
+            break
+        moves.append((movable[high].pop(), high, low))
+        table.add(high, -1)
+        table.add(low, 1)
+        if movable[high]:
+            heapq.heappush(donors, (-table.loads[high], high))
+    return moves
+
+
+def rebalance(specialty="", tolerance=1, dry_run=False):
+    """
+    Reassign patients so that, within each specialty (or just
+    ``specialty``), no doctor's load exceeds another's by more than
+    ``tolerance``. Patients with an upcoming approved appointment stay with
+    that doctor. Returns (moves, LoadTable before, LoadTable after).
+    """
+    if tolerance < 1:
+        raise ValueError("The tolerance must be at least 1.")
+    now = timezone.now()
+    roster, loads = _load_from_db(now)
+    before, after = LoadTable(roster, loads), LoadTable(roster, loads)
+    keys = [specialty_key(specialty)] if specialty else after.specialties()
+    movable = _movable([pk for key in keys for pk in after.doctors(key)], now)
+    moves = [move for key in keys for move in plan(after, key, tolerance, movable)]
+    if moves and not dry_run:
+        _apply_moves(moves)
+    return moves, before, after
+
+
+def _apply_moves(moves):
+    by_pair = defaultdict(list)
+    deltas = defaultdict(int)
+    for patient, old, new in moves:
+        by_pair[old, new].append(patient)
+        deltas[old] -= 1
+        deltas[new] += 1
+    with transaction.atomic():
+        # An UPDATE per pair of doctors; patients reassigned meanwhile stay.
+        for (old, new), patients in by_pair.items():
+            Patient.objects.filter(pk__in=patients, doctor_id=old).update(doctor_id=new)
+        # The UPDATE bypasses the signals, so do their work here.
+        transaction.on_commit(invalidate)
+        transaction.on_commit(
+            lambda: (
+                fragments.bump("doctor", *deltas),
+                fragments.bump("patient", *(patient for patient, _, _ in moves)),
+            )
+        )
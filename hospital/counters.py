@@ -0,0 +1,135 @@
+"""
+Row counts for the landing page and dashboards, kept in the cache.
+
+Counts are computed once (on first read or by ``rebuild_counters``) and then
+maintained incrementally from model signals, so reading them never touches
+the database. Anything that bypasses signals (``QuerySet.update``, raw SQL,
+``bulk_create``) must call :func:`invalidate` or :func:`rebuild`; the next
+read then recounts.
+
+When the cache is local memory, each process keeps its own counts and only
+sees its own changes. Counts therefore expire after
+``HOSPITAL_COUNTER_TIMEOUT`` seconds and are recounted, which bounds how far
+a web worker can drift from what commands and other workers changed.
+"""
+
+import asyncio
+
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from django.db.models import Count
+
+from .models import Appointment, Doctor, Patient
+
+KEY_PREFIX = "hospital:counter:"
+DOCTORS = "doctors"
+PATIENTS = "patients"
+DEFAULT_TIMEOUT = 60
+
+LOCAL_CACHE_WARNING = (
+    "The default cache is local to this process: running web workers keep "
+    "their own counts until they expire (HOSPITAL_COUNTER_TIMEOUT). Set "
+    "HOSPITAL_CACHE_BACKEND to a shared cache to update them at once."
+)
+
+
+def timeout():
+    return getattr(settings, "HOSPITAL_COUNTER_TIMEOUT", DEFAULT_TIMEOUT)
+
+
+def process_local():
+    """Whether the counters live in a cache no other process can see."""
+    return isinstance(caches[DEFAULT_CACHE_ALIAS], (LocMemCache, DummyCache))
+
+
+def appointment_key(status):
+    return f"appointments:{status}"
+
+
+def all_keys():
+    return [DOCTORS, PATIENTS] + [
+        appointment_key(status) for status, _ in Appointment.STATUS_CHOICES
+    ]
+
+
+def _count_from_db():
+    counts = dict.fromkeys(all_keys(), 0)
+    counts[DOCTORS] = Doctor.objects.count()
+    counts[PATIENTS] = Patient.objects.count()
+    rows = Appointment.objects.order_by().values_list("status").annotate(n=Count("id"))
+    for status, n in rows:
+        counts[appointment_key(status)] = n
+    return counts
+
+
+async def _acount_from_db():
+    async def by_status():
+        rows = (
+            Appointment.objects.order_by().values_list("status").annotate(n=Count("id"))
+        )
+        return [row async for row in rows]
+
+    doctors, patients, rows = await asyncio.gather(
+        Doctor.objects.acount(), Patient.objects.acount(), by_status()
+    )
+    counts = dict.fromkeys(all_keys(), 0)
+    counts[DOCTORS] = doctors
+    counts[PATIENTS] = patients
+    for status, n in rows:
+        counts[appointment_key(status)] = n
+    return counts
+
+
+def rebuild():
+    """Recount every counter from the database and store the result."""
+    counts = _count_from_db()
+    cache.set_many({KEY_PREFIX + k: v for k, v in counts.items()}, timeout())
+    return counts
+
+
+def invalidate():
+    cache.delete_many([KEY_PREFIX + k for k in all_keys()])
+
+
+def get_counts():
+    """Return every counter, recounting only if the cache has lost any of them."""
+    keys = all_keys()
+    cached = cache.get_many([KEY_PREFIX + k for k in keys])
+    if len(cached) != len(keys):
+        return rebuild()
+    return {k: cached[KEY_PREFIX + k] for k in keys}
+
+
+async def aget_counts():
+    """get_counts() for async views; a recount runs its queries concurrently."""
+    keys = all_keys()
+    cached = await cache.aget_many([KEY_PREFIX + k for k in keys])
+    if len(cached) != len(keys):
+        counts = await _acount_from_db()
+        await cache.aset_many({KEY_PREFIX + k: v for k, v in counts.items()}, timeout())
+        return counts
+    return {k: cached[KEY_PREFIX + k] for k in keys}
+
+
+def _apply(deltas):
+    for name, delta in deltas.items():
+        if not delta:
+            continue
+        try:
+            cache.incr(KEY_PREFIX + name, delta)
+        except ValueError:
+            # Counter was evicted or never built: drop the rest so the next
+            # read rebuilds a consistent set.
+            invalidate()
+            return
+
+
+def adjust(deltas):
+    """
+    Apply ``deltas`` (a dict of counter name -> change) once the current
+    transaction commits, so rolled-back writes never reach the counters.
+    """
+    transaction.on_commit(lambda: _apply(deltas))
@@ -0,0 +1,106 @@
+"""
+In-process publish/subscribe for appointment changes.
+
+Model signals publish small event dicts after the transaction commits; async
+subscribers (the receptionist SSE stream) receive them on their own event
+loop. :class:`LocalBroker` keeps everything in this process and replays a
+short backlog to clients reconnecting with ``Last-Event-ID``. A deployment
+running several processes can point ``HOSPITAL_EVENT_BROKER`` at a class with
+the same ``publish``/``subscribe`` interface backed by Redis or Postgres
+LISTEN/NOTIFY.
+"""
+
+import asyncio
+import itertools
+import threading
+from collections import deque
+from functools import lru_cache
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+DEFAULT_BROKER = "hospital.events.LocalBroker"
+BACKLOG = 1000
+QUEUE_SIZE = 100
+
+
+class Subscription:
+    def __init__(self, broker, loop):
+        self.broker = broker
+        self.loop = loop
+        self.queue = asyncio.Queue(QUEUE_SIZE)
+        self.overflowed = False
+
+    def deliver(self, event):
+        # Runs on the subscriber's loop.
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # A stalled client; make it reconnect and resync via the backlog.
+            self.overflowed = True
+
+    async def get(self, timeout):
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class LocalBroker:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._backlog = deque(maxlen=BACKLOG)
+        self._subscribers = set()
+
+    def publish(self, event):
+        """Stamp ``event`` with an id and hand it to every subscriber."""
+        with self._lock:
+            event = dict(event, id=next(self._ids))
+            self._backlog.append(event)
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.deliver, event)
+            except RuntimeError:
+                # The subscriber's loop has shut down.
+                self.unsubscribe(subscription)
+        return event
+
+    def subscribe(self, last_event_id=None):
+        """
+        Register the running event loop for future events. Returns the
+        subscription and any backlog events newer than ``last_event_id``.
+        """
+        subscription = Subscription(self, asyncio.get_running_loop())
+        with self._lock:
+            self._subscribers.add(subscription)
+            missed = []
+            if last_event_id is not None:
+                missed = [e for e in self._backlog if e["id"] > last_event_id]
+        return subscription, missed
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+
+@lru_cache(maxsize=None)
+def get_broker():
+    return import_string(getattr(settings, "HOSPITAL_EVENT_BROKER", DEFAULT_BROKER))()
+
+
+def appointment_event(kind, appointment, previous=None):
+    return {
+        "type": kind,
+        "appointment": {
+            "id": appointment.pk,
+            "patient": appointment.patient.name,
+            "doctor": appointment.doctor.name,
+            "specialty": appointment.doctor.specialty,
+            "requested_date": appointment.requested_date.isoformat(),
+            "status": appointment.status,
+            "status_display": appointment.get_status_display(),
+            "previous_status": previous,
+        },
+    }
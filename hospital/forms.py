@@ -1,7 +1,11 @@
+from datetime import datetime, time, timedelta
+
 from django import forms
 from django.contrib.auth.forms import AuthenticationForm
 from django.contrib.auth.models import User
+from django.utils import timezone
 from .models import Doctor, Patient, Appointment
+from . import assignment, scheduling, triage
 
 
 class DoctorLoginForm(AuthenticationForm):
@@ -171,6 +175,37 @@ class PatientForm(forms.ModelForm):
         return patient
 
 
+class PatientCreateForm(PatientForm):
+    """
+    PatientForm for the Add Patient page: with no doctor
+    chosen, the least-loaded doctor of the chosen specialty is assigned.
+    """
+
+    specialty = forms.ChoiceField(
+        required=False,
+        help_text="With no doctor chosen, the least-loaded doctor of this "
+        "specialty (or of any, if blank) is assigned.",
+    )
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields["doctor"].empty_label = "Assign automatically"
+        table = assignment.LoadTable.current()
+        # Doctors with no specialty are reached through "Any".
+        self.fields["specialty"].choices = [("", "Any")] + [
+            (table.names[key], table.names[key]) for key in table.specialties() if key
+        ]
+
+    def clean(self):
+        cleaned = super().clean()
+        if not cleaned.get("doctor") and "doctor" not in self.errors:
+            specialty = cleaned.get("specialty", "")
+            cleaned["doctor"] = assignment.suggest(specialty)
+            if cleaned["doctor"] is None and specialty:
+                self.add_error("specialty", "No doctor has this specialty.")
+        return cleaned
+
+
 class AppointmentRequestForm(forms.ModelForm):
     requested_date = forms.DateTimeField(
         widget=forms.DateTimeInput(attrs={"type": "datetime-local"}),
@@ -189,6 +224,15 @@ class AppointmentRequestForm(forms.ModelForm):
             ),
         }
 
+    def clean_requested_date(self):
+        requested_date = self.cleaned_data["requested_date"]
+        if scheduling.slot_of(requested_date) is None:
+            start, end = scheduling.working_hours()
+            raise forms.ValidationError(
+                f"Please choose a weekday time between {start}:00 and {end}:00."
+            )
+        return requested_date
+
 
 class AppointmentApprovalForm(forms.ModelForm):
     class Meta:
@@ -199,3 +243,130 @@ class AppointmentApprovalForm(forms.ModelForm):
                 attrs={"rows": 3, "placeholder": "Add notes for the doctor..."}
             ),
         }
+
+    def clean(self):
+        cleaned = super().clean()
+        if cleaned.get("status") == "approved":
+            conflict = scheduling.conflicting_appointment(self.instance)
+            if conflict is not None:
+                suggestions = ", ".join(
+                    timezone.localtime(start).strftime("%b %d, %Y %I:%M %p")
+                    for start in scheduling.suggest_slots(self.instance)
+                )
+                message = "Dr. %s already has an approved appointment in this slot." % (
+                    self.instance.doctor.name
+                )
+                if suggestions:
+                    message += f" Free slots: {suggestions}."
+                self.add_error("status", message)
+        return cleaned
+
+
+class BulkTriageForm(forms.Form):
+    STATUS_CHOICES = (("approved", "Approve"), ("rejected", "Reject"))
+
+    appointments = forms.ModelMultipleChoiceField(
+        queryset=Appointment.objects.all(),
+        error_messages={"required": "Select at least one appointment."},
+    )
+    status = forms.ChoiceField(
+        choices=STATUS_CHOICES, widget=forms.Select(attrs={"class": "form-control"})
+    )
+    receptionist_notes = forms.CharField(
+        required=False,
+        widget=forms.Textarea(
+            attrs={"rows": 2, "placeholder": "Notes for every selected appointment..."}
+        ),
+    )
+
+    def clean_appointments(self):
+        appointments = self.cleaned_data["appointments"]
+        limit = triage.batch_size()
+        if len(appointments) > limit:
+            raise forms.ValidationError(
+                f"Select at most {limit} appointments at a time."
+            )
+        return appointments
+
+
+class DateWindowForm(forms.Form):
+    WINDOW_CHOICES = (
+        ("today", "Today"),
+        ("week", "This week"),
+        ("range", "Custom range"),
+    )
+
+    window = forms.ChoiceField(
+        choices=WINDOW_CHOICES,
+        required=False,
+        widget=forms.Select(attrs={"class": "form-control"}),
+    )
+    start = forms.DateField(
+        required=False, widget=forms.DateInput(attrs={"type": "date"})
+    )
+    end = forms.DateField(
+        required=False, widget=forms.DateInput(attrs={"type": "date"})
+    )
+
+    def clean(self):
+        cleaned = super().clean()
+        if cleaned.get("window") == "range":
+            start, end = cleaned.get("start"), cleaned.get("end")
+            if not start or not end:
+                self.add_error("start", "Choose both a start and an end date.")
+            elif end < start:
+                self.add_error("end", "End date must not be before the start date.")
+        return cleaned
+
+    def bounds(self):
+        """Return the selected [start, end) as aware datetimes (default: this week)."""
+        today = timezone.localdate()
+        window = self.cleaned_data.get("window") if self.is_valid() else None
+        if window == "today":
+            first, last = today, today
+        elif window == "range":
+            first, last = self.cleaned_data["start"], self.cleaned_data["end"]
+        else:
+            first = today - timedelta(days=today.weekday())
+            last = first + timedelta(days=6)
+        return (
+            timezone.make_aware(datetime.combine(first, time.min)),
+            timezone.make_aware(datetime.combine(last + timedelta(days=1), time.min)),
+        )
+
+
+class ReportRangeForm(forms.Form):
+    start = forms.DateField(
+        required=False, widget=forms.DateInput(attrs={"type": "date"})
+    )
+    end = forms.DateField(
+        required=False, widget=forms.DateInput(attrs={"type": "date"})
+    )
+
+    DEFAULT_DAYS = 30
+
+    def clean(self):
+        cleaned = super().clean()
+        start, end = cleaned.get("start"), cleaned.get("end")
+        if start and end and end < start:
+            self.add_error("end", "End date must not be before the start date.")
+        return cleaned
+
+    def days(self):
+        """Return the selected (first, last) days (default: the last 30 days)."""
+        today = timezone.localdate()
+        data = self.cleaned_data if self.is_valid() else {}
+        last = data.get("end") or today
+        first = data.get("start") or last - timedelta(days=self.DEFAULT_DAYS - 1)
+        return first, last
+
+
+class RosterDayForm(forms.Form):
+    date = forms.DateField(
+        required=False, widget=forms.DateInput(attrs={"type": "date"})
+    )
+
+    def day(self):
+        """The selected day (default: today)."""
+        data = self.cleaned_data if self.is_valid() else {}
+        return data.get("date") or timezone.localdate()
@@ -0,0 +1,73 @@
+"""
+Version numbers for cached dashboard fragments.
+
+Each doctor and patient has a version kept in the cache. Dashboard templates
+include it in their ``{% cache %}`` keys, and signal handlers bump it
+whenever something shown on that dashboard changes. A stale fragment is
+therefore never looked up again and simply expires.
+
+The fragments themselves may sit in a cache private to each web worker, but
+the versions must not: they live in the "versions" cache, which every
+process shares (a database table unless a shared backend is configured; see
+hospitalmngmt/caches.py), so a bump from a management command or another
+worker reaches every dashboard.
+"""
+
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+KEY_PREFIX = "hospital:fragment-version:"
+DEFAULT_TIMEOUT = 3600
+CACHE_ALIAS = "versions"
+
+
+def timeout():
+    return getattr(settings, "HOSPITAL_FRAGMENT_CACHE_TIMEOUT", DEFAULT_TIMEOUT)
+
+
+def _key(kind, pk):
+    return f"{KEY_PREFIX}{kind}:{pk}"
+
+
+def _fresh():
+    # Seeded from the clock rather than 1 so that a version evicted from the
+    # cache can never come back as a number an old fragment was stored under.
+    return time.time_ns()
+
+
+def version(kind, pk):
+    """Return the current fragment version of a doctor or patient."""
+    cache = caches[CACHE_ALIAS]
+    key = _key(kind, pk)
+    current = cache.get(key)
+    if current is None:
+        current = _fresh()
+        # add() so that concurrent first requests agree on one version.
+        if not cache.add(key, current, timeout=None):
+            current = cache.get(key, current)
+    return current
+
+
+async def aversion(kind, pk):
+    cache = caches[CACHE_ALIAS]
+    key = _key(kind, pk)
+    current = await cache.aget(key)
+    if current is None:
+        current = _fresh()
+        if not await cache.aadd(key, current, timeout=None):
+            current = await cache.aget(key, current)
+    return current
+
+
+def bump(kind, *pks):
+    """Invalidate every cached fragment of the given doctors or patients."""
+    cache = caches[CACHE_ALIAS]
+    for pk in pks:
+        if pk is None:
+            continue
+        try:
+            cache.incr(_key(kind, pk))
+        except ValueError:
+            cache.set(_key(kind, pk), _fresh(), timeout=None)
@@ -0,0 +1,203 @@
+"""
+Per-request SQL instrumentation.
+
+:class:`QueryInstrumentationMiddleware` gives each request a
+:class:`QueryRecorder`. It reports the query count and database time in a
+``Server-Timing`` header, feeds a rolling per-view histogram (:data:`stats`)
+and logs a warning when a view exceeds its query budget, listing duplicated
+statements and the slowest ones.
+
+Every connection carries :func:`record_query` as an execute wrapper (see
+:func:`install`), which times statements for the recorder in the current
+context. The recorder lives in a context variable rather than on the
+connections because async views run their queries through ``sync_to_async``,
+on a worker thread with its own connections; the context follows them there.
+"""
+
+import logging
+import re
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+logger = logging.getLogger("hospital.queries")
+
+DEFAULT_QUERY_BUDGET = 20
+DEFAULT_WINDOW = 500
+SLOWEST = 3
+# Requests that resolve to no view (404s) share one set of samples; keyed by
+# path, a scan of made-up URLs would add a window of samples per URL.
+UNRESOLVED = "<unresolved>"
+
+# Bucket upper bounds for the histograms; the last bucket is open-ended.
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100)
+TIME_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 1000)
+
+_IN_LIST = re.compile(r"IN \((?:%s, )*%s\)")
+_NUMBER = re.compile(r"\b\d+\b")
+
+
+def fingerprint(sql):
+    """Collapse parameters and IN lists so repeats of one statement match."""
+    return _NUMBER.sub("N", _IN_LIST.sub("IN (...)", sql))
+
+
+class QueryRecorder:
+    """``execute_wrapper`` that times each statement."""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, time.perf_counter() - started))
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    @property
+    def duration(self):
+        return sum(d for _, d in self.queries)
+
+    def duplicates(self):
+        counts = Counter(fingerprint(sql) for sql, _ in self.queries)
+        return {sql: n for sql, n in counts.items() if n > 1}
+
+    def slowest(self, n=SLOWEST):
+        return sorted(self.queries, key=lambda q: q[1], reverse=True)[:n]
+
+
+_recorder = ContextVar("hospital_query_recorder", default=None)
+
+
+def record_query(execute, sql, params, many, context):
+    recorder = _recorder.get()
+    if recorder is None:
+        return execute(sql, params, many, context)
+    return recorder(execute, sql, params, many, context)
+
+
+def install(connection):
+    """Add :func:`record_query` to ``connection``'s execute wrappers."""
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def _bucket(value, bounds):
+    for bound in bounds:
+        if value <= bound:
+            return f"<={bound}"
+    return f">{bounds[-1]}"
+
+
+class QueryStats:
+    """Rolling window of (query count, db ms) samples per view, thread-safe."""
+
+    def __init__(self, window=None):
+        self.window = window or getattr(
+            settings, "HOSPITAL_QUERY_STATS_WINDOW", DEFAULT_WINDOW
+        )
+        self._lock = threading.Lock()
+        self._samples = defaultdict(lambda: deque(maxlen=self.window))
+
+    def record(self, view, count, db_ms):
+        with self._lock:
+            self._samples[view].append((count, db_ms))
+
+    def reset(self):
+        with self._lock:
+            self._samples.clear()
+
+    def snapshot(self):
+        with self._lock:
+            samples = {view: list(s) for view, s in self._samples.items()}
+        report = {}
+        for view, rows in samples.items():
+            counts = [c for c, _ in rows]
+            times = [t for _, t in rows]
+            report[view] = {
+                "requests": len(rows),
+                "max_queries": max(counts),
+                "mean_queries": round(sum(counts) / len(counts), 2),
+                "mean_db_ms": round(sum(times) / len(times), 3),
+                "queries": dict(Counter(_bucket(c, QUERY_BUCKETS) for c in counts)),
+                "db_ms": dict(Counter(_bucket(t, TIME_BUCKETS_MS) for t in times)),
+            }
+        return report
+
+
+stats = QueryStats()
+
+
+def query_budget(view):
+    budgets = getattr(settings, "HOSPITAL_QUERY_BUDGETS", {})
+    return budgets.get(
+        view, getattr(settings, "HOSPITAL_QUERY_BUDGET", DEFAULT_QUERY_BUDGET)
+    )
+
+
+class QueryInstrumentationMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        recorder = QueryRecorder()
+        started = time.perf_counter()
+        token = _recorder.set(recorder)
+        try:
+            response = self.get_response(request)
+        finally:
+            _recorder.reset(token)
+        return self.report(request, response, recorder, started)
+
+    async def __acall__(self, request):
+        recorder = QueryRecorder()
+        started = time.perf_counter()
+        token = _recorder.set(recorder)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _recorder.reset(token)
+        return self.report(request, response, recorder, started)
+
+    def report(self, request, response, recorder, started):
+        total_ms = (time.perf_counter() - started) * 1000
+        db_ms = recorder.duration * 1000
+
+        match = request.resolver_match
+        view = match.view_name if match else UNRESOLVED
+        stats.record(view, recorder.count, db_ms)
+        response["Server-Timing"] = (
+            f'db;dur={db_ms:.1f};desc="{recorder.count} queries", '
+            f"app;dur={total_ms - db_ms:.1f}"
+        )
+
+        budget = query_budget(view)
+        if recorder.count > budget:
+            duplicates = recorder.duplicates()
+            logger.warning(
+                "%s ran %d queries (budget %d) in %.1f ms.\n"
+                "Duplicated: %s\nSlowest: %s",
+                view,
+                recorder.count,
+                budget,
+                db_ms,
+                "; ".join(f"{n}x {sql}" for sql, n in duplicates.items()) or "none",
+                "; ".join(f"{d * 1000:.1f} ms {sql}" for sql, d in recorder.slowest()),
+            )
+        return response
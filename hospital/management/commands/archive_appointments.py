@@ -0,0 +1,48 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from hospital import archive
+
+
+class Command(BaseCommand):
+    help = (
+        "Move completed and rejected appointments that have not changed for "
+        "HOSPITAL_ARCHIVE_AFTER_DAYS into the archive table, in batches. Meant "
+        "to run periodically (e.g. nightly from cron)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            help="Archive after this many days instead of HOSPITAL_ARCHIVE_AFTER_DAYS",
+        )
+        parser.add_argument("--batch-size", type=int, default=archive.batch_size())
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only count the appointments that would be archived",
+        )
+
+    def handle(self, *args, **options):
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size must be at least 1.")
+        before = archive.cutoff(days=options["days"])
+        if options["dry_run"]:
+            count = archive.candidates(before).count()
+            self.stdout.write(
+                f"{count} appointment(s) last changed before {before:%Y-%m-%d %H:%M} "
+                "would be archived."
+            )
+            return
+        started = time.monotonic()
+        moved = archive.archive(before, options["batch_size"])
+        for status, count in sorted(moved.items()):
+            self.stdout.write(f"{status}: {count}")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Archived {sum(moved.values())} appointment(s) in "
+                f"{time.monotonic() - started:.2f}s."
+            )
+        )
@@ -0,0 +1,157 @@
+import asyncio
+import json
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import ThreadSensitiveContext, sync_to_async
+from django.conf import settings
+from django.core.management.base import CommandError
+from django.db import connections
+from django.test import AsyncClient, Client, override_settings
+
+from . import benchmark_views
+from .benchmark_views import VIEW_SETUP, percentile
+
+# Read-only views with an async implementation.
+DEFAULT_VIEWS = (
+    "home",
+    "about",
+    "doctor_list",
+    "patient_list",
+    "doctor_dashboard",
+    "doctor_roster",
+    "patient_dashboard",
+    "receptionist_dashboard",
+)
+
+
+class Command(benchmark_views.Command):
+    help = (
+        "Drive the read-only views with many concurrent requests through the "
+        "WSGI handler (a thread per request) and the ASGI handler (a task per "
+        "request) and report requests/sec and latency percentiles as JSON"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=500)
+        parser.add_argument("--concurrency", type=int, default=50)
+        parser.add_argument("--output", help="Write the JSON report to this file")
+        parser.add_argument(
+            "--view",
+            action="append",
+            dest="views",
+            help="Only benchmark this URL name (repeatable)",
+        )
+
+    def handle(self, *args, **options):
+        if options["concurrency"] < 1 or options["requests"] < 1:
+            raise CommandError("--requests and --concurrency must be at least 1.")
+        self.users = self.pick_users()
+        report = {
+            "requests": options["requests"],
+            "concurrency": options["concurrency"],
+            "views": {},
+        }
+        for name in options["views"] or DEFAULT_VIEWS:
+            setup = VIEW_SETUP.get(name, {})
+            url, params = self.resolve(name, setup)
+            user = self.users.get(setup["role"]) if "role" in setup else None
+            if url is None or ("role" in setup and user is None):
+                report["views"][name] = {"skipped": "no data for this view"}
+                continue
+            result = {
+                "url": url,
+                "wsgi": self.run_wsgi(
+                    url, params, user, options["requests"], options["concurrency"]
+                ),
+            }
+            # AsyncClient always sends "Host: testserver".
+            with override_settings(
+                ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"]
+            ):
+                result["asgi"] = asyncio.run(
+                    self.run_asgi(
+                        url, params, user, options["requests"], options["concurrency"]
+                    )
+                )
+            report["views"][name] = result
+            self.stderr.write(f"{name}: {json.dumps(result)}")
+
+        output = json.dumps(report, indent=2, sort_keys=True)
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as handle:
+                handle.write(output + "\n")
+        else:
+            self.stdout.write(output)
+
+    def summarize(self, latencies, elapsed):
+        return {
+            "requests_per_second": round(len(latencies) / elapsed, 1),
+            "p50_ms": round(statistics.median(latencies), 3),
+            "p95_ms": round(percentile(latencies, 95), 3),
+            "p99_ms": round(percentile(latencies, 99), 3),
+        }
+
+    def run_wsgi(self, url, params, user, requests, concurrency):
+        # One client per worker thread, as a threaded WSGI server would keep
+        # one connection per thread.
+        local = threading.local()
+
+        def client():
+            if not hasattr(local, "client"):
+                local.client = Client(SERVER_NAME=self.host())
+                if user is not None:
+                    local.client.force_login(user)
+            return local.client
+
+        def one(_):
+            started = time.perf_counter()
+            self.fetch(client(), url, params)
+            return (time.perf_counter() - started) * 1000
+
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            # Log every worker in before the clock starts.
+            list(pool.map(lambda _: client(), range(concurrency)))
+            started = time.perf_counter()
+            latencies = list(pool.map(one, range(requests)))
+            elapsed = time.perf_counter() - started
+            list(pool.map(lambda _: connections.close_all(), range(concurrency)))
+        return self.summarize(latencies, elapsed)
+
+    async def run_asgi(self, url, params, user, requests, concurrency):
+        client = AsyncClient()
+        if user is not None:
+            await client.aforce_login(user)
+        remaining = iter(range(requests))
+        latencies = []
+
+        async def worker():
+            for _ in remaining:
+                # ASGIHandler gives each request its own thread for sync code;
+                # the test client does not, so do it here.
+                async with ThreadSensitiveContext():
+                    started = time.perf_counter()
+                    await self.afetch(client, url, params)
+                    latencies.append((time.perf_counter() - started) * 1000)
+                    await sync_to_async(connections.close_all)()
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+        await sync_to_async(connections.close_all)()
+        return self.summarize(latencies, elapsed)
+
+    async def afetch(self, client, url, params):
+        response = await client.get(url, params)
+        if response.streaming:
+            if response.is_async:
+                async for _ in response.streaming_content:
+                    pass
+            else:
+                for _ in response.streaming_content:
+                    pass
+        if response.status_code >= 500:
+            raise CommandError(f"{url} returned {response.status_code}")
+        return response.status_code
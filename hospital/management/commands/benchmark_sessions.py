@@ -0,0 +1,133 @@
+import json
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from hospital.management.commands.benchmark_views import Command as ViewBenchmark
+from hospital.models import Appointment
+from hospitalmngmt.sessions import PROFILES
+
+PASSWORD = "session benchmark"
+COOKIE_MESSAGES = "django.contrib.messages.storage.cookie.CookieStorage"
+# Django's default: messages in a cookie, spilling over into the session.
+FALLBACK_MESSAGES = "django.contrib.messages.storage.fallback.FallbackStorage"
+WRITES = ("INSERT", "UPDATE", "DELETE", "REPLACE")
+
+# Profile name -> (SESSION_ENGINE, MESSAGE_STORAGE).
+SETUPS = {
+    "django_default": (PROFILES["db"], FALLBACK_MESSAGES),
+    **{name: (engine, COOKIE_MESSAGES) for name, engine in PROFILES.items()},
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Run a receptionist session (log in, view the dashboard, reject an "
+        "appointment, browse, log out) under each session profile and report "
+        "database reads and writes per request as JSON. Data changes are "
+        "rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=20)
+        parser.add_argument("--output", help="Write the JSON report to this file")
+
+    def handle(self, *args, **options):
+        receptionist = User.objects.filter(is_staff=True).order_by("pk").first()
+        pending = list(
+            Appointment.objects.filter(status="pending")
+            .order_by("pk")
+            .values_list("pk", flat=True)[: options["iterations"]]
+        )
+        if receptionist is None or len(pending) < options["iterations"]:
+            raise CommandError(
+                f"Need a staff account and {options['iterations']} pending "
+                "appointments (see generate_load_data)."
+            )
+        report = {"iterations": options["iterations"], "profiles": {}}
+        for name, (engine, storage) in SETUPS.items():
+            with override_settings(
+                SESSION_ENGINE=engine,
+                MESSAGE_STORAGE=storage,
+                PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"],
+            ):
+                caches["sessions"].clear()
+                result = self.run(receptionist, pending)
+            report["profiles"][name] = result
+            self.stderr.write(f"{name}: {json.dumps(result)}")
+
+        output = json.dumps(report, indent=2, sort_keys=True)
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as handle:
+                handle.write(output + "\n")
+        else:
+            self.stdout.write(output)
+
+    def run(self, receptionist, pending):
+        counts = {"queries": 0, "writes": 0, "session_queries": 0, "session_writes": 0}
+
+        def count(execute, sql, params, many, context):
+            write = sql.lstrip().split(None, 1)[0].upper() in WRITES
+            counts["queries"] += 1
+            counts["writes"] += write
+            if "django_session" in sql:
+                counts["session_queries"] += 1
+                counts["session_writes"] += write
+            return execute(sql, params, many, context)
+
+        latencies = []
+        client = Client(SERVER_NAME=ViewBenchmark().host())
+        with transaction.atomic():
+            receptionist.set_password(PASSWORD)
+            receptionist.save(update_fields=["password"])
+            with connection.execute_wrapper(count):
+                for appointment_id in pending:
+                    for method, url, data in self.steps(receptionist, appointment_id):
+                        started = time.perf_counter()
+                        response = getattr(client, method)(url, data)
+                        latencies.append((time.perf_counter() - started) * 1000)
+                        if response.status_code >= 400:
+                            raise CommandError(f"{url} returned {response.status_code}")
+            transaction.set_rollback(True)
+
+        requests = len(latencies)
+        return {
+            "requests": requests,
+            "p50_ms": round(statistics.median(latencies), 3),
+            "queries_per_request": round(counts["queries"] / requests, 2),
+            "writes_per_request": round(counts["writes"] / requests, 2),
+            "session_reads_per_request": round(
+                (counts["session_queries"] - counts["session_writes"]) / requests, 2
+            ),
+            "session_writes_per_request": round(counts["session_writes"] / requests, 2),
+        }
+
+    def steps(self, receptionist, appointment_id):
+        dashboard = reverse("receptionist_dashboard")
+        return [
+            (
+                "post",
+                reverse("login"),
+                {
+                    "username": receptionist.username,
+                    "password": PASSWORD,
+                    "role": "receptionist",
+                },
+            ),
+            ("get", dashboard, {}),
+            (
+                "post",
+                reverse("approve_appointment", args=[appointment_id]),
+                {"status": "rejected", "receptionist_notes": ""},
+            ),
+            ("get", dashboard, {}),
+            ("get", reverse("doctor_list"), {}),
+            ("get", reverse("logout"), {}),
+            ("get", reverse("home"), {}),
+        ]
@@ -0,0 +1,153 @@
+import json
+import threading
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connection, connections
+from django.test import Client, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from hospital import pragmas, scheduling
+from hospital.management.commands.benchmark_views import Command as ViewBenchmark
+from hospital.models import Appointment, Doctor, Patient
+
+MARKER = "sqlite write benchmark"
+
+# SQLite's own defaults, with the rollback journal restored explicitly
+# because journal_mode is stored in the database file.
+BASELINE = {"journal_mode": "delete", "synchronous": "full"}
+# Transactions that take the write lock only when they first write, as
+# Django does unless OPTIONS sets transaction_mode.
+BASELINE_TRANSACTION_MODE = "DEFERRED"
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure concurrent appointment-request throughput on the SQLite "
+        "database with SQLite's default pragmas and with "
+        "HOSPITAL_SQLITE_PRAGMAS. Needs patients with accounts (see "
+        "generate_load_data); the appointments it creates are deleted again."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=8)
+        parser.add_argument(
+            "--requests", type=int, default=25, help="Requests per thread"
+        )
+        parser.add_argument("--output", help="Write the JSON report to this file")
+
+    def handle(self, *args, **options):
+        if connection.vendor != "sqlite":
+            raise CommandError("The default database is not SQLite.")
+        patients = list(
+            Patient.objects.filter(user__isnull=False).select_related("user")[
+                : options["threads"]
+            ]
+        )
+        doctors = list(Doctor.objects.values_list("pk", flat=True)[:50])
+        if len(patients) < options["threads"] or not doctors:
+            raise CommandError(
+                f"Need {options['threads']} patients with accounts and a doctor."
+            )
+
+        report = {"threads": options["threads"], "requests": options["requests"]}
+        database_options = connections.settings[DEFAULT_DB_ALIAS]["OPTIONS"]
+        configured = dict(database_options)
+        try:
+            for name, profile, mode in [
+                ("baseline", BASELINE, BASELINE_TRANSACTION_MODE),
+                ("tuned", pragmas.profile(), configured.get("transaction_mode")),
+            ]:
+                profile = dict(profile)
+                journal_mode = profile.pop("journal_mode", "delete")
+                with override_settings(HOSPITAL_SQLITE_PRAGMAS=profile):
+                    connections.close_all()
+                    # New connections are built from this dict.
+                    database_options["transaction_mode"] = mode
+                    # Switching journal mode needs the database to itself, so
+                    # it is done once here rather than by every connection.
+                    pragmas.apply(connection, {"journal_mode": journal_mode})
+                    report[name] = self.run(patients, doctors, options["requests"])
+                    report[name]["transaction_mode"] = mode
+                self.stderr.write(f"{name}: {json.dumps(report[name])}")
+        finally:
+            connections.close_all()
+            database_options.clear()
+            database_options.update(configured)
+            Appointment.objects.filter(symptoms=MARKER).delete()
+
+        output = json.dumps(report, indent=2, sort_keys=True)
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as handle:
+                handle.write(output + "\n")
+        else:
+            self.stdout.write(output)
+
+    def run(self, patients, doctors, requests):
+        url = reverse("appointment_request")
+        host = ViewBenchmark().host()
+        first_day = timezone.localdate() + timedelta(days=1)
+        results = []
+        barrier = threading.Barrier(len(patients) + 1)
+
+        def worker(index, patient):
+            client = Client(SERVER_NAME=host, raise_request_exception=False)
+            try:
+                client.force_login(patient.user)
+            except Exception:
+                barrier.abort()
+                raise
+            latencies, errors = [], 0
+            barrier.wait()
+            for i in range(requests):
+                day = first_day + timedelta(days=(index * requests + i) % 60)
+                while day.weekday() not in scheduling.working_days():
+                    day += timedelta(days=1)
+                data = {
+                    "doctor": doctors[(index + i) % len(doctors)],
+                    "requested_date": scheduling.slot_start(day, i % 8).strftime(
+                        "%Y-%m-%d %H:%M"
+                    ),
+                    "symptoms": MARKER,
+                }
+                started = time.perf_counter()
+                try:
+                    response = client.post(url, data)
+                    ok = response.status_code == 302
+                except DatabaseError:
+                    ok = False
+                latencies.append((time.perf_counter() - started) * 1000)
+                errors += not ok
+            results.append((latencies, errors))
+            connection.close()
+
+        threads = [
+            threading.Thread(target=worker, args=(index, patient))
+            for index, patient in enumerate(patients)
+        ]
+        for thread in threads:
+            thread.start()
+        try:
+            barrier.wait()
+        except threading.BrokenBarrierError:
+            raise CommandError("A benchmark client failed to log in.")
+        started = time.perf_counter()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        latencies = sorted(ms for samples, _ in results for ms in samples)
+        errors = sum(e for _, e in results)
+        return {
+            "pragmas": pragmas.current(
+                connection, ["journal_mode", "synchronous", "busy_timeout"]
+            ),
+            "succeeded": len(latencies) - errors,
+            "failed": errors,
+            "seconds": round(elapsed, 3),
+            "writes_per_second": round((len(latencies) - errors) / elapsed, 1),
+            "p50_ms": round(latencies[len(latencies) // 2], 3),
+            "p99_ms": round(latencies[int(len(latencies) * 0.99)], 3),
+        }
@@ -0,0 +1,188 @@
+import json
+import statistics
+import time
+import tracemalloc
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.urls import URLPattern, reverse
+
+from hospital import urls
+from hospital.models import Appointment, Doctor
+
+# Who to log in as, and what to pass, for views that need more than an
+# anonymous GET. Anything not listed here is requested anonymously.
+VIEW_SETUP = {
+    "doctor_dashboard": {"role": "doctor"},
+    "doctor_roster": {"role": "doctor"},
+    "patient_dashboard": {"role": "patient"},
+    "appointment_request": {"role": "patient"},
+    "receptionist_dashboard": {"role": "receptionist"},
+    "approve_appointment": {"role": "receptionist", "kwargs": "pending_appointment"},
+    "bulk_triage": {"role": "receptionist"},
+    "available_slots": {"params": "busiest_specialty"},
+    "appointment_events": {"skip": "never-ending event stream"},
+    "search": {"role": "receptionist", "params": "search_term"},
+    "reports": {"role": "receptionist"},
+    "report_csv": {"role": "receptionist", "kwargs": {"report": "doctors"}},
+    "export": {
+        "role": "receptionist",
+        "kwargs": {"dataset": "appointments", "fmt": "csv"},
+    },
+}
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+class Command(BaseCommand):
+    help = (
+        "Request every view in hospital/urls.py through the test client and "
+        "report latency percentiles, query counts and peak memory as JSON"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=50)
+        parser.add_argument("--warmup", type=int, default=3)
+        parser.add_argument("--output", help="Write the JSON report to this file")
+        parser.add_argument(
+            "--view",
+            action="append",
+            dest="views",
+            help="Only benchmark this URL name (repeatable)",
+        )
+
+    def handle(self, *args, **options):
+        self.users = self.pick_users()
+        report = {"iterations": options["iterations"], "views": {}}
+        for pattern in urls.urlpatterns:
+            if not isinstance(pattern, URLPattern) or not pattern.name:
+                continue
+            if options["views"] and pattern.name not in options["views"]:
+                continue
+            result = self.benchmark(
+                pattern.name, options["iterations"], options["warmup"]
+            )
+            report["views"][pattern.name] = result
+            self.stderr.write(f"{pattern.name}: {json.dumps(result)}")
+
+        output = json.dumps(report, indent=2, sort_keys=True)
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as handle:
+                handle.write(output + "\n")
+        else:
+            self.stdout.write(output)
+
+    def pick_users(self):
+        doctor = Doctor.objects.filter(user__isnull=False).order_by("pk").first()
+        patient = (
+            Appointment.objects.filter(patient__user__isnull=False)
+            .order_by("patient_id")
+            .values_list("patient__user", flat=True)
+            .first()
+        )
+        receptionist = User.objects.filter(is_staff=True).order_by("pk").first()
+        return {
+            "doctor": doctor.user if doctor else None,
+            "patient": User.objects.filter(pk=patient).first(),
+            "receptionist": receptionist,
+        }
+
+    def resolve(self, name, setup):
+        kwargs, params = {}, {}
+        if isinstance(setup.get("kwargs"), dict):
+            kwargs.update(setup["kwargs"])
+        if setup.get("kwargs") == "pending_appointment":
+            appointment = Appointment.objects.filter(status="pending").first()
+            if appointment is None:
+                return None, None
+            kwargs["appointment_id"] = appointment.pk
+        if setup.get("params") == "busiest_specialty":
+            params["specialty"] = (
+                Doctor.objects.exclude(specialty="")
+                .values_list("specialty", flat=True)
+                .first()
+                or ""
+            )
+        if setup.get("params") == "search_term":
+            params["q"] = (
+                Doctor.objects.exclude(specialty="")
+                .values_list("specialty", flat=True)
+                .first()
+                or "a"
+            )[:4]
+        return reverse(name, kwargs=kwargs), params
+
+    def benchmark(self, name, iterations, warmup):
+        setup = VIEW_SETUP.get(name, {})
+        if "skip" in setup:
+            return {"skipped": setup["skip"]}
+        url, params = self.resolve(name, setup)
+        if url is None:
+            return {"skipped": "no data to build the URL"}
+        client = Client(SERVER_NAME=self.host())
+        role = setup.get("role")
+        if role:
+            if self.users.get(role) is None:
+                return {"skipped": f"no {role} account"}
+            client.force_login(self.users[role])
+
+        for _ in range(warmup):
+            self.fetch(client, url, params)
+
+        latencies = []
+        status = None
+        for _ in range(iterations):
+            started = time.perf_counter()
+            status = self.fetch(client, url, params)
+            latencies.append((time.perf_counter() - started) * 1000)
+
+        # Counted and traced on separate requests so neither skews the timings.
+        # A wrapper is used rather than connection.queries because the request
+        # itself resets that log.
+        queries = 0
+
+        def count(execute, sql, params, many, context):
+            nonlocal queries
+            queries += 1
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(count):
+            self.fetch(client, url, params)
+        tracemalloc.start()
+        self.fetch(client, url, params)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        return {
+            "url": url,
+            "status": status,
+            "p50_ms": round(statistics.median(latencies), 3),
+            "p95_ms": round(percentile(latencies, 95), 3),
+            "p99_ms": round(percentile(latencies, 99), 3),
+            "queries": queries,
+            "peak_memory_kb": round(peak / 1024, 1),
+        }
+
+    def host(self):
+        """A host name that passes ALLOWED_HOSTS ("testserver" may not)."""
+        for host in settings.ALLOWED_HOSTS:
+            host = host.lstrip(".")
+            if host and host != "*":
+                return host
+        return "localhost"
+
+    def fetch(self, client, url, params):
+        response = client.get(url, params)
+        if response.streaming:
+            for _ in response.streaming_content:
+                pass
+        if response.status_code >= 500:
+            raise CommandError(f"{url} returned {response.status_code}")
+        return response.status_code
@@ -0,0 +1,77 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from hospital import counters, fragments, roster, scheduling
+from hospital.models import Appointment
+
+
+class Command(BaseCommand):
+    help = (
+        "Mark approved appointments whose slot has ended as completed, in "
+        "batched UPDATEs. Meant to run periodically (e.g. hourly from cron)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--grace-minutes",
+            type=int,
+            help="Minutes after the requested time before an appointment counts "
+            "as over (default: one scheduling slot)",
+        )
+
+    def handle(self, *args, **options):
+        grace = options["grace_minutes"]
+        if grace is None:
+            grace = scheduling.slot_minutes()
+        now = timezone.now()
+        cutoff = now - timedelta(minutes=grace)
+        stale = Appointment.objects.filter(
+            status="approved", requested_date__lt=cutoff
+        ).order_by("requested_date", "id")
+
+        total = 0
+        while True:
+            with transaction.atomic():
+                batch = list(
+                    stale.values_list("pk", "doctor_id", "patient_id")[
+                        : options["batch_size"]
+                    ]
+                )
+                if not batch:
+                    break
+                ids, doctor_ids, patient_ids = zip(*batch)
+                # UPDATE bypasses post_save, so keep the counters, rosters and
+                # cached dashboards in step here.
+                done = Appointment.objects.filter(pk__in=ids, status="approved").update(
+                    status="completed", updated_at=now
+                )
+                counters.adjust(
+                    {
+                        counters.appointment_key("approved"): -done,
+                        counters.appointment_key("completed"): done,
+                    }
+                )
+                roster.remove(ids)
+                self.invalidate(set(doctor_ids), set(patient_ids))
+            total += done
+            self.stdout.write(f"{total} appointments completed")
+
+        if counters.process_local():
+            self.stderr.write(self.style.WARNING(counters.LOCAL_CACHE_WARNING))
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Completed {total} appointments requested before {cutoff:%Y-%m-%d %H:%M}."
+            )
+        )
+
+    def invalidate(self, doctor_ids, patient_ids):
+        def bump():
+            fragments.bump("doctor", *doctor_ids)
+            fragments.bump("patient", *patient_ids)
+
+        transaction.on_commit(bump)
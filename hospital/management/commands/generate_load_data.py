@@ -0,0 +1,240 @@
+import random
+import time
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from hospital import assignment, counters, roster, scheduling
+from hospital.models import Appointment, Doctor, Patient
+
+FIRST_NAMES = [
+    "James", "Mary", "Robert", "Patricia", "John", "Jennifer", "Michael", "Linda",
+    "David", "Elizabeth", "William", "Barbara", "Richard", "Susan", "Joseph",
+    "Jessica", "Thomas", "Sarah", "Priya", "Wei", "Fatima", "Carlos", "Aisha",
+    "Hiroshi", "Olga", "Kwame", "Sofia", "Mateo", "Noor", "Liam",
+]  # fmt: skip
+LAST_NAMES = [
+    "Smith", "Johnson", "Williams", "Brown", "Jones", "Garcia", "Miller", "Davis",
+    "Rodriguez", "Martinez", "Hernandez", "Lopez", "Wilson", "Anderson", "Thomas",
+    "Taylor", "Moore", "Jackson", "Martin", "Lee", "Patel", "Chen", "Khan", "Kim",
+    "Nguyen", "Okafor", "Ivanova", "Rossi", "Silva", "Shah",
+]  # fmt: skip
+SPECIALTIES = [
+    "Cardiology", "Dermatology", "Neurology", "Orthopedics", "Pediatrics",
+    "Psychiatry", "Oncology", "General Practice",
+]  # fmt: skip
+SYMPTOMS = [
+    "Persistent cough", "Chest pain on exertion", "Recurring headaches",
+    "Skin rash", "Lower back pain", "Follow-up visit", "Fever and fatigue",
+    "Joint swelling", "Shortness of breath", "Annual checkup",
+]  # fmt: skip
+
+# Share of appointments in each status, for requested dates in the past and
+# in the future respectively.
+PAST_STATUSES = [("completed", 0.80), ("rejected", 0.12), ("approved", 0.08)]
+FUTURE_STATUSES = [("pending", 0.35), ("approved", 0.55), ("rejected", 0.10)]
+PASSWORD = "loadtest123"
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate a deterministic synthetic dataset of doctors, patients and "
+        "appointments for load testing"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--doctors", type=int, default=200)
+        parser.add_argument("--patients", type=int, default=20000)
+        parser.add_argument("--appointments", type=int, default=100000)
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument(
+            "--past-days",
+            type=int,
+            default=365,
+            help="How far back requested dates go",
+        )
+        parser.add_argument(
+            "--future-days",
+            type=int,
+            default=90,
+            help="How far ahead requested dates go",
+        )
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options["seed"])
+        self.batch_size = options["batch_size"]
+        # One hash shared by every generated account: hashing per user would
+        # dominate the run time and the accounts exist only to log in as.
+        self.password = make_password(PASSWORD)
+        started = time.monotonic()
+
+        doctors = self.create_doctors(options["doctors"])
+        patient_ids = self.create_patients(options["patients"], doctors)
+        self.create_appointments(
+            options["appointments"],
+            [d.pk for d in doctors],
+            patient_ids,
+            options["past_days"],
+            options["future_days"],
+        )
+        self.create_receptionist()
+        # The rows were bulk-created, bypassing the signals behind these.
+        counters.rebuild()
+        roster.rebuild()
+        assignment.invalidate()
+        if counters.process_local():
+            self.stderr.write(self.style.WARNING(counters.LOCAL_CACHE_WARNING))
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Generated {len(doctors)} doctors, {len(patient_ids)} patients and "
+                f"{options['appointments']} appointments in "
+                f"{time.monotonic() - started:.1f}s. Every account uses password "
+                f"{PASSWORD!r}; log in as loaddoctor1, loadpatient1 or "
+                "loadreceptionist."
+            )
+        )
+
+    def name(self):
+        return f"{self.rng.choice(FIRST_NAMES)} {self.rng.choice(LAST_NAMES)}"
+
+    def users(self, prefix, start, count):
+        users = [
+            User(username=f"{prefix}{i}", password=self.password)
+            for i in range(start + 1, start + count + 1)
+        ]
+        User.objects.bulk_create(users)
+        return users
+
+    def next_index(self, prefix):
+        return User.objects.filter(username__startswith=prefix).count()
+
+    @transaction.atomic
+    def create_doctors(self, count):
+        start = self.next_index("loaddoctor")
+        users = self.users("loaddoctor", start, count)
+        doctors = [
+            Doctor(
+                user=user,
+                name=f"Dr. {self.name()}",
+                specialty=self.rng.choice(SPECIALTIES),
+                phone=f"+1-555-{self.rng.randrange(10**4):04d}",
+                email=f"{user.username}@hospital.test",
+            )
+            for user in users
+        ]
+        Doctor.objects.bulk_create(doctors, batch_size=self.batch_size)
+        self.stdout.write(f"{count} doctors")
+        return doctors
+
+    def create_patients(self, count, doctors):
+        start = self.next_index("loadpatient")
+        ids = []
+        today = timezone.localdate()
+        for offset in range(0, count, self.batch_size):
+            size = min(self.batch_size, count - offset)
+            with transaction.atomic():
+                users = self.users("loadpatient", start + offset, size)
+                patients = [
+                    Patient(
+                        user=user,
+                        name=self.name(),
+                        age=self.rng.randint(0, 95),
+                        gender=self.rng.choice("MFO"),
+                        address=f"{self.rng.randint(1, 9999)} Main St",
+                        phone=f"+1-555-{self.rng.randrange(10**4):04d}",
+                        admitted_date=(
+                            today - timedelta(days=self.rng.randint(0, 1000))
+                            if self.rng.random() < 0.3
+                            else None
+                        ),
+                        # Skewed so a few doctors carry most of the patients.
+                        doctor=(
+                            doctors[int(len(doctors) * self.rng.random() ** 2)]
+                            if doctors and self.rng.random() < 0.9
+                            else None
+                        ),
+                    )
+                    for user in users
+                ]
+                Patient.objects.bulk_create(patients)
+            ids.extend(p.pk for p in patients)
+            self.stdout.write(f"{offset + size} patients")
+        return ids
+
+    def pick_status(self, weights):
+        roll = self.rng.random()
+        for status, share in weights:
+            roll -= share
+            if roll < 0:
+                return status
+        return weights[-1][0]
+
+    def create_appointments(
+        self, count, doctor_ids, patient_ids, past_days, future_days
+    ):
+        if not doctor_ids or not patient_ids:
+            return
+        now = timezone.now()
+        per_day = scheduling.slots_per_day()
+        booked = set()
+        for offset in range(0, count, self.batch_size):
+            size = min(self.batch_size, count - offset)
+            batch = []
+            for _ in range(size):
+                day = timezone.localdate(now) + timedelta(
+                    days=self.rng.randint(-past_days, future_days)
+                )
+                while day.weekday() not in scheduling.working_days():
+                    day += timedelta(days=1)
+                doctor_id = self.rng.choice(doctor_ids)
+                slot = self.rng.randrange(per_day)
+                requested = scheduling.slot_start(day, slot)
+                status = self.pick_status(
+                    PAST_STATUSES if requested < now else FUTURE_STATUSES
+                )
+                if status == "approved":
+                    if (doctor_id, requested) in booked:
+                        status = "pending" if requested >= now else "rejected"
+                    else:
+                        booked.add((doctor_id, requested))
+                created = requested - timedelta(
+                    days=self.rng.randint(1, 30), minutes=self.rng.randint(0, 1439)
+                )
+                updated = created
+                if status != "pending":
+                    updated = created + timedelta(
+                        minutes=int(self.rng.expovariate(1 / 600))
+                    )
+                batch.append(
+                    Appointment(
+                        patient_id=self.rng.choice(patient_ids),
+                        doctor_id=doctor_id,
+                        requested_date=requested,
+                        symptoms=self.rng.choice(SYMPTOMS),
+                        status=status,
+                        created_at=created,
+                        updated_at=updated,
+                    )
+                )
+            history = [(a.created_at, a.updated_at) for a in batch]
+            with transaction.atomic():
+                Appointment.objects.bulk_create(batch)
+                # auto_now/auto_now_add overwrite the timestamps on insert; put
+                # the generated history back.
+                for appointment, (created, updated) in zip(batch, history):
+                    appointment.created_at = created
+                    appointment.updated_at = updated
+                Appointment.objects.bulk_update(batch, ["created_at", "updated_at"])
+            self.stdout.write(f"{offset + size} appointments")
+
+    def create_receptionist(self):
+        User.objects.get_or_create(
+            username="loadreceptionist",
+            defaults={"password": self.password, "is_staff": True},
+        )
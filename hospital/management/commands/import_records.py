@@ -0,0 +1,255 @@
+import csv
+import json
+import os
+import time
+from itertools import islice
+
+from django import forms
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from hospital import assignment, counters, fragments, roster
+from hospital.forms import AppointmentRequestForm, DoctorForm, PatientForm
+from hospital.models import Appointment, Doctor, ImportCheckpoint, Patient
+
+
+class DoctorLookupField(forms.Field):
+    """Resolve a doctor id or exact name against a preloaded table."""
+
+    def __init__(self, lookup, **kwargs):
+        self.lookup = lookup
+        super().__init__(**kwargs)
+
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        doctor = self.lookup.get(str(value).strip())
+        if doctor is None:
+            raise forms.ValidationError(f"Unknown doctor {value!r}.")
+        return doctor
+
+
+class LookupExclusionMixin:
+    """
+    Skip the model-level ForeignKey check for ``doctor``: the lookup field has
+    already resolved it, and the check would cost one query per row.
+    """
+
+    def _get_validation_exclusions(self):
+        exclusions = super()._get_validation_exclusions()
+        exclusions.add("doctor")
+        return exclusions
+
+
+class ImportDoctorForm(DoctorForm):
+    # Accounts are provisioned separately; the import only loads profiles.
+    username = None
+    password1 = None
+    password2 = None
+
+    class Meta(DoctorForm.Meta):
+        fields = ["name", "specialty", "phone", "email"]
+
+
+class ImportPatientForm(LookupExclusionMixin, PatientForm):
+    username = None
+    password1 = None
+    password2 = None
+
+    def __init__(self, *args, doctors, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields["doctor"] = DoctorLookupField(doctors, required=False)
+
+
+class ImportAppointmentForm(LookupExclusionMixin, AppointmentRequestForm):
+    patient = forms.IntegerField()
+
+    class Meta(AppointmentRequestForm.Meta):
+        fields = ["doctor", "requested_date", "symptoms", "status"]
+
+    def __init__(self, *args, doctors, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields["doctor"] = DoctorLookupField(doctors)
+        self.fields["status"].required = False
+
+    def clean_requested_date(self):
+        # Historical records are loaded as they were booked, outside working
+        # hours included; only new requests must fall in a bookable slot.
+        return self.cleaned_data["requested_date"]
+
+    def clean_status(self):
+        return self.cleaned_data.get("status") or "pending"
+
+
+MODELS = {
+    "doctor": (Doctor, ImportDoctorForm),
+    "patient": (Patient, ImportPatientForm),
+    "appointment": (Appointment, ImportAppointmentForm),
+}
+
+
+def read_records(path, fmt):
+    with open(path, newline="", encoding="utf-8") as handle:
+        if fmt == "csv":
+            yield from csv.DictReader(handle)
+        else:
+            for line in handle:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def doctor_lookup():
+    """Map every doctor's id and name to a lightweight Doctor instance."""
+    lookup = {}
+    for doctor in Doctor.objects.only("id", "name"):
+        lookup.setdefault(doctor.name, doctor)
+        lookup[str(doctor.pk)] = doctor
+    return lookup
+
+
+def describe_errors(errors):
+    return "; ".join(
+        f"{field}: {error['message']}"
+        for field, field_errors in errors.get_json_data().items()
+        for error in field_errors
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream doctors, patients or appointments from a CSV or JSONL file into "
+        "the database in validated, batched transactions, resuming from a "
+        "checkpoint after a crash"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("model", choices=sorted(MODELS))
+        parser.add_argument("path")
+        parser.add_argument("--format", choices=["csv", "jsonl"])
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--checkpoint",
+            help="Checkpoint name (default: the file's absolute path)",
+        )
+        parser.add_argument(
+            "--restart",
+            action="store_true",
+            help="Ignore an existing checkpoint and import from the first row",
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        if not os.path.exists(path):
+            raise CommandError(f"No such file: {path}")
+        fmt = options["format"] or ("jsonl" if path.endswith(".jsonl") else "csv")
+        batch_size = options["batch_size"]
+        source = os.path.abspath(path)
+        checkpoint = options["checkpoint"] or source
+        model, form_class = MODELS[options["model"]]
+
+        if options["restart"]:
+            ImportCheckpoint.objects.filter(name=checkpoint).delete()
+        done = self.load_checkpoint(checkpoint, source)
+        if done:
+            self.stdout.write(f"Resuming after row {done} from checkpoint {checkpoint}")
+
+        form_kwargs = {}
+        if model is not Doctor:
+            form_kwargs["doctors"] = doctor_lookup()
+
+        records = islice(read_records(path, fmt), done, None)
+        started = time.monotonic()
+        imported = rejected = 0
+        while True:
+            chunk = list(islice(records, batch_size))
+            if not chunk:
+                break
+            objs, errors = self.build(chunk, done, form_class, form_kwargs)
+            if model is Appointment:
+                objs, missing = self.drop_unknown_patients(objs)
+                errors.extend(missing)
+            done += len(chunk)
+            # The checkpoint commits with the rows, so a crash can neither
+            # lose nor repeat a batch.
+            with transaction.atomic():
+                model.objects.bulk_create(objs, batch_size=batch_size)
+                if model is Appointment:
+                    # bulk_create skips the signals that keep the roster.
+                    roster.sync([obj for obj in objs if obj.status == "approved"])
+                self.invalidate(model, objs)
+                ImportCheckpoint.objects.update_or_create(
+                    name=checkpoint, defaults={"source": source, "rows": done}
+                )
+
+            imported += len(objs)
+            rejected += len(errors)
+            for row, message in errors:
+                self.stderr.write(f"Row {row}: {message}")
+            elapsed = time.monotonic() - started
+            rate = (imported + rejected) / elapsed if elapsed else 0
+            self.stdout.write(
+                f"{done} rows read, {imported} imported, {rejected} rejected "
+                f"({rate:,.0f} rows/sec)"
+            )
+
+        counters.invalidate()
+        assignment.invalidate()
+        if counters.process_local():
+            self.stderr.write(self.style.WARNING(counters.LOCAL_CACHE_WARNING))
+        ImportCheckpoint.objects.filter(name=checkpoint).delete()
+        self.stdout.write(
+            self.style.SUCCESS(f"Imported {imported} {model._meta.verbose_name} rows.")
+        )
+
+    def build(self, chunk, offset, form_class, form_kwargs):
+        objs, errors = [], []
+        for row, record in enumerate(chunk, start=offset + 1):
+            form = form_class(data=record, **form_kwargs)
+            if not form.is_valid():
+                errors.append((row, describe_errors(form.errors)))
+                continue
+            obj = form.save(commit=False)
+            if "patient" in form.cleaned_data:
+                obj.patient_id = form.cleaned_data["patient"]
+            obj._import_row = row
+            objs.append(obj)
+        return objs, errors
+
+    def drop_unknown_patients(self, objs):
+        ids = {obj.patient_id for obj in objs}
+        # The name and phone are copied onto roster entries.
+        known = Patient.objects.only("name", "phone").in_bulk(ids)
+        kept, errors = [], []
+        for obj in objs:
+            if obj.patient_id in known:
+                obj.patient = known[obj.patient_id]
+                kept.append(obj)
+            else:
+                errors.append((obj._import_row, f"Unknown patient {obj.patient_id}."))
+        return kept, errors
+
+    def invalidate(self, model, objs):
+        """Bump the cached dashboards showing ``objs`` once the batch commits."""
+        doctor_ids = set()
+        patient_ids = set()
+        if model is not Doctor:
+            doctor_ids = {obj.doctor_id for obj in objs}
+        if model is Appointment:
+            patient_ids = {obj.patient_id for obj in objs}
+
+        def bump():
+            fragments.bump("doctor", *doctor_ids)
+            fragments.bump("patient", *patient_ids)
+
+        transaction.on_commit(bump)
+
+    def load_checkpoint(self, checkpoint, source):
+        state = ImportCheckpoint.objects.filter(name=checkpoint).first()
+        if state is None:
+            return 0
+        if state.source != source:
+            raise CommandError(
+                f"Checkpoint {checkpoint} belongs to {state.source}; use "
+                "--restart or --checkpoint to import a different file."
+            )
+        return state.rows
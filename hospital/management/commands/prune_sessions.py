@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from hospital import sessions
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete expired sessions in small batches, a replacement for "
+        "clearsessions that does not lock the session table for long"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, default=sessions.DEFAULT_BATCH_SIZE
+        )
+        parser.add_argument(
+            "--pause",
+            type=float,
+            default=0,
+            help="Seconds to sleep between batches",
+        )
+
+    def handle(self, *args, **options):
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size must be at least 1.")
+        deleted = sessions.prune(options["batch_size"], options["pause"])
+        if deleted is None:
+            self.stdout.write("Sessions are not stored in the database.")
+        else:
+            self.stdout.write(
+                self.style.SUCCESS(f"Deleted {deleted} expired session(s).")
+            )
@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from hospital import assignment
+
+
+class Command(BaseCommand):
+    help = (
+        "Reassign patients from the busiest doctors of each specialty to the "
+        "least busy until their loads (patients plus upcoming approved "
+        "appointments) are within --tolerance of each other. Patients with an "
+        "upcoming approved appointment keep their doctor."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--specialty", default="", help="Only this specialty")
+        parser.add_argument(
+            "--tolerance",
+            type=int,
+            default=1,
+            help="Largest difference in load left between two doctors",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report the moves that would be made",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            moves, before, after = assignment.rebalance(
+                options["specialty"], options["tolerance"], options["dry_run"]
+            )
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        specialty = options["specialty"]
+        keys = [assignment.specialty_key(specialty)] if specialty else None
+        for key in keys or after.specialties():
+            if not after.doctors(key):
+                raise CommandError(f"No doctor has the specialty {specialty!r}.")
+            self.stdout.write(
+                f"{after.names[key]}: spread {before.spread(key)} -> "
+                f"{after.spread(key)}"
+            )
+        verb = "Would move" if options["dry_run"] else "Moved"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {len(moves)} patient(s)."))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from hospital import counters
+
+
+class Command(BaseCommand):
+    help = "Recount doctors, patients and appointments per status into the cache"
+
+    def handle(self, *args, **options):
+        totals = counters.rebuild()
+        if counters.process_local():
+            self.stderr.write(self.style.WARNING(counters.LOCAL_CACHE_WARNING))
+        for name, value in totals.items():
+            self.stdout.write(f"{name}: {value}")
+        self.stdout.write(self.style.SUCCESS("Counters rebuilt."))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from hospital import search
+
+
+class Command(BaseCommand):
+    help = "Drop and rebuild the full-text search indexes (SQLite only)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--database", default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        connection = connections[options["database"]]
+        if not search.is_supported(connection):
+            self.stdout.write(
+                f"{connection.vendor} has no full-text index; search falls back "
+                "to substring matching."
+            )
+            return
+        search.rebuild(connection)
+        self.stdout.write(self.style.SUCCESS("Search indexes rebuilt."))
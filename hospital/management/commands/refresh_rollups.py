@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from hospital import reporting
+
+
+class Command(BaseCommand):
+    help = (
+        "Bring the daily appointment rollups up to date with appointments "
+        "changed since the last run. Meant to run periodically (e.g. every few "
+        "minutes from cron)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--rebuild",
+            action="store_true",
+            help="Recompute every day instead of starting from the watermark",
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        days = reporting.refresh(rebuild=options["rebuild"])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Recomputed {days} days of rollups in "
+                f"{time.monotonic() - started:.2f}s."
+            )
+        )
@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from hospital import roster
+from hospital.models import Doctor, RosterEntry
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the doctors' day-by-day rosters from the approved "
+        "appointments. Approvals keep them up to date; run this after "
+        "restoring data or loading appointments with raw SQL."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--doctor", type=int, help="Only this doctor's roster")
+        parser.add_argument("--batch-size", type=int, default=roster.DEFAULT_BATCH_SIZE)
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Only report whether the roster matches the appointments",
+        )
+
+    def handle(self, *args, **options):
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size must be at least 1.")
+        doctor = None
+        if options["doctor"] is not None:
+            doctor = Doctor.objects.filter(pk=options["doctor"]).first()
+            if doctor is None:
+                raise CommandError(f"No doctor with id {options['doctor']}.")
+        if options["check"]:
+            stale = roster.stale(doctor)
+            if stale:
+                raise CommandError(f"{stale} roster entries are out of date.")
+            self.stdout.write(self.style.SUCCESS("The roster is up to date."))
+            return
+        count = roster.rebuild(doctor, options["batch_size"])
+        days = (
+            RosterEntry.objects.filter(**({"doctor": doctor} if doctor else {}))
+            .values("doctor", "day")
+            .distinct()
+            .count()
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Rebuilt {count} roster entries over {days} doctor-days."
+            )
+        )
@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from hospital import notifications
+
+
+class Command(BaseCommand):
+    help = (
+        "Deliver queued appointment notifications in batches, retrying failed "
+        "ones with backoff. Runs once by default (e.g. every minute from cron), "
+        "or keeps polling with --loop."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=100)
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Keep delivering, polling every --interval seconds when idle",
+        )
+        parser.add_argument("--interval", type=float, default=5.0)
+
+    def handle(self, *args, **options):
+        while True:
+            totals = notifications.drain(options["batch_size"])
+            if any(totals.values()) or not options["loop"]:
+                self.stdout.write(
+                    ", ".join(f"{count} {state}" for state, count in totals.items())
+                )
+            if not options["loop"]:
+                return
+            if not any(totals.values()):
+                time.sleep(options["interval"])
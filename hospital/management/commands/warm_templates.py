@@ -0,0 +1,79 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.urls import URLPattern
+
+from hospital import template_cache, urls
+from hospital.management.commands.benchmark_views import VIEW_SETUP
+from hospital.management.commands.benchmark_views import Command as ViewBenchmark
+
+
+class Command(BaseCommand):
+    help = (
+        "Compile every template, failing if any does not compile, and "
+        "optionally request every view to report per-template render times"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--render",
+            action="store_true",
+            help="Also request every view and report render time per template",
+        )
+        parser.add_argument(
+            "--iterations", type=int, default=5, help="Requests per view for --render"
+        )
+
+    def handle(self, *args, **options):
+        results = template_cache.warm()
+        errors = [(name, error) for name, _, error in results if error is not None]
+        total = sum(seconds for _, seconds, _ in results)
+        if options["verbosity"] > 1:
+            for name, seconds, _ in sorted(results, key=lambda r: -r[1]):
+                self.stdout.write(f"{seconds * 1000:8.2f} ms  {name}")
+        for name, error in errors:
+            self.stderr.write(f"{name}: {error}")
+        if errors:
+            raise CommandError(f"{len(errors)} template(s) do not compile.")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Compiled {len(results)} templates in {total * 1000:.0f} ms."
+            )
+        )
+        if options["render"]:
+            self.report(self.render_times(options["iterations"]))
+
+    def render_times(self, iterations):
+        benchmark = ViewBenchmark()
+        benchmark.users = benchmark.pick_users()
+        with template_cache.RenderTimer() as timer:
+            for pattern in urls.urlpatterns:
+                if not isinstance(pattern, URLPattern) or not pattern.name:
+                    continue
+                setup = VIEW_SETUP.get(pattern.name, {})
+                if "skip" in setup:
+                    continue
+                url, params = benchmark.resolve(pattern.name, setup)
+                user = benchmark.users.get(setup.get("role"))
+                if url is None or ("role" in setup and user is None):
+                    continue
+                client = Client(SERVER_NAME=benchmark.host())
+                if user is not None:
+                    client.force_login(user)
+                for _ in range(iterations):
+                    benchmark.fetch(client, url, params)
+        return timer.stats()
+
+    def report(self, stats):
+        self.stdout.write(
+            f"{'template':<40} {'renders':>8} {'total ms':>10} {'self ms':>10}"
+        )
+        for name, row in sorted(stats.items(), key=lambda item: -item[1]["total_ms"]):
+            renders = row["renders"]
+            self.stdout.write(
+                f"{name:<40} {renders:>8} {row['total_ms'] / renders:>10.3f} "
+                f"{row['self_ms'] / renders:>10.3f}"
+            )
+        self.stdout.write(
+            "Times are per render. Total includes the templates extended and "
+            "included; self is the template's own nodes, blocks included."
+        )
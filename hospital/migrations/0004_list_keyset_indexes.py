@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 17:34
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hospital', '0003_appointment'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='doctor',
+            index=models.Index(fields=['name', 'id'], name='doctor_name_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='patient',
+            index=models.Index(fields=['name', 'id'], name='patient_name_id_idx'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-17 17:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("hospital", "0004_list_keyset_indexes"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="appointment",
+            index=models.Index(
+                fields=["status", "-created_at"], name="appt_status_created_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="appointment",
+            index=models.Index(
+                fields=["doctor", "status", "requested_date"],
+                name="appt_doctor_status_date_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="appointment",
+            index=models.Index(
+                fields=["patient", "-created_at"], name="appt_patient_created_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-17 17:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("hospital", "0005_appointment_dashboard_indexes"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="appointment",
+            index=models.Index(
+                fields=["status", "requested_date"], name="appt_status_date_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,24 @@
+from django.db import migrations
+
+
+def install_search(apps, schema_editor):
+    from hospital import search
+
+    search.install(schema_editor.connection)
+
+
+def uninstall_search(apps, schema_editor):
+    from hospital import search
+
+    search.uninstall(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("hospital", "0006_appointment_status_date_index"),
+    ]
+
+    operations = [
+        migrations.RunPython(install_search, uninstall_search, elidable=True),
+    ]
@@ -0,0 +1,85 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:04
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("hospital", "0007_search_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DailyAppointmentRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField()),
+                ("specialty", models.CharField(blank=True, max_length=100)),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("pending", "Pending Approval"),
+                            ("approved", "Approved"),
+                            ("rejected", "Rejected"),
+                            ("completed", "Completed"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                ("appointments", models.PositiveIntegerField(default=0)),
+                (
+                    "decision_seconds",
+                    models.FloatField(
+                        default=0,
+                        help_text="Total time from request to approval or rejection, in seconds",
+                    ),
+                ),
+            ],
+        ),
+        migrations.CreateModel(
+            name="ReportWatermark",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=50, unique=True)),
+                ("value", models.DateTimeField()),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="appointment",
+            index=models.Index(fields=["updated_at"], name="appt_updated_idx"),
+        ),
+        migrations.AddField(
+            model_name="dailyappointmentrollup",
+            name="doctor",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="+",
+                to="hospital.doctor",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="dailyappointmentrollup",
+            constraint=models.UniqueConstraint(
+                fields=("day", "doctor", "status"), name="rollup_day_doctor_status_uniq"
+            ),
+        ),
+    ]
@@ -0,0 +1,76 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:34
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("hospital", "0009_notification_outbox"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ArchivedAppointment",
+            fields=[
+                ("id", models.BigIntegerField(primary_key=True, serialize=False)),
+                ("requested_date", models.DateTimeField()),
+                ("symptoms", models.TextField()),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("pending", "Pending Approval"),
+                            ("approved", "Approved"),
+                            ("rejected", "Rejected"),
+                            ("completed", "Completed"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                ("receptionist_notes", models.TextField(blank=True)),
+                ("doctor_notes", models.TextField(blank=True)),
+                ("created_at", models.DateTimeField()),
+                ("updated_at", models.DateTimeField()),
+                (
+                    "archive_month",
+                    models.DateField(
+                        help_text="First day of the month of the requested date"
+                    ),
+                ),
+                ("archived_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "doctor",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="hospital.doctor",
+                    ),
+                ),
+                (
+                    "patient",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="hospital.patient",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["patient", "-created_at"],
+                        name="archive_patient_created_idx",
+                    ),
+                    models.Index(
+                        fields=["archive_month", "doctor"],
+                        name="archive_month_doctor_idx",
+                    ),
+                    models.Index(
+                        fields=["requested_date"], name="archive_requested_idx"
+                    ),
+                ],
+            },
+        ),
+    ]
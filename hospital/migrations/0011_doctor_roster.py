@@ -0,0 +1,92 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.utils import timezone
+from django.utils.text import Truncator
+
+
+def fill_roster(apps, schema_editor):
+    Appointment = apps.get_model("hospital", "Appointment")
+    RosterEntry = apps.get_model("hospital", "RosterEntry")
+    approved = (
+        Appointment.objects.filter(status="approved")
+        .select_related("patient")
+        .order_by("pk")
+    )
+    RosterEntry.objects.bulk_create(
+        (
+            RosterEntry(
+                appointment_id=appointment.pk,
+                doctor_id=appointment.doctor_id,
+                day=timezone.localdate(appointment.requested_date),
+                requested_date=appointment.requested_date,
+                patient_id=appointment.patient_id,
+                patient_name=appointment.patient.name,
+                patient_phone=appointment.patient.phone,
+                summary=Truncator(appointment.symptoms).chars(120),
+                receptionist_notes=appointment.receptionist_notes,
+            )
+            for appointment in approved.iterator(chunk_size=1000)
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("hospital", "0010_appointment_archive"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RosterEntry",
+            fields=[
+                (
+                    "appointment",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="+",
+                        serialize=False,
+                        to="hospital.appointment",
+                    ),
+                ),
+                ("day", models.DateField(help_text="Local date of the requested time")),
+                ("requested_date", models.DateTimeField()),
+                ("patient_name", models.CharField(max_length=120)),
+                ("patient_phone", models.CharField(blank=True, max_length=20)),
+                (
+                    "summary",
+                    models.CharField(help_text="Symptoms, truncated", max_length=120),
+                ),
+                ("receptionist_notes", models.TextField(blank=True)),
+                (
+                    "doctor",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="hospital.doctor",
+                    ),
+                ),
+                (
+                    "patient",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="hospital.patient",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["doctor", "day", "requested_date"],
+                        name="roster_doctor_day_idx",
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(fill_roster, migrations.RunPython.noop, elidable=True),
+    ]
@@ -0,0 +1,22 @@
+from django.core.management import call_command
+from django.db import migrations
+
+
+def create_cache_table(apps, schema_editor):
+    # The "versions" cache (hospitalmngmt/caches.py) is a database table
+    # unless a shared cache backend is configured; createcachetable skips
+    # tables that exist and caches that are not in the database.
+    call_command(
+        "createcachetable", database=schema_editor.connection.alias, verbosity=0
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("hospital", "0012_import_checkpoint"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_cache_table, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,6 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
 
 
 # Create your models here.
@@ -10,6 +11,9 @@ class Doctor(models.Model):
     phone = models.CharField(max_length=20, blank=True)
     email = models.EmailField(blank=True)
 
+    class Meta:
+        indexes = [models.Index(fields=["name", "id"], name="doctor_name_id_idx")]
+
     def __str__(self):
         return f"{self.name} ({self.specialty})" if self.specialty else self.name
 
@@ -32,10 +36,79 @@ class Patient(models.Model):
         related_name="patients",
     )
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored doctor so a reassignment can invalidate the
+        # previous doctor's dashboard too.
+        if "doctor_id" in field_names:
+            instance._loaded_doctor_id = instance.doctor_id
+        return instance
+
+    class Meta:
+        indexes = [models.Index(fields=["name", "id"], name="patient_name_id_idx")]
+
     def __str__(self):
         return self.name
 
 
+class AppointmentQuerySet(models.QuerySet):
+    """Querysets behind the dashboards, kept here so their indexes stay in sync."""
+
+    def pending_queue(self):
+        return (
+            self.filter(status="pending")
+            .select_related("patient", "doctor")
+            .order_by("-created_at")
+        )
+
+    def approved_between(self, start, end):
+        return (
+            self.filter(
+                status="approved", requested_date__gte=start, requested_date__lt=end
+            )
+            .select_related("patient", "doctor")
+            .order_by("requested_date", "id")
+        )
+
+    def history_for_patient(self, patient):
+        return (
+            self.filter(patient=patient)
+            .select_related("doctor")
+            .order_by("-created_at")
+        )
+
+    def full_history_for_patient(self, patient):
+        """history_for_patient with the patient's archived appointments."""
+        return self.including_archive(patient=patient, related=("doctor",)).order_by(
+            "-created_at"
+        )
+
+    def including_archive(self, related=(), **filters):
+        """
+        Appointments matching ``filters`` in this table and in the archive,
+        read with one UNION ALL as Appointment instances flagged ``archived``.
+        Pass every filter here: the result can only be ordered, sliced or
+        counted, and the foreign keys in ``related`` are joined on both sides.
+        """
+        columns = [field.attname for field in self.model._meta.concrete_fields]
+        live = (
+            self.filter(**filters)
+            .select_related(*related)
+            .annotate(archived=models.Value(False))
+            .order_by()
+        )
+        archived = (
+            ArchivedAppointment.objects.using(self.db)
+            .filter(**filters)
+            .select_related(*related)
+            .only(*columns, *related)
+            .annotate(archived=models.Value(True))
+            .order_by()
+        )
+        return live.union(archived, all=True)
+
+
 class Appointment(models.Model):
     STATUS_CHOICES = (
         ("pending", "Pending Approval"),
@@ -62,8 +135,222 @@ class Appointment(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = AppointmentQuerySet.as_manager()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored status and doctor so signal handlers can tell a
+        # status change or reassignment from any other edit without re-reading
+        # the row.
+        if "status" in field_names:
+            instance._loaded_status = instance.status
+        if "doctor_id" in field_names:
+            instance._loaded_doctor_id = instance.doctor_id
+        return instance
+
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            # receptionist_dashboard: status = ? ORDER BY created_at DESC
+            models.Index(
+                fields=["status", "-created_at"], name="appt_status_created_idx"
+            ),
+            # refresh_roster --doctor: doctor = ? AND status = ?
+            models.Index(
+                fields=["doctor", "status", "requested_date"],
+                name="appt_doctor_status_date_idx",
+            ),
+            # receptionist_dashboard: status = ? AND requested_date in a window
+            models.Index(
+                fields=["status", "requested_date"], name="appt_status_date_idx"
+            ),
+            # patient_dashboard: patient = ? ORDER BY created_at DESC
+            models.Index(
+                fields=["patient", "-created_at"], name="appt_patient_created_idx"
+            ),
+            # refresh_rollups: updated_at > watermark
+            models.Index(fields=["updated_at"], name="appt_updated_idx"),
+        ]
 
     def __str__(self):
         return f"{self.patient.name} - {self.doctor.name} ({self.get_status_display()})"
+
+
+class ArchivedAppointment(models.Model):
+    """
+    A completed or rejected appointment moved out of Appointment by the
+    archive_appointments command (see hospital/archive.py), keeping its id.
+    The columns up to updated_at match Appointment's, in the same order, so
+    the two tables can be read as one with a UNION.
+    """
+
+    id = models.BigIntegerField(primary_key=True)
+    patient = models.ForeignKey(Patient, on_delete=models.CASCADE, related_name="+")
+    doctor = models.ForeignKey(Doctor, on_delete=models.CASCADE, related_name="+")
+    requested_date = models.DateTimeField()
+    symptoms = models.TextField()
+    status = models.CharField(max_length=20, choices=Appointment.STATUS_CHOICES)
+    receptionist_notes = models.TextField(blank=True)
+    doctor_notes = models.TextField(blank=True)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archive_month = models.DateField(
+        help_text="First day of the month of the requested date"
+    )
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # Patient history: patient = ? ORDER BY created_at DESC
+            models.Index(
+                fields=["patient", "-created_at"], name="archive_patient_created_idx"
+            ),
+            # One month of the archive at a time.
+            models.Index(
+                fields=["archive_month", "doctor"], name="archive_month_doctor_idx"
+            ),
+            # refresh_rollups: requested_date in a range of days
+            models.Index(fields=["requested_date"], name="archive_requested_idx"),
+        ]
+
+    def __str__(self):
+        return f"#{self.pk} {self.status} ({self.archive_month:%Y-%m})"
+
+
+class DailyAppointmentRollup(models.Model):
+    """
+    Appointments per doctor, local day of the requested date and status,
+    maintained by the refresh_rollups command (see hospital/reporting.py).
+    """
+
+    day = models.DateField()
+    doctor = models.ForeignKey(Doctor, on_delete=models.CASCADE, related_name="+")
+    specialty = models.CharField(max_length=100, blank=True)
+    status = models.CharField(max_length=20, choices=Appointment.STATUS_CHOICES)
+    appointments = models.PositiveIntegerField(default=0)
+    decision_seconds = models.FloatField(
+        default=0,
+        help_text="Total time from request to approval or rejection, in seconds",
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["day", "doctor", "status"], name="rollup_day_doctor_status_uniq"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.doctor_id} {self.status}: {self.appointments}"
+
+
+class RosterEntry(models.Model):
+    """
+    An approved appointment on its doctor's day-by-day roster, with what the
+    dashboard and the daily roster show, kept in step with approvals (see
+    hospital/roster.py).
+    """
+
+    appointment = models.OneToOneField(
+        Appointment, on_delete=models.CASCADE, primary_key=True, related_name="+"
+    )
+    doctor = models.ForeignKey(Doctor, on_delete=models.CASCADE, related_name="+")
+    day = models.DateField(help_text="Local date of the requested time")
+    requested_date = models.DateTimeField()
+    patient = models.ForeignKey(Patient, on_delete=models.CASCADE, related_name="+")
+    patient_name = models.CharField(max_length=120)
+    patient_phone = models.CharField(max_length=20, blank=True)
+    summary = models.CharField(max_length=120, help_text="Symptoms, truncated")
+    receptionist_notes = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            # doctor_dashboard, doctor_roster: doctor = ? AND day BETWEEN ? AND ?
+            # ORDER BY day, requested_date
+            models.Index(
+                fields=["doctor", "day", "requested_date"],
+                name="roster_doctor_day_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.day} #{self.appointment_id} {self.patient_name}"
+
+
+class ReportWatermark(models.Model):
+    """How far (by Appointment.updated_at) each rollup has been brought up to date."""
+
+    name = models.CharField(max_length=50, unique=True)
+    value = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.name} @ {self.value}"
+
+
+class Notification(models.Model):
+    """
+    Outbox row for one message about an appointment, written in the same
+    transaction as the status change and delivered by the send_notifications
+    command (see hospital/notifications.py).
+    """
+
+    RECIPIENT_CHOICES = (("patient", "Patient"), ("doctor", "Doctor"))
+    STATE_CHOICES = (
+        ("pending", "Pending"),
+        ("sent", "Sent"),
+        ("superseded", "Superseded"),
+        ("failed", "Failed"),
+    )
+
+    appointment = models.ForeignKey(
+        Appointment, on_delete=models.CASCADE, related_name="notifications"
+    )
+    recipient = models.CharField(max_length=10, choices=RECIPIENT_CHOICES)
+    status = models.CharField(
+        max_length=20,
+        choices=Appointment.STATUS_CHOICES,
+        help_text="Appointment status the message announces",
+    )
+    dedup_key = models.CharField(max_length=100)
+    state = models.CharField(max_length=10, choices=STATE_CHOICES, default="pending")
+    attempts = models.PositiveSmallIntegerField(default=0)
+    available_at = models.DateTimeField(
+        default=timezone.now, help_text="Not picked up for delivery before this time"
+    )
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # send_notifications: state = 'pending' AND available_at <= now
+            models.Index(fields=["state", "available_at"], name="notification_due_idx"),
+        ]
+        constraints = [
+            # At most one undelivered copy of each message.
+            models.UniqueConstraint(
+                fields=["dedup_key"],
+                condition=models.Q(state="pending"),
+                name="notification_pending_dedup_uniq",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.recipient} {self.status} #{self.appointment_id} ({self.state})"
+
+
+class ImportCheckpoint(models.Model):
+    """
+    Rows of a source file import_records has imported, written in the same
+    transaction as each batch so a resumed import neither skips nor repeats
+    rows.
+    """
+
+    name = models.CharField(max_length=500, unique=True)
+    source = models.CharField(max_length=500)
+    rows = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name}: {self.rows} rows"
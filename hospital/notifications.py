@@ -0,0 +1,224 @@
+"""
+Patient and doctor notifications about appointment decisions, via an outbox.
+
+A status change does not send anything itself. :func:`enqueue` adds one
+:class:`~hospital.models.Notification` row per recipient with a single
+INSERT in the transaction that changes the status, so a rolled-back change
+never notifies anyone and the request never waits on a mail server. The
+``send_notifications`` command then delivers due rows in batches through
+the transport named by ``HOSPITAL_NOTIFICATION_TRANSPORT``.
+
+Delivery is at least once. Each batch is leased to one worker for
+``HOSPITAL_NOTIFICATION_LEASE_SECONDS``, and a worker that dies mid-batch
+leaves it to be picked up again when the lease runs out. A failed message
+is retried with exponential backoff until ``HOSPITAL_NOTIFICATION_MAX_ATTEMPTS``.
+Duplicates are dropped twice. A partial unique index on ``dedup_key`` keeps
+a single pending copy of each message. At send time, a row announcing a
+status the appointment no longer has is marked superseded, so a quick
+approve-then-reject sends only the rejection.
+"""
+
+import random
+from collections import namedtuple
+from datetime import timedelta
+from functools import lru_cache
+
+from django.conf import settings
+from django.core import mail
+from django.db import transaction
+from django.db.models import F
+from django.template import loader
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Notification
+
+DEFAULT_TRANSPORT = "hospital.notifications.EmailTransport"
+DEFAULT_MAX_ATTEMPTS = 8
+# Seconds before the first retry, and the longest wait between retries.
+DEFAULT_RETRY_SECONDS = (30, 3600)
+DEFAULT_LEASE_SECONDS = 300
+
+# Appointment status -> who is told about it.
+RECIPIENTS = {
+    "approved": ("patient", "doctor"),
+    "rejected": ("patient",),
+}
+
+Message = namedtuple("Message", "to subject body")
+
+
+class EmailTransport:
+    """Send through EMAIL_BACKEND, over one connection per batch."""
+
+    def send(self, messages):
+        """Deliver ``messages``; return an exception or None for each one."""
+        try:
+            connection = mail.get_connection()
+            connection.open()
+        except Exception as exc:
+            return [exc] * len(messages)
+        results = []
+        try:
+            for message in messages:
+                email = mail.EmailMessage(
+                    message.subject, message.body, to=[message.to]
+                )
+                try:
+                    connection.send_messages([email])
+                except Exception as exc:
+                    results.append(exc)
+                else:
+                    results.append(None)
+        finally:
+            connection.close()
+        return results
+
+
+@lru_cache(maxsize=None)
+def get_transport():
+    path = getattr(settings, "HOSPITAL_NOTIFICATION_TRANSPORT", DEFAULT_TRANSPORT)
+    return import_string(path)()
+
+
+def max_attempts():
+    return getattr(settings, "HOSPITAL_NOTIFICATION_MAX_ATTEMPTS", DEFAULT_MAX_ATTEMPTS)
+
+
+def lease_seconds():
+    return getattr(
+        settings, "HOSPITAL_NOTIFICATION_LEASE_SECONDS", DEFAULT_LEASE_SECONDS
+    )
+
+
+def retry_delay(attempts):
+    """Backoff before attempt ``attempts + 1``, with jitter to spread retries."""
+    first, longest = getattr(
+        settings, "HOSPITAL_NOTIFICATION_RETRY_SECONDS", DEFAULT_RETRY_SECONDS
+    )
+    delay = min(longest, first * 2 ** (attempts - 1))
+    return timedelta(seconds=delay * random.uniform(0.8, 1.2))
+
+
+def dedup_key(appointment_id, recipient, status):
+    return f"appointment:{appointment_id}:{recipient}:{status}"
+
+
+def enqueue(appointments):
+    """Queue the messages announcing each appointment's current status."""
+    rows = [
+        Notification(
+            appointment_id=appointment.pk,
+            recipient=recipient,
+            status=appointment.status,
+            dedup_key=dedup_key(appointment.pk, recipient, appointment.status),
+        )
+        for appointment in appointments
+        for recipient in RECIPIENTS.get(appointment.status, ())
+    ]
+    if rows:
+        Notification.objects.bulk_create(rows, ignore_conflicts=True)
+    return len(rows)
+
+
+def claim(batch_size, now=None):
+    """Lease up to ``batch_size`` due notifications to this worker."""
+    now = now or timezone.now()
+    with transaction.atomic():
+        pks = list(
+            Notification.objects.select_for_update(skip_locked=True)
+            .filter(state="pending", available_at__lte=now)
+            .order_by("available_at", "id")
+            .values_list("pk", flat=True)[:batch_size]
+        )
+        Notification.objects.filter(pk__in=pks).update(
+            attempts=F("attempts") + 1,
+            available_at=now + timedelta(seconds=lease_seconds()),
+        )
+    return list(
+        Notification.objects.filter(pk__in=pks)
+        .select_related("appointment__patient__user", "appointment__doctor__user")
+        .order_by("id")
+    )
+
+
+def address(notification):
+    if notification.recipient == "doctor":
+        doctor = notification.appointment.doctor
+        return doctor.email or (doctor.user.email if doctor.user else "")
+    patient = notification.appointment.patient
+    return patient.user.email if patient.user else ""
+
+
+def compose(notification, to):
+    appointment = notification.appointment
+    subject = (
+        f"Appointment {appointment.get_status_display().lower()}: "
+        f"{timezone.localtime(appointment.requested_date):%b %d, %Y %I:%M %p}"
+    )
+    body = loader.render_to_string(
+        "notifications/appointment_status.txt",
+        {"notification": notification, "appointment": appointment},
+    )
+    return Message(to, subject, body)
+
+
+def deliver(notifications, transport=None):
+    """
+    Send claimed ``notifications`` and record the outcome of each. Returns
+    a dict of outcome -> count, where "retry" counts rescheduled rows.
+    """
+    transport = transport or get_transport()
+    now = timezone.now()
+    sent, superseded, unsent, outgoing = [], [], [], []
+    for notification in notifications:
+        if notification.status != notification.appointment.status:
+            superseded.append(notification.pk)
+            continue
+        to = address(notification)
+        if not to:
+            notification.state = "failed"
+            notification.last_error = "No email address."
+            unsent.append(notification)
+            continue
+        outgoing.append((notification, compose(notification, to)))
+
+    errors = transport.send([message for _, message in outgoing]) if outgoing else []
+    for (notification, _), error in zip(outgoing, errors):
+        if error is None:
+            sent.append(notification.pk)
+            continue
+        notification.last_error = f"{type(error).__name__}: {error}"
+        if notification.attempts >= max_attempts():
+            notification.state = "failed"
+        else:
+            notification.available_at = now + retry_delay(notification.attempts)
+        unsent.append(notification)
+
+    with transaction.atomic():
+        Notification.objects.filter(pk__in=sent).update(
+            state="sent", sent_at=now, last_error=""
+        )
+        Notification.objects.filter(pk__in=superseded).update(state="superseded")
+        Notification.objects.bulk_update(
+            unsent, ["state", "available_at", "last_error"], batch_size=500
+        )
+    failed = sum(1 for notification in unsent if notification.state == "failed")
+    return {
+        "sent": len(sent),
+        "superseded": len(superseded),
+        "failed": failed,
+        "retry": len(unsent) - failed,
+    }
+
+
+def drain(batch_size=100, transport=None):
+    """Deliver every notification that is due now, a batch at a time."""
+    totals = {"sent": 0, "superseded": 0, "failed": 0, "retry": 0}
+    until = timezone.now()
+    while True:
+        batch = claim(batch_size, now=until)
+        if not batch:
+            return totals
+        for state, count in deliver(batch, transport).items():
+            totals[state] += count
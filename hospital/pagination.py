@@ -0,0 +1,174 @@
+import base64
+import json
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import Q
+from django.http import Http404, StreamingHttpResponse
+from django.template import loader
+from django.utils.safestring import mark_safe
+
+DEFAULT_PAGE_SIZE = 50
+DEFAULT_STREAM_CHUNK_SIZE = 2000
+STREAM_MARKER = "<!--hospital-stream-rows-->"
+NAME_ORDERING = ("name", "id")
+
+
+def encode_cursor(*values):
+    """Encode a keyset position into an opaque, URL-safe cursor."""
+    # isoformat() rather than DjangoJSONEncoder, which drops microseconds and
+    # would make the position ambiguous.
+    values = [v.isoformat() if hasattr(v, "isoformat") else v for v in values]
+    raw = json.dumps(values, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """Decode a cursor produced by encode_cursor, raising Http404 if invalid."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(values, list) or not all(
+            isinstance(v, (str, int)) for v in values
+        ):
+            raise ValueError(cursor)
+    except (ValueError, TypeError):
+        raise Http404("Invalid cursor.")
+    return tuple(values)
+
+
+def keyset_queryset(queryset, cursor=None, ordering=NAME_ORDERING):
+    """
+    Order ``queryset`` by ``ordering`` (a sort field followed by a unique
+    tie-breaker, each optionally prefixed with "-") and restrict it to rows
+    after ``cursor``.
+    """
+    queryset = queryset.order_by(*ordering)
+    if cursor:
+        values = decode_cursor(cursor)
+        if len(values) != len(ordering):
+            raise Http404("Invalid cursor.")
+        (sort, sort_value), (tie, tie_value) = [
+            _field_value(queryset.model, field, value)
+            for field, value in zip(ordering, values)
+        ]
+        # The redundant sort >= ? (or <= ?) bound lets SQLite seek into the
+        # index instead of scanning it from the start.
+        queryset = queryset.filter(
+            Q(**{f"{sort}__{_op(ordering[0], True)}": sort_value}),
+            Q(**{f"{sort}__{_op(ordering[0])}": sort_value})
+            | Q(**{f"{tie}__{_op(ordering[1])}": tie_value}),
+        )
+    return queryset
+
+
+def _op(field, inclusive=False):
+    op = "lt" if field.startswith("-") else "gt"
+    return op + "e" if inclusive else op
+
+
+def _field_value(model, field, value):
+    name = field.lstrip("-")
+    try:
+        return name, model._meta.get_field(name).to_python(value)
+    except ValidationError:
+        raise Http404("Invalid cursor.")
+
+
+def _page_size(per_page):
+    if per_page is None:
+        per_page = getattr(settings, "HOSPITAL_LIST_PAGE_SIZE", DEFAULT_PAGE_SIZE)
+    return per_page
+
+
+def _cut(rows, per_page, ordering):
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        last = rows[-1]
+        next_cursor = encode_cursor(
+            *(getattr(last, field.lstrip("-")) for field in ordering)
+        )
+    return rows, next_cursor
+
+
+def keyset_page(queryset, cursor=None, per_page=None, ordering=NAME_ORDERING):
+    """
+    Return one page of ``queryset`` in ``ordering``, starting after
+    ``cursor``, together with the cursor for the next page (or None).
+
+    Unlike OFFSET pagination this never scans skipped rows, so page N costs
+    the same as page 1 given an index matching ``ordering``.
+    """
+    per_page = _page_size(per_page)
+    queryset = keyset_queryset(queryset, cursor, ordering)
+    return _cut(list(queryset[: per_page + 1]), per_page, ordering)
+
+
+async def akeyset_page(queryset, cursor=None, per_page=None, ordering=NAME_ORDERING):
+    """keyset_page() for async views."""
+    per_page = _page_size(per_page)
+    queryset = keyset_queryset(queryset, cursor, ordering)
+    rows = [row async for row in queryset[: per_page + 1]]
+    return _cut(rows, per_page, ordering)
+
+
+def _stream_rows(queryset, head, tail, row_template, context_name, chunk_size):
+    template = loader.get_template(row_template)
+    yield head
+    chunk = []
+    for obj in queryset.iterator(chunk_size=chunk_size):
+        chunk.append(template.render({context_name: obj}))
+        if len(chunk) >= chunk_size:
+            yield "".join(chunk)
+            chunk = []
+    if chunk:
+        yield "".join(chunk)
+    yield tail
+
+
+async def _astream_rows(queryset, head, tail, row_template, context_name, chunk_size):
+    template = loader.get_template(row_template)
+    yield head
+    chunk = []
+    async for obj in queryset.aiterator(chunk_size=chunk_size):
+        chunk.append(template.render({context_name: obj}))
+        if len(chunk) >= chunk_size:
+            yield "".join(chunk)
+            chunk = []
+    if chunk:
+        yield "".join(chunk)
+    yield tail
+
+
+def streaming_list_response(
+    request, queryset, page_template, row_template, context_name, chunk_size=None
+):
+    """
+    Render ``page_template`` around every row of ``queryset`` as a
+    StreamingHttpResponse.
+
+    The page is rendered once with ``stream_marker`` in its context; the
+    template places the marker where the rows belong and the rows are then
+    rendered in chunks from a server-side iterator, so memory use does not
+    grow with the size of the table.
+
+    Under ASGI the rows come from an async iterator. Django buffers whole
+    responses whose iterator does not match the server, so WSGI keeps the
+    synchronous one.
+    """
+    if chunk_size is None:
+        chunk_size = getattr(
+            settings, "HOSPITAL_LIST_STREAM_CHUNK_SIZE", DEFAULT_STREAM_CHUNK_SIZE
+        )
+    page = loader.render_to_string(
+        page_template, {"stream_marker": mark_safe(STREAM_MARKER)}, request=request
+    )
+    head, _, tail = page.partition(STREAM_MARKER)
+    queryset = queryset.order_by(*NAME_ORDERING)
+    rows = _astream_rows if isinstance(request, ASGIRequest) else _stream_rows
+    return StreamingHttpResponse(
+        rows(queryset, head, tail, row_template, context_name, chunk_size),
+        content_type="text/html; charset=utf-8",
+    )
@@ -0,0 +1,61 @@
+"""
+PRAGMAs applied to every new SQLite connection.
+
+SQLite starts each connection with conservative defaults: a rollback journal
+that blocks readers while a write commits, a full fsync on every commit and
+a small page cache. ``HOSPITAL_SQLITE_PRAGMAS`` replaces them, in order, with
+a profile suited to a multi-threaded web server. Write-ahead logging lets
+readers run alongside the single writer, and ``busy_timeout`` makes a writer
+wait for the lock instead of failing with "database is locked".
+``journal_mode`` is stored in the database file; the rest last for the
+connection.
+"""
+
+import re
+
+from django.conf import settings
+
+DEFAULT_PRAGMAS = {
+    "busy_timeout": 5000,  # ms
+    "journal_mode": "wal",
+    # Durable across application crashes; only a power loss can drop the
+    # last commits, never corrupt the file.
+    "synchronous": "normal",
+    "mmap_size": 128 * 1024 * 1024,  # bytes
+    "cache_size": -20000,  # negative: KiB rather than pages
+    "temp_store": "memory",
+}
+
+_NAME = re.compile(r"^[a-z_]+$")
+_VALUE = re.compile(r"^-?\w+$")
+
+
+def profile():
+    return getattr(settings, "HOSPITAL_SQLITE_PRAGMAS", DEFAULT_PRAGMAS)
+
+
+def statements(pragmas):
+    for name, value in pragmas.items():
+        if not _NAME.match(name) or not _VALUE.match(str(value)):
+            raise ValueError(f"Invalid SQLite pragma {name} = {value!r}")
+        yield f"PRAGMA {name} = {value}"
+
+
+def apply(connection, pragmas=None):
+    """Run the pragma profile on ``connection`` if it is SQLite."""
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        for statement in statements(profile() if pragmas is None else pragmas):
+            cursor.execute(statement)
+
+
+def current(connection, names):
+    """The values ``connection`` reports for the given pragmas."""
+    values = {}
+    with connection.cursor() as cursor:
+        for name in names:
+            cursor.execute(f"PRAGMA {name}")
+            row = cursor.fetchone()
+            values[name] = row[0] if row else None
+    return values
@@ -0,0 +1,139 @@
+"""
+Bulk creation of login accounts with their Doctor/Patient profiles.
+
+Password hashing dominates account creation (PBKDF2 is deliberately slow), so
+hashes are computed in a process pool across all cores, and the ``User`` rows
+and profiles are then written with batched ``bulk_create`` calls. Each account
+ends up exactly as ``User.objects.create_user(username, email, password)``
+followed by saving the profile would leave it.
+"""
+
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+
+from . import assignment, counters, fragments
+from .models import Doctor, Patient
+
+Account = namedtuple("Account", ["username", "password", "profile", "email"])
+Account.__new__.__defaults__ = ("",)
+
+# Below this many passwords a pool costs more to start than it saves.
+POOL_THRESHOLD = 8
+
+
+def _init_worker(settings_module):
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", settings_module)
+    import django
+
+    django.setup()
+
+
+def hash_passwords(passwords, executor=None):
+    """Return ``make_password`` of each password, in order."""
+    passwords = list(passwords)
+    if executor is None or len(passwords) < POOL_THRESHOLD:
+        return [make_password(p) for p in passwords]
+    chunksize = max(1, len(passwords) // ((os.cpu_count() or 1) * 4))
+    return list(executor.map(make_password, passwords, chunksize=chunksize))
+
+
+def hashing_pool(processes=None):
+    return ProcessPoolExecutor(
+        max_workers=processes or os.cpu_count(),
+        initializer=_init_worker,
+        initargs=(os.environ.get("DJANGO_SETTINGS_MODULE", "hospitalmngmt.settings"),),
+    )
+
+
+def provision_accounts(accounts, batch_size=500, processes=None):
+    """
+    Create a ``User`` and its linked profile for every :class:`Account`.
+
+    ``profile`` is an unsaved Doctor or Patient. Accounts whose username is
+    already taken (in the database or earlier in ``accounts``) are skipped.
+    Returns ``(created, skipped_usernames)``.
+    """
+    created = 0
+    skipped = []
+    seen = set()
+    accounts = iter(accounts)
+    pool = hashing_pool(processes) if processes != 1 else None
+    try:
+        while True:
+            batch = list(islice(accounts, batch_size))
+            if not batch:
+                break
+            batch = [
+                account._replace(
+                    username=User.normalize_username(account.username),
+                    email=User.objects.normalize_email(account.email),
+                )
+                for account in batch
+            ]
+            taken = set(
+                User.objects.filter(
+                    username__in=[a.username for a in batch]
+                ).values_list("username", flat=True)
+            )
+            fresh = []
+            for account in batch:
+                if account.username in taken or account.username in seen:
+                    skipped.append(account.username)
+                else:
+                    seen.add(account.username)
+                    fresh.append(account)
+
+            hashes = hash_passwords([a.password for a in fresh], executor=pool)
+            users = [
+                User(username=a.username, email=a.email, password=h)
+                for a, h in zip(fresh, hashes)
+            ]
+            with transaction.atomic():
+                User.objects.bulk_create(users)
+                if not connection.features.can_return_rows_from_bulk_insert:
+                    ids = dict(
+                        User.objects.filter(
+                            username__in=[u.username for u in users]
+                        ).values_list("username", "pk")
+                    )
+                    for user in users:
+                        user.pk = ids[user.username]
+                by_model = {}
+                for account, user in zip(fresh, users):
+                    account.profile.user = user
+                    by_model.setdefault(type(account.profile), []).append(
+                        account.profile
+                    )
+                for model, profiles in by_model.items():
+                    model.objects.bulk_create(profiles)
+                _invalidate([account.profile for account in fresh])
+            created += len(fresh)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    counters.invalidate()
+    assignment.invalidate()
+    return created, skipped
+
+
+def _invalidate(profiles):
+    """
+    Bump the cached dashboards showing ``profiles`` once they commit:
+    bulk_create skips the signals that would. A new patient appears on their
+    doctor's dashboard.
+    """
+    doctor_ids = {p.pk for p in profiles if isinstance(p, Doctor)}
+    doctor_ids |= {p.doctor_id for p in profiles if isinstance(p, Patient)}
+    patient_ids = {p.pk for p in profiles if isinstance(p, Patient)}
+
+    def bump():
+        fragments.bump("doctor", *doctor_ids)
+        fragments.bump("patient", *patient_ids)
+
+    transaction.on_commit(bump)
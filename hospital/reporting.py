@@ -0,0 +1,259 @@
+"""
+Appointment analytics served from pre-computed daily rollups.
+
+:class:`~hospital.models.DailyAppointmentRollup` holds one row per doctor,
+local day of the requested date and status. :func:`refresh` brings it up to
+date from a watermark: it finds the days touched by appointments updated
+since the last run (through the ``updated_at`` index), recomputes just those
+days from ``Appointment`` and moves the watermark forward. The report
+functions read only the rollups, so their cost depends on the number of
+days and doctors in the range, not on the number of appointments.
+
+A day is recomputed from Appointment and ArchivedAppointment together, so
+archiving (hospital/archive.py) changes no totals. Deleting an appointment
+leaves its day alone until something else on that day changes, and a
+rescheduled appointment is only removed from its old day by a rebuild
+(``refresh_rollups --rebuild``).
+"""
+
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, DurationField, ExpressionWrapper, F, Q, Sum
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from .models import (
+    Appointment,
+    ArchivedAppointment,
+    DailyAppointmentRollup,
+    ReportWatermark,
+)
+
+WATERMARK = "daily_appointments"
+DEFAULT_LAG_SECONDS = 60
+# Days recomputed per query and transaction.
+RUN_DAYS = 31
+# Statuses whose updated_at marks the receptionist's decision. Completed
+# appointments are excluded: completing one moves updated_at again.
+DECIDED = ("approved", "rejected")
+
+_LATENCY = ExpressionWrapper(F("updated_at") - F("created_at"), DurationField())
+
+
+def lag():
+    """
+    Seconds the watermark trails the clock, so rows committed late by a
+    long transaction are still picked up by the next refresh.
+    """
+    return getattr(settings, "HOSPITAL_REPORTING_LAG_SECONDS", DEFAULT_LAG_SECONDS)
+
+
+def _local_day(field):
+    return TruncDate(field, tzinfo=timezone.get_current_timezone())
+
+
+def day_bounds(first, last):
+    """Aware [start, end) covering the local days ``first`` to ``last``."""
+    return (
+        timezone.make_aware(datetime.combine(first, time.min)),
+        timezone.make_aware(datetime.combine(last + timedelta(days=1), time.min)),
+    )
+
+
+def runs(days, limit=RUN_DAYS):
+    """Group sorted days into (first, last) runs of consecutive days."""
+    first = last = None
+    for day in days:
+        if first is not None and day == last + timedelta(days=1):
+            if (day - first).days < limit:
+                last = day
+                continue
+        if first is not None:
+            yield first, last
+        first = last = day
+    if first is not None:
+        yield first, last
+
+
+def _days(appointments):
+    return set(
+        appointments.order_by()
+        .annotate(day=_local_day("requested_date"))
+        .values_list("day", flat=True)
+        .distinct()
+    )
+
+
+def changed_days(since, until):
+    appointments = Appointment.objects.filter(updated_at__lte=until)
+    if since is not None:
+        return _days(appointments.filter(updated_at__gt=since))
+    # Archived appointments never change, so they only matter to a rebuild.
+    return _days(appointments) | _days(ArchivedAppointment.objects.all())
+
+
+def _groups(model, start, end):
+    return (
+        model.objects.filter(requested_date__gte=start, requested_date__lt=end)
+        .order_by()
+        .annotate(day=_local_day("requested_date"))
+        .values("day", "doctor_id", "doctor__specialty", "status")
+        .annotate(
+            appointments=Count("id"),
+            decision=Sum(_LATENCY, filter=Q(status__in=DECIDED)),
+        )
+    )
+
+
+def recompute(first, last):
+    """Replace the rollups for the days ``first`` to ``last``."""
+    start, end = day_bounds(first, last)
+    totals = {}
+    for model in (Appointment, ArchivedAppointment):
+        for group in _groups(model, start, end):
+            key = (
+                group["day"],
+                group["doctor_id"],
+                group["doctor__specialty"],
+                group["status"],
+            )
+            count, seconds = totals.get(key, (0, 0))
+            if group["decision"]:
+                seconds += group["decision"].total_seconds()
+            totals[key] = (count + group["appointments"], seconds)
+    rollups = []
+    for (day, doctor_id, specialty, status), (count, seconds) in totals.items():
+        rollups.append(
+            DailyAppointmentRollup(
+                day=day,
+                doctor_id=doctor_id,
+                specialty=specialty,
+                status=status,
+                appointments=count,
+                decision_seconds=seconds,
+            )
+        )
+    with transaction.atomic():
+        DailyAppointmentRollup.objects.filter(day__range=(first, last)).delete()
+        DailyAppointmentRollup.objects.bulk_create(rollups, batch_size=1000)
+    return len(rollups)
+
+
+def refresh(rebuild=False, until=None):
+    """
+    Recompute every day touched since the watermark (or all of them) and
+    advance the watermark to ``until``. Returns the number of days redone.
+    """
+    if until is None:
+        until = timezone.now() - timedelta(seconds=lag())
+    watermark = ReportWatermark.objects.filter(name=WATERMARK).first()
+    since = None if rebuild or watermark is None else watermark.value
+    if since is None:
+        DailyAppointmentRollup.objects.all().delete()
+    days = sorted(changed_days(since, until))
+    for first, last in runs(days):
+        recompute(first, last)
+    ReportWatermark.objects.update_or_create(name=WATERMARK, defaults={"value": until})
+    return len(days)
+
+
+def _rollups(first, last):
+    return DailyAppointmentRollup.objects.filter(day__range=(first, last)).order_by()
+
+
+def _by_status():
+    return {
+        status: Coalesce(Sum("appointments", filter=Q(status=status)), 0)
+        for status, _ in Appointment.STATUS_CHOICES
+    }
+
+
+def _average_hours(row):
+    if not row["decided"]:
+        return None
+    return round(row["decision_seconds"] / row["decided"] / 3600, 2)
+
+
+def daily_volume(first, last):
+    return list(
+        _rollups(first, last)
+        .values("day")
+        .annotate(total=Sum("appointments"), **_by_status())
+        .order_by("day")
+    )
+
+
+def doctor_load(first, last):
+    return list(
+        _rollups(first, last)
+        .values("doctor_id", "doctor__name")
+        .annotate(total=Sum("appointments"), **_by_status())
+        .order_by("-total", "doctor__name")
+    )
+
+
+def status_funnel(first, last):
+    totals = dict(
+        _rollups(first, last)
+        .values("status")
+        .annotate(total=Sum("appointments"))
+        .values_list("status", "total")
+    )
+    requested = sum(totals.values())
+    rows = []
+    for status, label in Appointment.STATUS_CHOICES:
+        count = totals.get(status, 0)
+        rows.append(
+            {
+                "status": label,
+                "total": count,
+                "share": round(100 * count / requested, 1) if requested else 0,
+            }
+        )
+    return rows
+
+
+def specialty_load(first, last):
+    rows = list(
+        _rollups(first, last)
+        .values("specialty")
+        .annotate(
+            total=Sum("appointments"),
+            decided=Coalesce(Sum("appointments", filter=Q(status__in=DECIDED)), 0),
+            decision_seconds=Sum("decision_seconds"),
+        )
+        .order_by("-total", "specialty")
+    )
+    for row in rows:
+        row["average_decision_hours"] = _average_hours(row)
+    return rows
+
+
+STATUS_COLUMNS = list(Appointment.STATUS_CHOICES)
+
+# Report name -> (function, [(column key, CSV header)]).
+REPORTS = {
+    "days": (
+        daily_volume,
+        [("day", "Day"), ("total", "Appointments")] + STATUS_COLUMNS,
+    ),
+    "doctors": (
+        doctor_load,
+        [("doctor__name", "Doctor"), ("total", "Appointments")] + STATUS_COLUMNS,
+    ),
+    "funnel": (
+        status_funnel,
+        [("status", "Status"), ("total", "Appointments"), ("share", "Share %")],
+    ),
+    "specialties": (
+        specialty_load,
+        [
+            ("specialty", "Specialty"),
+            ("total", "Appointments"),
+            ("decided", "Decided"),
+            ("average_decision_hours", "Average hours to decision"),
+        ],
+    ),
+}
@@ -0,0 +1,191 @@
+"""
+Who the signed-in user is to the hospital: doctor, patient or receptionist.
+
+:class:`ProfileBackend` loads users together with their doctor and patient
+profiles in one joined query, both at login and on every authenticated
+request, so views never look the profile up again. :class:`RoleMiddleware`
+then sets ``request.role`` lazily to a :class:`Role`; async views await
+``request.arole()`` instead, which resolves it without blocking the event
+loop and fills in ``request.user`` and ``request.role`` for the templates.
+The role the user signed in as is kept in the session along with the
+profile's primary key; if that profile is removed or handed to another
+account the stale entry is detected on the next request and the role
+resolved afresh.
+"""
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.utils.functional import SimpleLazyObject
+
+DOCTOR = "doctor"
+PATIENT = "patient"
+RECEPTIONIST = "receptionist"
+
+SESSION_KEY = "hospital_role"
+
+# Reverse one-to-one relations from User, joined into every user lookup.
+PROFILE_RELATIONS = ("doctor", "patient__doctor")
+
+
+class Role:
+    def __init__(self, user, kind=None):
+        self.user = user
+        self.kind = kind
+
+    def __bool__(self):
+        return self.kind is not None
+
+    def __repr__(self):
+        return f"<Role {self.kind} {self.user}>"
+
+    @property
+    def doctor(self):
+        return getattr(self.user, "doctor", None)
+
+    @property
+    def patient(self):
+        return getattr(self.user, "patient", None)
+
+    @property
+    def is_receptionist(self):
+        return self.user.is_staff
+
+    @property
+    def profile(self):
+        return self.profile_for(self.kind)
+
+    def profile_for(self, kind):
+        if kind == DOCTOR:
+            return self.doctor
+        if kind == PATIENT:
+            return self.patient
+        if kind == RECEPTIONIST and self.is_receptionist:
+            return self.user
+        return None
+
+    def has(self, kind):
+        return self.profile_for(kind) is not None
+
+
+def users():
+    return get_user_model()._default_manager.select_related(*PROFILE_RELATIONS)
+
+
+class ProfileBackend(ModelBackend):
+    """ModelBackend that fetches the user's profiles in the same query."""
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        UserModel = get_user_model()
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        try:
+            user = users().get(**{UserModel.USERNAME_FIELD: username})
+        except UserModel.DoesNotExist:
+            # Run the default password hasher once to reduce the timing
+            # difference between an existing and a nonexistent user.
+            UserModel().set_password(password)
+            return None
+        if user.check_password(password) and self.user_can_authenticate(user):
+            return user
+        return None
+
+    def get_user(self, user_id):
+        try:
+            user = users().get(pk=user_id)
+        except get_user_model().DoesNotExist:
+            return None
+        return user if self.user_can_authenticate(user) else None
+
+    async def aget_user(self, user_id):
+        try:
+            user = await users().aget(pk=user_id)
+        except get_user_model().DoesNotExist:
+            return None
+        return user if self.user_can_authenticate(user) else None
+
+
+def _entry(role, kind):
+    profile = role.profile
+    return [kind, profile.pk if profile else None]
+
+
+def _cached_kind(role, cached):
+    """The kind stored in the session, if its profile still belongs to the user."""
+    if cached:
+        kind, pk = cached
+        profile = role.profile_for(kind)
+        if profile is not None and profile.pk == pk:
+            return kind
+    return None
+
+
+def _default_kind(role):
+    for kind in (DOCTOR, PATIENT, RECEPTIONIST):
+        if role.has(kind):
+            return kind
+    return None
+
+
+def remember(request, kind):
+    """Record the role the user just signed in as."""
+    role = Role(request.user, kind)
+    request.session[SESSION_KEY] = _entry(role, kind)
+    request.role = role
+    return role
+
+
+def resolve(request):
+    user = request.user
+    role = Role(user)
+    if not user.is_authenticated:
+        return role
+    role.kind = _cached_kind(role, request.session.get(SESSION_KEY))
+    if role:
+        return role
+    kind = _default_kind(role)
+    if kind is not None:
+        return remember(request, kind)
+    request.session.pop(SESSION_KEY, None)
+    return role
+
+
+async def aresolve(request):
+    user = await request.auser()
+    role = Role(user)
+    if not user.is_authenticated:
+        return role
+    role.kind = _cached_kind(role, await request.session.aget(SESSION_KEY))
+    if role:
+        return role
+    role.kind = _default_kind(role)
+    if role:
+        await request.session.aset(SESSION_KEY, _entry(role, role.kind))
+    else:
+        await request.session.apop(SESSION_KEY, None)
+    return role
+
+
+class RoleMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        request.role = SimpleLazyObject(lambda: resolve(request))
+
+        async def arole():
+            role = await aresolve(request)
+            # Templates read both; neither may query the database again.
+            request.user = role.user
+            request.role = role
+            return role
+
+        request.arole = arole
+        return self.get_response(request)
@@ -0,0 +1,120 @@
+"""
+Doctors' day-by-day rosters.
+
+:class:`~hospital.models.RosterEntry` holds one compact row per approved
+appointment: its doctor, local day and time, and the patient name, phone
+and symptom summary the dashboard shows. It is indexed on (doctor, day,
+requested_date), so a doctor's day or week is one range scan of an index
+with no join and no sort, however many approved appointments lie months
+ahead.
+
+Entries are written in the transaction that approves, edits or takes back
+an appointment: :func:`sync` from the appointment signals and bulk triage,
+:func:`remove` where an UPDATE completes appointments, and
+:func:`patient_changed` when a patient's name or phone changes. The
+``refresh_roster`` command rebuilds the table from Appointment, to fill it
+after a restore or repair drift.
+"""
+
+from datetime import timedelta
+from itertools import islice
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.text import Truncator
+
+from .models import Appointment, RosterEntry
+
+DEFAULT_WEEK_DAYS = 7
+DEFAULT_BATCH_SIZE = 1000
+SUMMARY_LENGTH = RosterEntry._meta.get_field("summary").max_length
+
+
+def week_days():
+    return getattr(settings, "HOSPITAL_ROSTER_WEEK_DAYS", DEFAULT_WEEK_DAYS)
+
+
+def entry(appointment):
+    patient = appointment.patient
+    return RosterEntry(
+        appointment_id=appointment.pk,
+        doctor_id=appointment.doctor_id,
+        day=timezone.localdate(appointment.requested_date),
+        requested_date=appointment.requested_date,
+        patient_id=patient.pk,
+        patient_name=patient.name,
+        patient_phone=patient.phone,
+        summary=Truncator(appointment.symptoms).chars(SUMMARY_LENGTH),
+        receptionist_notes=appointment.receptionist_notes,
+    )
+
+
+def sync(appointments):
+    """Bring the entries of ``appointments`` (saved instances) up to date."""
+    RosterEntry.objects.filter(
+        appointment__in=[appointment.pk for appointment in appointments]
+    ).delete()
+    RosterEntry.objects.bulk_create(
+        [entry(a) for a in appointments if a.status == "approved"]
+    )
+
+
+def remove(appointment_ids):
+    RosterEntry.objects.filter(appointment__in=appointment_ids).delete()
+
+
+def patient_changed(patient):
+    RosterEntry.objects.filter(patient=patient).exclude(
+        patient_name=patient.name, patient_phone=patient.phone
+    ).update(patient_name=patient.name, patient_phone=patient.phone)
+
+
+def _tables(doctor=None):
+    entries = RosterEntry.objects.all()
+    approved = Appointment.objects.filter(status="approved")
+    if doctor is not None:
+        entries = entries.filter(doctor=doctor)
+        approved = approved.filter(doctor=doctor)
+    return entries, approved.select_related("patient").order_by("pk")
+
+
+def rebuild(doctor=None, batch_size=None):
+    """
+    Recompute the roster (of ``doctor``, or everyone's) from the approved
+    appointments in one transaction. Returns the number of entries.
+    """
+    batch_size = batch_size or DEFAULT_BATCH_SIZE
+    entries, approved = _tables(doctor)
+    rows = approved.iterator(chunk_size=batch_size)
+    count = 0
+    with transaction.atomic():
+        entries.delete()
+        while batch := [entry(a) for a in islice(rows, batch_size)]:
+            RosterEntry.objects.bulk_create(batch)
+            count += len(batch)
+    return count
+
+
+def stale(doctor=None):
+    """How many entries are missing, left over or out of date."""
+    fields = [field.attname for field in RosterEntry._meta.concrete_fields]
+    entries, approved = _tables(doctor)
+    expected = {
+        tuple(getattr(entry(a), name) for name in fields) for a in approved.iterator()
+    }
+    actual = set(entries.values_list(*fields))
+    return len(expected ^ actual)
+
+
+def days(doctor, first, last):
+    """Entries of ``doctor`` from ``first`` to ``last`` (dates), in order."""
+    return RosterEntry.objects.filter(
+        doctor=doctor, day__gte=first, day__lte=last
+    ).order_by("day", "requested_date")
+
+
+def week(doctor, today=None):
+    """Entries of ``doctor`` for today and the rest of the week ahead."""
+    today = today or timezone.localdate()
+    return days(doctor, today, today + timedelta(days=week_days() - 1))
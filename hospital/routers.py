@@ -0,0 +1,126 @@
+"""
+Primary/replica routing.
+
+Writes always go to "default". Reads go to the replica (the database alias
+named by ``HOSPITAL_REPLICA_DATABASE``) only while a view decorated with
+:func:`replica_reads` handles a GET or HEAD request. After a client sends a
+write request, :class:`ReplicaRoutingMiddleware` pins that client to the
+primary for ``HOSPITAL_REPLICA_STICKY_SECONDS`` so it reads its own writes
+rather than a lagging replica. Without a replica alias, everything uses
+"default".
+"""
+
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+STICKY_COOKIE = "hospital_primary_until"
+DEFAULT_STICKY_SECONDS = 5
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+_use_replica = ContextVar("hospital_use_replica", default=False)
+
+
+def _same_database(a, b):
+    return all(a.get(key) == b.get(key) for key in ("ENGINE", "NAME", "HOST", "PORT"))
+
+
+def replica_alias():
+    alias = getattr(settings, "HOSPITAL_REPLICA_DATABASE", "replica")
+    if alias not in connections.settings:
+        return None
+    # A replica that is really the primary (as when it mirrors "default"
+    # under the test runner) would only cost a second connection.
+    if _same_database(
+        connections[alias].settings_dict, connections[DEFAULT_DB_ALIAS].settings_dict
+    ):
+        return None
+    return alias
+
+
+def sticky_seconds():
+    return getattr(settings, "HOSPITAL_REPLICA_STICKY_SECONDS", DEFAULT_STICKY_SECONDS)
+
+
+def replica_reads(view):
+    """Mark a read-only view as safe to serve from the replica."""
+    view.replica_reads = True
+    return view
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if _use_replica.get():
+            return replica_alias()
+        return None
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica holds the same rows as the primary.
+        return True
+
+
+def _pinned(request):
+    try:
+        return float(request.COOKIES.get(STICKY_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+class ReplicaRoutingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+            # Run on the event loop rather than in a thread; it does no I/O.
+            self.process_view = self.aprocess_view
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            # Streamed bodies are read after this point, from the primary.
+            _use_replica.set(False)
+        return self.pin(request, response)
+
+    async def __acall__(self, request):
+        try:
+            response = await self.get_response(request)
+        finally:
+            _use_replica.set(False)
+        return self.pin(request, response)
+
+    def pin(self, request, response):
+        if request.method not in SAFE_METHODS and replica_alias():
+            seconds = sticky_seconds()
+            response.set_cookie(
+                STICKY_COOKIE,
+                f"{time.time() + seconds:.3f}",
+                max_age=seconds,
+                httponly=True,
+                samesite="Lax",
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if (
+            getattr(view_func, "replica_reads", False)
+            and request.method in SAFE_METHODS
+            and not _pinned(request)
+        ):
+            _use_replica.set(True)
+
+    async def aprocess_view(self, request, view_func, view_args, view_kwargs):
+        ReplicaRoutingMiddleware.process_view(
+            self, request, view_func, view_args, view_kwargs
+        )
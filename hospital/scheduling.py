@@ -0,0 +1,189 @@
+"""
+Slot-based scheduling for doctors.
+
+Every doctor works the same hours (``HOSPITAL_WORKING_HOURS`` on
+``HOSPITAL_WORKING_DAYS``) split into fixed ``HOSPITAL_SLOT_MINUTES`` slots.
+An approved appointment occupies the slot its ``requested_date`` falls in.
+
+Bookings are loaded with a single query per call into a :class:`BookingIndex`
+holding, for each (doctor, day), a sorted list of occupied slot numbers, so
+conflict checks are a bisect and free-slot searches never query per slot.
+"""
+
+import heapq
+from bisect import bisect_left, insort
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from itertools import islice
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import Appointment, Doctor
+
+DEFAULT_SLOT_MINUTES = 30
+DEFAULT_WORKING_HOURS = (9, 17)
+DEFAULT_WORKING_DAYS = (0, 1, 2, 3, 4)
+DEFAULT_HORIZON_DAYS = 90
+
+
+def slot_minutes():
+    return getattr(settings, "HOSPITAL_SLOT_MINUTES", DEFAULT_SLOT_MINUTES)
+
+
+def working_hours():
+    return getattr(settings, "HOSPITAL_WORKING_HOURS", DEFAULT_WORKING_HOURS)
+
+
+def working_days():
+    return getattr(settings, "HOSPITAL_WORKING_DAYS", DEFAULT_WORKING_DAYS)
+
+
+def slots_per_day():
+    start, end = working_hours()
+    return (end - start) * 60 // slot_minutes()
+
+
+def slot_of(dt):
+    """Return (local date, slot number) for ``dt``, or None outside working hours."""
+    local = timezone.localtime(dt) if timezone.is_aware(dt) else dt
+    if local.weekday() not in working_days():
+        return None
+    start, _ = working_hours()
+    minutes = (local.hour - start) * 60 + local.minute
+    if minutes < 0:
+        return None
+    slot = minutes // slot_minutes()
+    if slot >= slots_per_day():
+        return None
+    return local.date(), slot
+
+
+def slot_start(day, slot):
+    """Return the aware datetime at which ``slot`` on ``day`` begins."""
+    start, _ = working_hours()
+    naive = datetime.combine(day, time(start)) + timedelta(
+        minutes=slot * slot_minutes()
+    )
+    return timezone.make_aware(naive) if settings.USE_TZ else naive
+
+
+class BookingIndex:
+    """Occupied slots per (doctor id, day), each kept as a sorted list."""
+
+    def __init__(self):
+        self._slots = defaultdict(list)
+
+    @classmethod
+    def load(cls, doctor_ids, start, end, exclude_id=None):
+        """Build the index from approved appointments in [start, end)."""
+        index = cls()
+        rows = Appointment.objects.filter(
+            doctor_id__in=doctor_ids,
+            status="approved",
+            requested_date__gte=start,
+            requested_date__lt=end,
+        ).order_by()
+        if exclude_id is not None:
+            rows = rows.exclude(pk=exclude_id)
+        for doctor_id, requested_date in rows.values_list(
+            "doctor_id", "requested_date"
+        ):
+            index.add(doctor_id, requested_date)
+        return index
+
+    def add(self, doctor_id, dt):
+        position = slot_of(dt)
+        if position is None:
+            return
+        day, slot = position
+        slots = self._slots[doctor_id, day]
+        i = bisect_left(slots, slot)
+        if i == len(slots) or slots[i] != slot:
+            insort(slots, slot)
+
+    def is_booked(self, doctor_id, day, slot):
+        slots = self._slots.get((doctor_id, day), ())
+        i = bisect_left(slots, slot)
+        return i < len(slots) and slots[i] == slot
+
+    def free_slots(self, doctor_id, after, horizon_days):
+        """Yield (start datetime, doctor id) for each free slot from ``after``."""
+        per_day = slots_per_day()
+        first = slot_of(after)
+        day = timezone.localtime(after).date() if settings.USE_TZ else after.date()
+        for offset in range(horizon_days):
+            current = day + timedelta(days=offset)
+            if current.weekday() not in working_days():
+                continue
+            slot = 0
+            if offset == 0:
+                if first is not None:
+                    slot = first[1] + (slot_start(*first) < after)
+                elif slot_start(current, 0) < after:
+                    continue
+            booked = self._slots.get((doctor_id, current), ())
+            j = bisect_left(booked, slot)
+            for s in range(slot, per_day):
+                if j < len(booked) and booked[j] == s:
+                    j += 1
+                    continue
+                yield slot_start(current, s), doctor_id
+
+
+def conflicting_appointment(appointment):
+    """
+    Return an approved appointment that already holds ``appointment``'s slot
+    with the same doctor, or None.
+    """
+    position = slot_of(appointment.requested_date)
+    if position is None:
+        return None
+    begin = slot_start(*position)
+    end = begin + timedelta(minutes=slot_minutes())
+    return (
+        Appointment.objects.filter(
+            doctor_id=appointment.doctor_id,
+            status="approved",
+            requested_date__gte=begin,
+            requested_date__lt=end,
+        )
+        .exclude(pk=appointment.pk)
+        .first()
+    )
+
+
+def suggest_slots(appointment, count=3, horizon_days=DEFAULT_HORIZON_DAYS):
+    """Return the next ``count`` free slot starts with the same doctor."""
+    after = max(appointment.requested_date, timezone.now())
+    index = BookingIndex.load(
+        [appointment.doctor_id],
+        after,
+        after + timedelta(days=horizon_days),
+        exclude_id=appointment.pk,
+    )
+    slots = index.free_slots(appointment.doctor_id, after, horizon_days)
+    return [start for start, _ in islice(slots, count)]
+
+
+def next_free_slots(specialty, count, after=None, horizon_days=DEFAULT_HORIZON_DAYS):
+    """
+    Return the earliest ``count`` free (start, Doctor) pairs across every
+    doctor of ``specialty``, in chronological order.
+
+    Uses two queries in total regardless of the number of doctors or days:
+    one for the doctors and one for their approved bookings in the horizon.
+    Per-doctor free-slot generators are merged lazily with a heap, so only
+    as many slots as requested are ever materialised.
+    """
+    after = after or timezone.now()
+    doctors = {d.pk: d for d in Doctor.objects.filter(specialty__iexact=specialty)}
+    if not doctors:
+        return []
+    index = BookingIndex.load(
+        list(doctors), after, after + timedelta(days=horizon_days)
+    )
+    merged = heapq.merge(
+        *(index.free_slots(pk, after, horizon_days) for pk in sorted(doctors))
+    )
+    return [(start, doctors[pk]) for start, pk in islice(merged, count)]
@@ -0,0 +1,185 @@
+"""
+Full-text search over doctors, patients and appointment notes.
+
+On SQLite each searchable model gets an FTS5 index, an external-content
+virtual table named ``<db_table>_fts`` whose rowids are the model's primary
+keys, so nothing but the index itself is stored twice. Triggers on the
+model's table keep it in step with every INSERT, UPDATE and DELETE,
+including bulk_create() and queryset updates that bypass model signals.
+
+Django rebuilds a SQLite table to alter it, which drops its triggers, so
+:func:`install` also runs after every ``migrate``; it recreates whatever is
+missing and reindexes that model. Other database backends fall back to
+case-insensitive substring matching.
+"""
+
+import re
+
+from django.db import connections, transaction
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from .models import Appointment, Doctor, Patient
+
+_TOKEN = re.compile(r"\w+")
+
+
+class Index:
+    def __init__(self, model, weights):
+        self.model = model
+        # Column name -> bm25 weight; a match in a heavier column ranks higher.
+        self.weights = weights
+
+    @property
+    def source(self):
+        return self.model._meta.db_table
+
+    @property
+    def table(self):
+        return f"{self.source}_fts"
+
+    @property
+    def columns(self):
+        return list(self.weights)
+
+    def triggers(self):
+        cols = ", ".join(self.columns)
+        new = ", ".join(f"new.{c}" for c in self.columns)
+        old = ", ".join(f"old.{c}" for c in self.columns)
+        insert = f"INSERT INTO {self.table}(rowid, {cols}) VALUES (new.id, {new});"
+        delete = (
+            f"INSERT INTO {self.table}({self.table}, rowid, {cols}) "
+            f"VALUES ('delete', old.id, {old});"
+        )
+        return {
+            f"{self.table}_ai": f"AFTER INSERT ON {self.source} BEGIN {insert} END",
+            f"{self.table}_ad": f"AFTER DELETE ON {self.source} BEGIN {delete} END",
+            f"{self.table}_au": (
+                f"AFTER UPDATE OF {cols} ON {self.source} "
+                f"BEGIN {delete} {insert} END"
+            ),
+        }
+
+    def create_table_sql(self):
+        return (
+            f"CREATE VIRTUAL TABLE {self.table} USING fts5("
+            f"{', '.join(self.columns)}, content='{self.source}', "
+            "content_rowid='id', tokenize='unicode61 remove_diacritics 2', "
+            "prefix='2 3')"
+        )
+
+    def rank_sql(self):
+        weights = ", ".join(str(w) for w in self.weights.values())
+        return f"bm25({self.table}, {weights})"
+
+    def matches(self, query):
+        """Subquery of the primary keys matching an FTS5 ``query``."""
+        return RawSQL(
+            f"SELECT rowid FROM {self.table} WHERE {self.table} MATCH %s", [query]
+        )
+
+
+INDEXES = {
+    Doctor: Index(Doctor, {"name": 10.0, "specialty": 5.0}),
+    Patient: Index(Patient, {"name": 10.0, "phone": 5.0, "address": 1.0}),
+    Appointment: Index(Appointment, {"symptoms": 1.0, "doctor_notes": 1.0}),
+}
+
+
+def is_supported(connection):
+    return connection.vendor == "sqlite"
+
+
+def install(connection):
+    """Create any missing FTS5 tables and triggers, reindexing what changed."""
+    if not is_supported(connection):
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger')"
+        )
+        existing = {name for (name,) in cursor.fetchall()}
+        for index in INDEXES.values():
+            if index.source not in existing:
+                continue
+            triggers = index.triggers()
+            if index.table in existing and existing.issuperset(triggers):
+                continue
+            if index.table not in existing:
+                cursor.execute(index.create_table_sql())
+            for name, body in triggers.items():
+                cursor.execute(f"CREATE TRIGGER IF NOT EXISTS {name} {body}")
+            # Rows written while the triggers were missing are unindexed.
+            cursor.execute(
+                f"INSERT INTO {index.table}({index.table}) VALUES ('rebuild')"
+            )
+
+
+def uninstall(connection):
+    if not is_supported(connection):
+        return
+    with connection.cursor() as cursor:
+        for index in INDEXES.values():
+            for name in index.triggers():
+                cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+            cursor.execute(f"DROP TABLE IF EXISTS {index.table}")
+
+
+def rebuild(connection):
+    """Reindex every model from scratch."""
+    with transaction.atomic(using=connection.alias):
+        uninstall(connection)
+        install(connection)
+
+
+def fts_query(text):
+    """
+    Turn user input into an FTS5 query: every word must match, each as a
+    prefix ("card" finds "Cardiology"). Returns "" if there are no words.
+    """
+    return " ".join(f'"{token}"*' for token in _TOKEN.findall(text))
+
+
+def _fallback(index, text):
+    condition = Q()
+    for token in _TOKEN.findall(text):
+        condition &= Q.create(
+            [(f"{column}__icontains", token) for column in index.columns],
+            connector=Q.OR,
+        )
+    return condition
+
+
+def matching(queryset, text):
+    """Restrict ``queryset`` to rows whose indexed columns match ``text``."""
+    index = INDEXES[queryset.model]
+    query = fts_query(text)
+    if not query:
+        return queryset.none()
+    if not is_supported(connections[queryset.db]):
+        return queryset.filter(_fallback(index, text))
+    return queryset.filter(pk__in=index.matches(query))
+
+
+def ranked(queryset, text, limit):
+    """
+    The ``limit`` best matches for ``text``, best first, loaded through
+    ``queryset``. Ranking runs over the whole index, so filters on
+    ``queryset`` can only drop rows from the result, not pull in more.
+    """
+    index = INDEXES[queryset.model]
+    query = fts_query(text)
+    if not query:
+        return []
+    connection = connections[queryset.db]
+    if not is_supported(connection):
+        return list(queryset.filter(_fallback(index, text))[:limit])
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT rowid FROM {index.table} WHERE {index.table} MATCH %s "
+            f"ORDER BY {index.rank_sql()} LIMIT %s",
+            [query, limit],
+        )
+        ids = [pk for (pk,) in cursor.fetchall()]
+    found = queryset.in_bulk(ids)
+    return [found[pk] for pk in ids if pk in found]
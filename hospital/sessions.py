@@ -0,0 +1,52 @@
+"""
+Pruning of expired sessions.
+
+``clearsessions`` deletes every expired row in one statement. After a
+quiet spell that can be millions of rows, and the statement holds its
+locks (on SQLite, the whole database) until it finishes. :func:`prune`
+deletes them a batch at a time instead, each batch in its own short
+transaction picked through the ``expire_date`` index, so logins and page
+views keep getting in between batches.
+
+Cache and signed-cookie sessions expire by themselves; for those engines
+:func:`prune` only calls the engine's own ``clear_expired()``.
+"""
+
+import time
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib.sessions.backends.db import SessionStore as DBStore
+from django.utils import timezone
+
+DEFAULT_BATCH_SIZE = 1000
+
+
+def session_store():
+    return import_module(settings.SESSION_ENGINE).SessionStore
+
+
+def prune(batch_size=DEFAULT_BATCH_SIZE, pause=0, now=None):
+    """
+    Delete sessions that expired before ``now``, ``batch_size`` at a time,
+    sleeping ``pause`` seconds between batches. Returns the number deleted,
+    or None when the engine does not keep sessions in the database.
+    """
+    store = session_store()
+    if not issubclass(store, DBStore):
+        store.clear_expired()
+        return None
+    now = now or timezone.now()
+    expired = store.get_model_class().objects.filter(expire_date__lt=now)
+    deleted = 0
+    while True:
+        keys = list(
+            expired.order_by("expire_date").values_list("pk", flat=True)[:batch_size]
+        )
+        if not keys:
+            return deleted
+        deleted += expired.filter(pk__in=keys).delete()[0]
+        if len(keys) < batch_size:
+            return deleted
+        if pause:
+            time.sleep(pause)
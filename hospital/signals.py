@@ -0,0 +1,177 @@
+from django.db import connections, transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import (
+    assignment,
+    counters,
+    events,
+    fragments,
+    instrumentation,
+    notifications,
+    pragmas,
+    roster,
+    search,
+)
+from .models import Appointment, Doctor, Patient
+
+
+@receiver(post_save, sender=Doctor)
+def doctor_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    # A new doctor or a changed specialty alters the assignment roster.
+    transaction.on_commit(assignment.invalidate)
+    if created:
+        counters.adjust({counters.DOCTORS: 1})
+        return
+
+    def invalidate():
+        # Patient dashboards show the doctor's name on each appointment.
+        fragments.bump("doctor", instance.pk)
+        fragments.bump(
+            "patient",
+            *Appointment.objects.filter(doctor=instance)
+            .values_list("patient_id", flat=True)
+            .distinct(),
+        )
+
+    transaction.on_commit(invalidate)
+
+
+@receiver(post_delete, sender=Doctor)
+def doctor_deleted(sender, instance, **kwargs):
+    counters.adjust({counters.DOCTORS: -1})
+    transaction.on_commit(assignment.invalidate)
+
+
+@receiver(post_save, sender=Patient)
+def patient_saved(sender, instance, created, raw=False, **kwargs):
+    known = hasattr(instance, "_loaded_doctor_id")
+    previous_doctor = getattr(instance, "_loaded_doctor_id", None)
+    instance._loaded_doctor_id = instance.doctor_id
+    if raw:
+        return
+    if created:
+        counters.adjust({counters.PATIENTS: 1})
+        assignment.adjust({instance.doctor_id: 1})
+        invalidate_doctors(instance.doctor_id)
+        return
+    roster.patient_changed(instance)
+    if not known:
+        transaction.on_commit(assignment.invalidate)
+    elif previous_doctor != instance.doctor_id:
+        assignment.adjust({previous_doctor: -1, instance.doctor_id: 1})
+
+    def invalidate():
+        fragments.bump("patient", instance.pk)
+        # Doctor dashboards list their patients and the patient on each
+        # approved appointment.
+        fragments.bump(
+            "doctor",
+            instance.doctor_id,
+            previous_doctor,
+            *Appointment.objects.filter(patient=instance, status="approved")
+            .values_list("doctor_id", flat=True)
+            .distinct(),
+        )
+
+    transaction.on_commit(invalidate)
+
+
+@receiver(post_delete, sender=Patient)
+def patient_deleted(sender, instance, **kwargs):
+    counters.adjust({counters.PATIENTS: -1})
+    assignment.adjust({instance.doctor_id: -1})
+    invalidate_doctors(instance.doctor_id)
+
+
+def invalidate_doctors(*pks):
+    transaction.on_commit(lambda: fragments.bump("doctor", *pks))
+
+
+@receiver(post_save, sender=Appointment)
+def appointment_saved(sender, instance, created, raw=False, **kwargs):
+    previous = None if created else getattr(instance, "_loaded_status", None)
+    previous_doctor = getattr(instance, "_loaded_doctor_id", None)
+    instance._loaded_status = instance.status
+    instance._loaded_doctor_id = instance.doctor_id
+    if raw:
+        return
+    invalidate_appointment(instance, previous_doctor)
+    load_appointment(instance, created, previous, previous_doctor)
+    if "approved" in (instance.status, previous) or (previous is None and not created):
+        roster.sync([instance])
+    if previous == instance.status:
+        return
+    count_appointment(instance, created, previous)
+    publish_appointment(instance, created, previous)
+    if created or previous is not None:
+        # Written in the saving transaction; send_notifications delivers it.
+        notifications.enqueue([instance])
+
+
+def count_appointment(instance, created, previous):
+    deltas = {counters.appointment_key(instance.status): 1}
+    if previous is not None:
+        deltas[counters.appointment_key(previous)] = -1
+    elif not created:
+        # Saved from an instance that was not loaded from the database, so
+        # the old status is unknown; recount on the next read.
+        transaction.on_commit(counters.invalidate)
+        return
+    counters.adjust(deltas)
+
+
+def load_appointment(instance, created, previous, previous_doctor):
+    if previous is None and not created:
+        transaction.on_commit(assignment.invalidate)
+        return
+    assignment.adjust(
+        assignment.appointment_deltas(instance, previous, previous_doctor)
+    )
+
+
+def publish_appointment(instance, created, previous):
+    kind = "created" if created else "status_changed"
+    transaction.on_commit(
+        lambda: events.get_broker().publish(
+            events.appointment_event(kind, instance, previous)
+        )
+    )
+
+
+@receiver(post_delete, sender=Appointment)
+def appointment_deleted(sender, instance, **kwargs):
+    status = getattr(instance, "_loaded_status", instance.status)
+    counters.adjust({counters.appointment_key(status): -1})
+    if assignment.counts_toward_load(status, instance.requested_date):
+        assignment.adjust({instance.doctor_id: -1})
+    invalidate_appointment(instance)
+
+
+def invalidate_appointment(instance, previous_doctor=None):
+    doctor_ids = (instance.doctor_id, previous_doctor)
+    patient_id = instance.patient_id
+
+    def invalidate():
+        fragments.bump("doctor", *doctor_ids)
+        fragments.bump("patient", patient_id)
+
+    transaction.on_commit(invalidate)
+
+
+def install_search(sender, using, **kwargs):
+    # Altering a table on SQLite recreates it without its triggers.
+    search.install(connections[using])
+
+
+@receiver(connection_created)
+def tune_connection(sender, connection, **kwargs):
+    pragmas.apply(connection)
+
+
+@receiver(connection_created)
+def instrument_connection(sender, connection, **kwargs):
+    instrumentation.install(connection)
@@ -0,0 +1,144 @@
+"""
+Warming and timing of the compiled-template cache.
+
+Templates are compiled by the cached loader the first time each one is
+used and then reused for the life of the process, so without warming the
+first requests after a deploy pay for parsing ``base.html`` and every page
+they touch. :func:`warm` compiles every template the loaders can find up
+front; ``wsgi.py`` and ``asgi.py`` call it once the application is loaded,
+and the ``warm_templates`` command runs it to fail a deploy on a template
+that does not compile.
+
+:class:`RenderTimer` records how long each template takes to render, in
+total and in the nodes written in the template itself, to find expensive
+loops.
+"""
+
+import logging
+import os
+import time
+from collections import defaultdict
+
+from django.template import TemplateSyntaxError, engines
+from django.template.backends.django import DjangoTemplates
+from django.template.base import Node, Template
+
+logger = logging.getLogger("hospital.templates")
+
+
+def _loaders(loaders):
+    for loader in loaders:
+        # The cached loader wraps the loaders that actually find files.
+        yield from _loaders(getattr(loader, "loaders", ()))
+        if hasattr(loader, "get_dirs"):
+            yield loader
+
+
+def template_names(engine):
+    """Every template name the engine's loaders can find, sorted."""
+    names = set()
+    for loader in _loaders(engine.template_loaders):
+        for directory in loader.get_dirs():
+            directory = str(directory)
+            for root, _, files in os.walk(directory):
+                for filename in files:
+                    path = os.path.join(root, filename)
+                    names.add(os.path.relpath(path, directory).replace(os.sep, "/"))
+    return sorted(names)
+
+
+def warm():
+    """
+    Compile every template of every Django template engine into the cached
+    loader. Returns a list of (name, seconds, error) with error None for
+    the templates that compiled.
+    """
+    results = []
+    for backend in engines.all():
+        if not isinstance(backend, DjangoTemplates):
+            continue
+        for name in template_names(backend.engine):
+            started = time.perf_counter()
+            try:
+                backend.engine.get_template(name)
+            except (TemplateSyntaxError, UnicodeDecodeError) as exc:
+                error = exc
+            else:
+                error = None
+            results.append((name, time.perf_counter() - started, error))
+    return results
+
+
+def warm_on_startup():
+    started = time.perf_counter()
+    results = warm()
+    for name, _, error in results:
+        if error is not None:
+            logger.error("Template %s does not compile: %s", name, error)
+    logger.info(
+        "Compiled %d templates in %.0f ms",
+        len(results),
+        (time.perf_counter() - started) * 1000,
+    )
+
+
+class RenderTimer:
+    """
+    Context manager timing every template render while it is active.
+    ``stats()`` gives name -> {"renders", "total_ms", "self_ms"}: total
+    covers whole renders of the template, including what it extends and
+    includes, and self the nodes written in it, wherever they render (the
+    blocks of a page are its own even though base.html places them).
+    """
+
+    def __init__(self):
+        self.renders = defaultdict(int)
+        self.total = defaultdict(float)
+        self.own = defaultdict(float)
+        self._stack = []
+
+    def __enter__(self):
+        self._render = Template._render
+        self._render_annotated = Node.render_annotated
+        timer = self
+
+        def _render(template, context):
+            started = time.perf_counter()
+            try:
+                return timer._render(template, context)
+            finally:
+                name = template.name or "<string>"
+                timer.renders[name] += 1
+                timer.total[name] += time.perf_counter() - started
+
+        def render_annotated(node, context):
+            timer._stack.append(0.0)
+            started = time.perf_counter()
+            try:
+                return timer._render_annotated(node, context)
+            finally:
+                elapsed = time.perf_counter() - started
+                nested = timer._stack.pop()
+                if timer._stack:
+                    timer._stack[-1] += elapsed
+                origin = getattr(node, "origin", None)
+                name = origin.template_name if origin else None
+                timer.own[name or "<string>"] += elapsed - nested
+
+        Template._render = _render
+        Node.render_annotated = render_annotated
+        return self
+
+    def __exit__(self, *exc_info):
+        Template._render = self._render
+        Node.render_annotated = self._render_annotated
+
+    def stats(self):
+        return {
+            name: {
+                "renders": count,
+                "total_ms": round(self.total[name] * 1000, 3),
+                "self_ms": round(self.own[name] * 1000, 3),
+            }
+            for name, count in self.renders.items()
+        }
@@ -1,3 +1,1942 @@
-from django.test import TestCase
+import json
+import os
+import re
+import tempfile
+import unittest
+from datetime import datetime, time, timedelta
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+
+from django.conf import settings
+from django.contrib.auth import authenticate
+from django.contrib.auth.models import User
+from django.contrib.sessions.models import Session
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.template import TemplateSyntaxError, engines
+from django.urls import reverse
+from django.utils import timezone
+
+from hospitalmngmt.database import databases
+from hospitalmngmt.sessions import session_cache, session_engine
+
+from . import (
+    archive,
+    assignment,
+    counters,
+    events,
+    exports,
+    fragments,
+    instrumentation,
+    notifications,
+    pragmas,
+    reporting,
+    roles,
+    roster,
+    scheduling,
+    search,
+    sessions,
+    template_cache,
+    triage,
+)
+from .provisioning import POOL_THRESHOLD, Account, provision_accounts
+from .forms import AppointmentApprovalForm, PatientCreateForm
+from .models import (
+    Appointment,
+    ArchivedAppointment,
+    DailyAppointmentRollup,
+    Doctor,
+    ImportCheckpoint,
+    Notification,
+    Patient,
+    ReportWatermark,
+    RosterEntry,
+)
+from .pagination import decode_cursor, encode_cursor, keyset_queryset
+from .routers import (
+    STICKY_COOKIE,
+    PrimaryReplicaRouter,
+    ReplicaRoutingMiddleware,
+    replica_reads,
+)
+
+
+@override_settings(HOSPITAL_LIST_PAGE_SIZE=2, HOSPITAL_LIST_STREAM_CHUNK_SIZE=2)
+class ListPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for name in ["Carol", "Alice", "Bob", "Alice", "Dave"]:
+            Patient.objects.create(name=name)
+
+    def test_cursor_round_trip(self):
+        self.assertEqual(decode_cursor(encode_cursor("Zoë", 42)), ("Zoë", 42))
+
+    def test_invalid_cursor_is_404(self):
+        response = self.client.get(reverse("patient_list"), {"cursor": "nope"})
+        self.assertEqual(response.status_code, 404)
+
+    def test_pages_walk_every_row_once_in_name_order(self):
+        seen = []
+        cursor = None
+        while True:
+            params = {"cursor": cursor} if cursor else {}
+            response = self.client.get(reverse("patient_list"), params)
+            seen.extend(p.pk for p in response.context["patients"])
+            cursor = response.context["next_cursor"]
+            if not cursor:
+                break
+        expected = list(
+            Patient.objects.order_by("name", "id").values_list("pk", flat=True)
+        )
+        self.assertEqual(seen, expected)
+
+    def test_stream_mode_renders_every_row(self):
+        response = self.client.get(reverse("patient_list"), {"stream": "1"})
+        self.assertTrue(response.streaming)
+        body = b"".join(response.streaming_content).decode()
+        self.assertEqual(body.count('class="list-item"'), 5)
+        self.assertLess(body.index("Alice"), body.index("Dave"))
+        self.assertIn("</html>", body)
+
+    def test_doctor_list_paginates(self):
+        for name in ["X", "Y", "Z"]:
+            Doctor.objects.create(name=name)
+        response = self.client.get(reverse("doctor_list"))
+        self.assertEqual([d.name for d in response.context["doctors"]], ["X", "Y"])
+        self.assertIsNotNone(response.context["next_cursor"])
+
+
+@unittest.skipUnless(connection.vendor == "sqlite", "EXPLAIN QUERY PLAN is SQLite")
+class QueryPlanTests(TestCase):
+    """
+    Guard the hot-path querysets against regressing to a full table scan or
+    an on-the-fly sort when models or indexes change.
+    """
+
+    BAD_PLAN = re.compile(r"\bSCAN\b|USE TEMP B-TREE")
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = Doctor.objects.create(name="Dr. Plan")
+        cls.patient = Patient.objects.create(name="Plan Patient", doctor=cls.doctor)
+
+    def assertIndexedPlan(self, queryset):
+        plan = queryset.explain()
+        self.assertFalse(
+            self.BAD_PLAN.search(plan), f"Unindexed plan for {queryset.query}:\n{plan}"
+        )
+
+    def test_receptionist_queues(self):
+        self.assertIndexedPlan(Appointment.objects.pending_queue())
+        now = timezone.now()
+        self.assertIndexedPlan(Appointment.objects.approved_between(now, now))
+        cursor = encode_cursor(now, 1)
+        self.assertIndexedPlan(
+            keyset_queryset(
+                Appointment.objects.pending_queue(), cursor, ("-created_at", "id")
+            )
+        )
+        self.assertIndexedPlan(
+            keyset_queryset(
+                Appointment.objects.approved_between(now, now),
+                cursor,
+                ("requested_date", "id"),
+            )
+        )
+
+    def test_doctor_dashboard(self):
+        self.assertIndexedPlan(roster.week(self.doctor))
+        self.assertIndexedPlan(Patient.objects.filter(doctor=self.doctor))
+
+    def test_patient_dashboard(self):
+        self.assertIndexedPlan(Appointment.objects.history_for_patient(self.patient))
+        self.assertIndexedPlan(
+            Appointment.objects.full_history_for_patient(self.patient)
+        )
+
+    def test_list_cursor_page(self):
+        cursor = encode_cursor("M", 1)
+        self.assertIndexedPlan(keyset_queryset(Patient.objects.all(), cursor))
+        self.assertIndexedPlan(keyset_queryset(Doctor.objects.all(), cursor))
+
+
+class CounterTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_counts_follow_saves_and_deletes(self):
+        doctor = Doctor.objects.create(name="Dr. Count")
+        patient = Patient.objects.create(name="Count Patient")
+        self.assertEqual(counters.get_counts()[counters.DOCTORS], 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Patient.objects.create(name="Second Patient")
+            appointment = Appointment.objects.create(
+                patient=patient,
+                doctor=doctor,
+                requested_date=timezone.now(),
+                symptoms="Cough",
+            )
+        totals = counters.get_counts()
+        self.assertEqual(totals[counters.PATIENTS], 2)
+        self.assertEqual(totals[counters.appointment_key("pending")], 1)
+
+        appointment = Appointment.objects.get(pk=appointment.pk)
+        appointment.status = "approved"
+        with self.captureOnCommitCallbacks(execute=True):
+            appointment.save()
+        totals = counters.get_counts()
+        self.assertEqual(totals[counters.appointment_key("pending")], 0)
+        self.assertEqual(totals[counters.appointment_key("approved")], 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            patient.delete()
+        totals = counters.get_counts()
+        self.assertEqual(totals[counters.PATIENTS], 1)
+        self.assertEqual(totals[counters.appointment_key("approved")], 0)
+
+    def test_home_reads_counts_without_queries(self):
+        Doctor.objects.create(name="Dr. Home")
+        counters.rebuild()
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse("home"))
+        self.assertEqual(response.context["doctors_count"], 1)
+
+    @override_settings(HOSPITAL_COUNTER_TIMEOUT=60)
+    def test_counts_expire_and_are_recounted(self):
+        counters.rebuild()
+        # A doctor added by another process never reaches this one's counts.
+        Doctor.objects.create(name="Dr. Elsewhere")
+        self.assertEqual(counters.get_counts()[counters.DOCTORS], 0)
+        later = timezone.now().timestamp() + 61
+        with mock.patch("django.core.cache.backends.locmem.time.time") as clock:
+            clock.return_value = later
+            self.assertEqual(counters.get_counts()[counters.DOCTORS], 1)
+
+    def test_commands_warn_when_the_cache_is_process_local(self):
+        err = StringIO()
+        call_command("rebuild_counters", stdout=StringIO(), stderr=err)
+        self.assertIn("local to this process", err.getvalue())
+
+        with tempfile.TemporaryDirectory() as directory:
+            shared = {
+                "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+                "LOCATION": directory,
+            }
+            with override_settings(CACHES={"default": shared}):
+                err = StringIO()
+                call_command("rebuild_counters", stdout=StringIO(), stderr=err)
+        self.assertEqual(err.getvalue(), "")
+
+
+@override_settings(
+    HOSPITAL_SLOT_MINUTES=30, HOSPITAL_WORKING_HOURS=(9, 17), TIME_ZONE="UTC"
+)
+class SchedulingTests(TestCase):
+    # A Monday far enough ahead that "now" never falls inside it.
+    MONDAY = datetime(2030, 1, 7, tzinfo=timezone.get_fixed_timezone(0))
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctors = [
+            Doctor.objects.create(name=f"Dr. {i}", specialty="Cardiology")
+            for i in range(3)
+        ]
+        cls.patient = Patient.objects.create(name="Sched Patient")
+
+    def book(self, doctor, hour, minute=0, status="approved"):
+        return Appointment.objects.create(
+            patient=self.patient,
+            doctor=doctor,
+            requested_date=self.MONDAY.replace(hour=hour, minute=minute),
+            symptoms="Checkup",
+            status=status,
+        )
+
+    def test_slot_of_respects_working_hours(self):
+        self.assertEqual(
+            scheduling.slot_of(self.MONDAY.replace(hour=9, minute=45)),
+            (self.MONDAY.date(), 1),
+        )
+        self.assertIsNone(scheduling.slot_of(self.MONDAY.replace(hour=8)))
+        self.assertIsNone(scheduling.slot_of(self.MONDAY.replace(day=12, hour=10)))
+
+    def test_approval_rejects_double_booking_with_suggestions(self):
+        self.book(self.doctors[0], 10)
+        request = self.book(self.doctors[0], 10, 15, status="pending")
+        form = AppointmentApprovalForm(
+            {"status": "approved", "receptionist_notes": ""}, instance=request
+        )
+        self.assertFalse(form.is_valid())
+        self.assertIn("Free slots: Jan 07, 2030 10:30 AM", form.errors["status"][0])
+
+        other = self.book(self.doctors[1], 10, 15, status="pending")
+        form = AppointmentApprovalForm(
+            {"status": "approved", "receptionist_notes": ""}, instance=other
+        )
+        self.assertTrue(form.is_valid())
+
+    def test_next_free_slots_merges_doctors_in_two_queries(self):
+        self.book(self.doctors[0], 9)
+        self.book(self.doctors[1], 9)
+        with self.assertNumQueries(2):
+            slots = scheduling.next_free_slots(
+                "cardiology", 4, after=self.MONDAY.replace(hour=9)
+            )
+        self.assertEqual(
+            [(start.hour, start.minute, doctor) for start, doctor in slots],
+            [
+                (9, 0, self.doctors[2]),
+                (9, 30, self.doctors[0]),
+                (9, 30, self.doctors[1]),
+                (9, 30, self.doctors[2]),
+            ],
+        )
+
+    def test_available_slots_clamps_count(self):
+        url = reverse("available_slots")
+        for count, expected in (("-1", 1), ("0", 1), ("500", 100)):
+            response = self.client.get(url, {"specialty": "cardiology", "count": count})
+            self.assertEqual(response.status_code, 200, count)
+            self.assertEqual(len(response.json()["slots"]), expected, count)
+
+
+class ImportRecordsTests(TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+        self.doctor = Doctor.objects.create(name="Dr. Import")
+
+    def write(self, name, lines):
+        path = os.path.join(self.dir.name, name)
+        with open(path, "w", encoding="utf-8") as handle:
+            handle.write("\n".join(lines) + "\n")
+        return path
+
+    def test_imports_valid_rows_and_reports_bad_ones(self):
+        path = self.write(
+            "patients.jsonl",
+            [
+                json.dumps({"name": "A", "age": 30, "doctor": "Dr. Import"}),
+                json.dumps({"name": "B", "doctor": str(self.doctor.pk)}),
+                json.dumps({"name": "C", "doctor": "Dr. Nobody"}),
+                json.dumps({"name": "", "gender": "M"}),
+            ],
+        )
+        out, err = StringIO(), StringIO()
+        call_command(
+            "import_records", "patient", path, batch_size=3, stdout=out, stderr=err
+        )
+        self.assertEqual(
+            list(Patient.objects.order_by("name").values_list("name", "doctor")),
+            [("A", self.doctor.pk), ("B", self.doctor.pk)],
+        )
+        self.assertIn("Row 3: doctor: Unknown doctor", err.getvalue())
+        self.assertIn("Row 4: name:", err.getvalue())
+        self.assertIn("rows/sec", out.getvalue())
+        self.assertFalse(ImportCheckpoint.objects.exists())
+
+    def test_resumes_from_checkpoint(self):
+        patient = Patient.objects.create(name="Resumed")
+        path = self.write(
+            "appointments.csv",
+            [
+                "patient,doctor,requested_date,symptoms,status",
+                f"{patient.pk},Dr. Import,2030-01-07 10:00,Cough,approved",
+                f"{patient.pk},Dr. Import,2030-01-07 11:00,Fever,",
+            ],
+        )
+        source = os.path.abspath(path)
+        ImportCheckpoint.objects.create(name=source, source=source, rows=1)
+
+        call_command(
+            "import_records", "appointment", path, stdout=StringIO(), stderr=StringIO()
+        )
+        self.assertEqual(
+            list(Appointment.objects.values_list("symptoms", "status")),
+            [("Fever", "pending")],
+        )
+
+    def test_crash_mid_batch_neither_loses_nor_repeats_rows(self):
+        path = self.write(
+            "patients.jsonl", [json.dumps({"name": f"P{n}"}) for n in range(4)]
+        )
+        save = ImportCheckpoint.objects.update_or_create
+        calls = []
+
+        def crash_on_second_batch(**kwargs):
+            calls.append(kwargs)
+            if len(calls) == 2:
+                raise RuntimeError("killed")
+            return save(**kwargs)
+
+        with mock.patch.object(
+            ImportCheckpoint.objects, "update_or_create", crash_on_second_batch
+        ):
+            with self.assertRaises(RuntimeError):
+                call_command(
+                    "import_records",
+                    "patient",
+                    path,
+                    batch_size=2,
+                    stdout=StringIO(),
+                    stderr=StringIO(),
+                )
+        # The second batch rolled back together with its checkpoint.
+        self.assertEqual(Patient.objects.count(), 2)
+        self.assertEqual(ImportCheckpoint.objects.get().rows, 2)
+
+        call_command(
+            "import_records",
+            "patient",
+            path,
+            batch_size=2,
+            stdout=StringIO(),
+            stderr=StringIO(),
+        )
+        self.assertEqual(
+            list(Patient.objects.order_by("name").values_list("name", flat=True)),
+            ["P0", "P1", "P2", "P3"],
+        )
+        self.assertFalse(ImportCheckpoint.objects.exists())
+
+    def test_imported_approvals_reach_the_roster_and_loads(self):
+        patient = Patient.objects.create(name="Rostered", phone="555-0199")
+        path = self.write(
+            "approved.csv",
+            [
+                "patient,doctor,requested_date,symptoms,status",
+                f"{patient.pk},Dr. Import,2030-01-07 10:00,Cough,approved",
+                f"{patient.pk},Dr. Import,2030-01-07 11:00,Fever,pending",
+            ],
+        )
+        assignment.rebuild()
+        versions = [
+            fragments.version("doctor", self.doctor.pk),
+            fragments.version("patient", patient.pk),
+        ]
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command(
+                "import_records",
+                "appointment",
+                path,
+                stdout=StringIO(),
+                stderr=StringIO(),
+            )
+        entry = RosterEntry.objects.get()
+        self.assertEqual((entry.summary, entry.patient_name), ("Cough", "Rostered"))
+        self.assertEqual(roster.stale(), 0)
+        self.assertEqual(assignment.snapshot()[1][self.doctor.pk], 1)
+        # The dashboards of both are rendered again.
+        self.assertNotEqual(fragments.version("doctor", self.doctor.pk), versions[0])
+        self.assertNotEqual(fragments.version("patient", patient.pk), versions[1])
+
+    def test_instant_import_reports_a_rate(self):
+        path = self.write("one.jsonl", [json.dumps({"name": "Quick"})])
+        out = StringIO()
+        with mock.patch("hospital.management.commands.import_records.time") as clock:
+            clock.monotonic.return_value = 100.0
+            call_command(
+                "import_records", "patient", path, stdout=out, stderr=StringIO()
+            )
+        self.assertIn("1 imported, 0 rejected (0 rows/sec)", out.getvalue())
+
+    def test_imports_history_outside_working_hours(self):
+        patient = Patient.objects.create(name="Weekend")
+        path = self.write(
+            "history.csv",
+            [
+                "patient,doctor,requested_date,symptoms,status",
+                # A Saturday evening.
+                f"{patient.pk},Dr. Import,2024-03-02 20:00,Late visit,completed",
+            ],
+        )
+        err = StringIO()
+        call_command(
+            "import_records", "appointment", path, stdout=StringIO(), stderr=err
+        )
+        self.assertNotIn("Row ", err.getvalue())
+        appointment = Appointment.objects.get()
+        self.assertEqual(appointment.status, "completed")
+        self.assertEqual(timezone.localtime(appointment.requested_date).hour, 20)
+
+
+@override_settings(PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"])
+class ProvisioningTests(TestCase):
+    def test_accounts_match_create_user(self):
+        User.objects.create_user("taken", password="x")
+        accounts = [
+            Account("dr_a", "pw-a", Doctor(name="Dr. A"), "A@EXAMPLE.COM"),
+            Account("taken", "pw-b", Doctor(name="Dr. B")),
+            Account("pat_c", "pw-c", Patient(name="C")),
+            Account("pat_c", "pw-d", Patient(name="D")),
+        ]
+        created, skipped = provision_accounts(accounts, batch_size=2, processes=1)
+        self.assertEqual((created, skipped), (2, ["taken", "pat_c"]))
+
+        user = authenticate(username="dr_a", password="pw-a")
+        reference = User.objects.create_user("ref", "A@EXAMPLE.COM", "pw-a")
+        self.assertEqual(user.email, reference.email)
+        self.assertEqual(
+            (user.is_active, user.is_staff, user.is_superuser),
+            (reference.is_active, reference.is_staff, reference.is_superuser),
+        )
+        self.assertEqual(user.doctor.name, "Dr. A")
+        self.assertEqual(
+            authenticate(username="pat_c", password="pw-c").patient.name, "C"
+        )
+
+    def test_new_patients_reach_their_doctors_dashboard(self):
+        doctor = Doctor.objects.create(name="Dr. Busy")
+        version = fragments.version("doctor", doctor.pk)
+        accounts = [Account("pat_e", "pw-e", Patient(name="E", doctor=doctor))]
+        with self.captureOnCommitCallbacks(execute=True):
+            provision_accounts(accounts, processes=1)
+        self.assertNotEqual(fragments.version("doctor", doctor.pk), version)
+
+    # Forked workers inherit the MD5 override; spawned ones load the project
+    # settings and hash with PBKDF2, so accept both here.
+    @override_settings(
+        PASSWORD_HASHERS=[
+            "django.contrib.auth.hashers.MD5PasswordHasher",
+            "django.contrib.auth.hashers.PBKDF2PasswordHasher",
+        ]
+    )
+    def test_process_pool_hashes_each_password_in_order(self):
+        count = POOL_THRESHOLD + 2
+        accounts = [
+            Account(f"pool_{n}", f"secret-{n}", Patient(name=f"Pool {n}"))
+            for n in range(count)
+        ]
+        created, skipped = provision_accounts(accounts, batch_size=count, processes=2)
+        self.assertEqual((created, skipped), (count, []))
+        for n in range(count):
+            user = authenticate(username=f"pool_{n}", password=f"secret-{n}")
+            self.assertIsNotNone(user, n)
+            self.assertEqual(user.patient.name, f"Pool {n}")
+        # A neighbour's password must not open the account.
+        self.assertIsNone(authenticate(username="pool_0", password="secret-1"))
+
+
+@override_settings(PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"])
+class LoadDataBenchmarkTests(TestCase):
+    def generate(self, seed):
+        call_command(
+            "generate_load_data",
+            doctors=3,
+            patients=20,
+            appointments=60,
+            seed=seed,
+            stdout=StringIO(),
+            stderr=StringIO(),
+        )
+        return list(Patient.objects.order_by("pk").values_list("name", "age"))
+
+    def test_generation_is_deterministic(self):
+        first = self.generate(7)
+        Appointment.objects.all().delete()
+        Patient.objects.all().delete()
+        Doctor.objects.all().delete()
+        User.objects.all().delete()
+        self.assertEqual(self.generate(7), first)
+        self.assertEqual(Appointment.objects.count(), 60)
+        self.assertTrue(User.objects.filter(username="loadreceptionist").exists())
+        self.assertTrue(RosterEntry.objects.exists())
+        self.assertEqual(roster.stale(), 0)
+
+    def test_benchmark_reports_every_view(self):
+        self.generate(1)
+        out = StringIO()
+        call_command(
+            "benchmark_views", iterations=2, warmup=0, stdout=out, stderr=StringIO()
+        )
+        report = json.loads(out.getvalue())["views"]
+        self.assertEqual(report["receptionist_dashboard"]["status"], 200)
+        self.assertGreater(report["patient_dashboard"]["queries"], 0)
+        for name in ("home", "doctor_dashboard", "patient_list"):
+            self.assertIn("p99_ms", report[name])
+
+    def test_session_benchmark_rolls_back(self):
+        self.generate(1)
+        statuses = list(Appointment.objects.order_by("pk").values_list("status"))
+        out = StringIO()
+        call_command("benchmark_sessions", iterations=2, stdout=out, stderr=StringIO())
+        profiles = json.loads(out.getvalue())["profiles"]
+        self.assertGreater(profiles["django_default"]["session_reads_per_request"], 0)
+        self.assertEqual(profiles["cache"]["session_reads_per_request"], 0)
+        self.assertEqual(profiles["signed_cookies"]["session_writes_per_request"], 0)
+        self.assertEqual(
+            list(Appointment.objects.order_by("pk").values_list("status")), statuses
+        )
+
+    def test_asgi_benchmark_reports_both_handlers(self):
+        out = StringIO()
+        call_command(
+            "benchmark_asgi",
+            requests=4,
+            concurrency=2,
+            views=["about"],
+            stdout=out,
+            stderr=StringIO(),
+        )
+        report = json.loads(out.getvalue())
+        self.assertEqual(report["concurrency"], 2)
+        for handler in ("wsgi", "asgi"):
+            self.assertGreater(
+                report["views"]["about"][handler]["requests_per_second"], 0
+            )
+
+
+class QueryInstrumentationTests(TestCase):
+    def setUp(self):
+        instrumentation.stats.reset()
+
+    def test_fingerprint_collapses_parameters(self):
+        self.assertEqual(
+            instrumentation.fingerprint("SELECT 1 WHERE id IN (%s, %s, %s) LIMIT 21"),
+            instrumentation.fingerprint("SELECT 2 WHERE id IN (%s) LIMIT 5"),
+        )
+
+    def test_server_timing_and_histogram(self):
+        Doctor.objects.create(name="Dr. Timed")
+        response = self.client.get(reverse("doctor_list"))
+        self.assertRegex(
+            response["Server-Timing"], r'^db;dur=[\d.]+;desc="1 queries", app;dur='
+        )
+        snapshot = instrumentation.stats.snapshot()["doctor_list"]
+        self.assertEqual(snapshot["requests"], 1)
+        self.assertEqual(snapshot["queries"], {"<=1": 1})
+
+    @override_settings(HOSPITAL_QUERY_BUDGETS={"doctor_list": 0})
+    def test_over_budget_logs_warning(self):
+        with self.assertLogs("hospital.queries", "WARNING") as logs:
+            self.client.get(reverse("doctor_list"))
+        self.assertIn("doctor_list ran 1 queries (budget 0)", logs.output[0])
+
+    def test_unresolved_paths_share_one_entry(self):
+        for n in range(3):
+            response = self.client.get(f"/no-such-page-{n}/")
+            self.assertEqual(response.status_code, 404)
+        snapshot = instrumentation.stats.snapshot()
+        self.assertEqual(list(snapshot), [instrumentation.UNRESOLVED])
+        self.assertEqual(snapshot[instrumentation.UNRESOLVED]["requests"], 3)
+
+
+class AppointmentEventTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user("desk", password="x", is_staff=True)
+        cls.doctor = Doctor.objects.create(name="Dr. Live", specialty="ENT")
+        cls.patient = Patient.objects.create(name="Live Patient")
+
+    def test_signals_publish_created_and_status_changes(self):
+        broker = events.get_broker()
+        with self.captureOnCommitCallbacks(execute=True):
+            appointment = Appointment.objects.create(
+                patient=self.patient,
+                doctor=self.doctor,
+                requested_date=timezone.now(),
+                symptoms="Ear ache",
+            )
+        created = broker._backlog[-1]
+        self.assertEqual(created["type"], "created")
+        self.assertEqual(created["appointment"]["patient"], "Live Patient")
+
+        appointment = Appointment.objects.get(pk=appointment.pk)
+        appointment.status = "approved"
+        with self.captureOnCommitCallbacks(execute=True):
+            appointment.save()
+        changed = broker._backlog[-1]
+        self.assertEqual(changed["type"], "status_changed")
+        self.assertEqual(changed["appointment"]["previous_status"], "pending")
+        self.assertGreater(changed["id"], created["id"])
+
+    @override_settings(HOSPITAL_SSE_HEARTBEAT=0.01)
+    async def test_stream_replays_and_pushes_events(self):
+        broker = events.get_broker()
+        before = broker.publish({"type": "created", "appointment": {"id": 1}})
+        await self.async_client.aforce_login(self.staff)
+        response = await self.async_client.get(
+            reverse("appointment_events"),
+            headers={"last-event-id": str(before["id"] - 1)},
+        )
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        content = aiter(response.streaming_content)
+        self.assertEqual(await anext(content), b"retry: 3000\n\n")
+        self.assertIn(
+            f"id: {before['id']}\nevent: created".encode(), await anext(content)
+        )
+        self.assertEqual(await anext(content), b": keepalive\n\n")
+
+        live = broker.publish({"type": "status_changed", "appointment": {"id": 1}})
+        frame = await anext(content)
+        while frame.startswith(b":"):
+            frame = await anext(content)
+        self.assertIn(f"id: {live['id']}\nevent: status_changed".encode(), frame)
+        await content.aclose()
+
+    def test_stream_requires_staff(self):
+        self.client.force_login(User.objects.create_user("walkin", password="x"))
+        response = self.client.get(reverse("appointment_events"))
+        self.assertEqual(response.status_code, 403)
+
+
+@override_settings(HOSPITAL_LIST_PAGE_SIZE=2)
+class ReceptionistWindowTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user("frontdesk", password="x", is_staff=True)
+        doctor = Doctor.objects.create(name="Dr. Window")
+        patient = Patient.objects.create(name="Window Patient")
+        now = timezone.now()
+        cls.appointments = {
+            offset: Appointment.objects.create(
+                patient=patient,
+                doctor=doctor,
+                requested_date=now + timedelta(days=offset),
+                symptoms=f"Day {offset}",
+                status="approved",
+            )
+            for offset in (-40, -1, 0, 1, 2, 3, 40)
+        }
+
+    def setUp(self):
+        self.client.force_login(self.staff)
+
+    def approved(self, params):
+        response = self.client.get(reverse("receptionist_dashboard"), params)
+        return response, [a.symptoms for a in response.context["approved_appointments"]]
+
+    def test_custom_range_pages_through_window_only(self):
+        today = timezone.localdate()
+        params = {
+            "window": "range",
+            "start": today - timedelta(days=1),
+            "end": today + timedelta(days=3),
+        }
+        response, first = self.approved(params)
+        self.assertEqual(first, ["Day -1", "Day 0"])
+        cursor = response.context["next_approved_url"].split("approved=")[1]
+        response, second = self.approved(dict(params, approved=cursor))
+        self.assertEqual(second, ["Day 1", "Day 2"])
+
+    def test_today_window(self):
+        _, today = self.approved({"window": "today"})
+        self.assertEqual(today, ["Day 0"])
+
+    def test_complete_past_appointments(self):
+        call_command(
+            "complete_past_appointments",
+            batch_size=1,
+            stdout=StringIO(),
+            stderr=StringIO(),
+        )
+        completed = set(
+            Appointment.objects.filter(status="completed").values_list(
+                "symptoms", flat=True
+            )
+        )
+        self.assertEqual(completed, {"Day -40", "Day -1"})
+
+
+class DashboardFragmentTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor_user = User.objects.create_user("fragdoctor", password="x")
+        cls.patient_user = User.objects.create_user("fragpatient", password="x")
+        cls.doctor = Doctor.objects.create(user=cls.doctor_user, name="Dr. Fragment")
+        cls.patient = Patient.objects.create(
+            user=cls.patient_user, name="Frank", doctor=cls.doctor
+        )
+        cls.appointment = Appointment.objects.create(
+            patient=cls.patient,
+            doctor=cls.doctor,
+            requested_date=timezone.now() + timedelta(days=1),
+            symptoms="Fragment check",
+            status="approved",
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def queries(self, user, url_name):
+        self.client.force_login(user)
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(reverse(url_name))
+        return response, len(captured)
+
+    def test_cached_dashboards_skip_list_queries(self):
+        for user, url_name in [
+            (self.doctor_user, "doctor_dashboard"),
+            (self.patient_user, "patient_dashboard"),
+        ]:
+            _, cold = self.queries(user, url_name)
+            response, warm = self.queries(user, url_name)
+            self.assertLess(warm, cold, url_name)
+            self.assertContains(response, "Fragment check")
+
+    def test_appointment_change_invalidates_both_dashboards(self):
+        self.queries(self.doctor_user, "doctor_dashboard")
+        self.queries(self.patient_user, "patient_dashboard")
+        appointment = Appointment.objects.get(pk=self.appointment.pk)
+        appointment.status = "rejected"
+        with self.captureOnCommitCallbacks(execute=True):
+            appointment.save()
+
+        response, _ = self.queries(self.doctor_user, "doctor_dashboard")
+        self.assertNotContains(response, "Fragment check")
+        response, _ = self.queries(self.patient_user, "patient_dashboard")
+        self.assertContains(response, "Rejected")
+
+    def test_patient_edit_and_reassignment_invalidate_doctors(self):
+        other = Doctor.objects.create(name="Dr. Other")
+        self.queries(self.doctor_user, "doctor_dashboard")
+        patient = Patient.objects.get(pk=self.patient.pk)
+        patient.name = "Francesca"
+        with self.captureOnCommitCallbacks(execute=True):
+            patient.save()
+        response, _ = self.queries(self.doctor_user, "doctor_dashboard")
+        self.assertContains(response, "Francesca")
+
+        version = fragments.version("doctor", self.doctor.pk)
+        patient.doctor = other
+        with self.captureOnCommitCallbacks(execute=True):
+            patient.save()
+        self.assertNotEqual(fragments.version("doctor", self.doctor.pk), version)
+
+    def test_bumps_from_another_process_reach_the_dashboards(self):
+        self.queries(self.doctor_user, "doctor_dashboard")
+        self.queries(self.patient_user, "patient_dashboard")
+        Appointment.objects.filter(pk=self.appointment.pk).update(
+            requested_date=timezone.now() - timedelta(days=1)
+        )
+        # The command runs in a process of its own: it shares the database
+        # and the "versions" cache with the web worker, not local memory.
+        elsewhere = dict(
+            settings.CACHES,
+            default={
+                "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+                "LOCATION": "elsewhere",
+            },
+        )
+        with override_settings(CACHES=elsewhere):
+            with self.captureOnCommitCallbacks(execute=True):
+                call_command(
+                    "complete_past_appointments", stdout=StringIO(), stderr=StringIO()
+                )
+
+        response, _ = self.queries(self.doctor_user, "doctor_dashboard")
+        self.assertNotContains(response, "Fragment check")
+        response, _ = self.queries(self.patient_user, "patient_dashboard")
+        self.assertContains(response, "Completed")
+
+
+@override_settings(PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"])
+class RoleTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("roledoctor", password="secret")
+        cls.doctor = Doctor.objects.create(user=cls.user, name="Dr. Role")
+
+    def setUp(self):
+        cache.clear()
+
+    def sign_in(self, role="doctor"):
+        return self.client.post(
+            reverse("login"),
+            {"username": "roledoctor", "password": "secret", "role": role},
+        )
+
+    def test_login_remembers_role_and_profile(self):
+        response = self.sign_in()
+        self.assertRedirects(response, reverse("doctor_dashboard"))
+        self.assertEqual(
+            self.client.session[roles.SESSION_KEY], [roles.DOCTOR, self.doctor.pk]
+        )
+        response = self.sign_in("patient")
+        self.assertContains(response, "You are not registered as a patient.")
+
+    def test_profile_loaded_with_user(self):
+        self.sign_in()
+        self.client.get(reverse("doctor_dashboard"))
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(reverse("doctor_dashboard"))
+        self.assertEqual(response.context["doctor"], self.doctor)
+        # The session, the user joined to its profiles and the fragment
+        # version; the dashboard fragments are cached.
+        self.assertEqual(len(captured), 3)
+
+    def test_stale_session_role_is_resolved_again(self):
+        self.sign_in()
+        self.doctor.user = None
+        self.doctor.save()
+        Patient.objects.create(user=self.user, name="Now A Patient")
+        response = self.client.get(reverse("patient_dashboard"))
+        self.assertContains(response, "Now A Patient")
+        self.assertEqual(self.client.session[roles.SESSION_KEY][0], roles.PATIENT)
+        response = self.client.get(reverse("doctor_dashboard"))
+        self.assertRedirects(response, reverse("login"))
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user("searcher", password="x", is_staff=True)
+        cls.cardiologist = Doctor.objects.create(
+            name="Dr. Heart", specialty="Cardiology"
+        )
+        cls.by_name = Patient.objects.create(name="Ana Marsh", address="1 Elm Road")
+        cls.by_address = Patient.objects.create(
+            name="Ben Stone", address="9 Marsh Lane"
+        )
+        cls.appointment = Appointment.objects.create(
+            patient=cls.by_name,
+            doctor=cls.cardiologist,
+            requested_date=timezone.now() + timedelta(days=1),
+            symptoms="Palpitations after exercise",
+        )
+
+    def names(self, queryset, text):
+        return [obj.name for obj in search.ranked(queryset, text, 10)]
+
+    def test_prefix_match_ranked_by_column(self):
+        self.assertEqual(self.names(Doctor.objects.all(), "cardi"), ["Dr. Heart"])
+        self.assertEqual(
+            self.names(Patient.objects.all(), "mars"), ["Ana Marsh", "Ben Stone"]
+        )
+        self.assertEqual(self.names(Patient.objects.all(), "ben mars"), ["Ben Stone"])
+        self.assertEqual(self.names(Patient.objects.all(), '" OR *'), [])
+
+    def test_triggers_follow_writes(self):
+        Appointment.objects.filter(pk=self.appointment.pk).update(
+            symptoms="Dizziness", doctor_notes="Refer to neurology"
+        )
+        appointments = Appointment.objects.all()
+        self.assertFalse(search.matching(appointments, "palpitations").exists())
+        self.assertTrue(search.matching(appointments, "dizzi").exists())
+        self.assertTrue(search.matching(appointments, "neuro").exists())
+        Patient.objects.bulk_create([Patient(name="Cleo Marsh")])
+        self.assertEqual(search.matching(Patient.objects.all(), "marsh").count(), 3)
+        self.by_address.delete()
+        self.assertEqual(
+            sorted(self.names(Patient.objects.all(), "marsh")),
+            ["Ana Marsh", "Cleo Marsh"],
+        )
+
+    def test_install_repairs_missing_triggers(self):
+        with connection.cursor() as cursor:
+            cursor.execute("DROP TRIGGER hospital_patient_fts_ai")
+        Patient.objects.create(name="Unindexed Dora")
+        self.assertEqual(self.names(Patient.objects.all(), "dora"), [])
+        search.install(connection)
+        self.assertEqual(self.names(Patient.objects.all(), "dora"), ["Unindexed Dora"])
+
+    def test_search_view_and_admin(self):
+        self.client.force_login(User.objects.create_user("visitor"))
+        self.assertRedirects(
+            self.client.get(reverse("search"), {"q": "heart"}), reverse("home")
+        )
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse("search"), {"q": "palpit"})
+        self.assertEqual(response.context["appointments"], [self.appointment])
+        self.assertEqual(response.context["patients"], [])
+
+        self.staff.is_superuser = True
+        self.staff.save()
+        response = self.client.get(
+            reverse("admin:hospital_appointment_changelist"), {"q": "heart"}
+        )
+        self.assertEqual(list(response.context["cl"].result_list), [self.appointment])
+
+
+@mock.patch("hospital.routers.replica_alias", return_value="replica")
+class ReplicaRoutingTests(SimpleTestCase):
+    def route(self, request, view):
+        seen = []
+
+        def get_response(request):
+            seen.append(PrimaryReplicaRouter().db_for_read(Patient))
+            return HttpResponse()
+
+        middleware = ReplicaRoutingMiddleware(get_response)
+        middleware.process_view(request, view, (), {})
+        response = middleware(request)
+        return seen[0], response
+
+    def test_marked_views_read_from_replica(self, _):
+        factory = RequestFactory()
+        db, _ = self.route(factory.get("/"), replica_reads(lambda r: None))
+        self.assertEqual(db, "replica")
+        db, _ = self.route(factory.get("/"), lambda r: None)
+        self.assertIsNone(db)
+        # Reset once the response is returned.
+        self.assertIsNone(PrimaryReplicaRouter().db_for_read(Patient))
+        self.assertEqual(PrimaryReplicaRouter().db_for_write(Patient), "default")
+
+    def test_writes_pin_client_to_primary(self, _):
+        factory = RequestFactory()
+        view = replica_reads(lambda r: None)
+        db, response = self.route(factory.post("/"), view)
+        self.assertIsNone(db)
+        request = factory.get("/")
+        request.COOKIES[STICKY_COOKIE] = response.cookies[STICKY_COOKIE].value
+        db, _ = self.route(request, view)
+        self.assertIsNone(db)
+        request.COOKIES[STICKY_COOKIE] = "0"
+        db, _ = self.route(request, view)
+        self.assertEqual(db, "replica")
+
+    async def test_async_requests_route_too(self, _):
+        seen = []
+
+        async def get_response(request):
+            router = PrimaryReplicaRouter()
+            seen.append(await sync_to_async(router.db_for_read)(Patient))
+            return HttpResponse()
+
+        middleware = ReplicaRoutingMiddleware(get_response)
+        request = RequestFactory().get("/")
+        await middleware.process_view(request, replica_reads(lambda r: None), (), {})
+        await middleware(request)
+        self.assertEqual(seen, ["replica"])
+        self.assertIsNone(PrimaryReplicaRouter().db_for_read(Patient))
+
+
+class DatabaseConfigTests(SimpleTestCase):
+    def test_sqlite_default_and_replica(self):
+        with mock.patch.dict(
+            os.environ, {"HOSPITAL_DB_REPLICA_NAME": "replica.sqlite3"}, clear=True
+        ):
+            config = databases("primary.sqlite3")
+        self.assertEqual(config["default"]["NAME"], "primary.sqlite3")
+        self.assertEqual(config["default"]["CONN_MAX_AGE"], 60)
+        self.assertTrue(config["default"]["CONN_HEALTH_CHECKS"])
+        self.assertEqual(config["replica"]["NAME"], "replica.sqlite3")
+        self.assertEqual(config["replica"]["TEST"], {"MIRROR": "default"})
+
+    def test_pooled_postgresql(self):
+        environ = {
+            "HOSPITAL_DB_ENGINE": "postgresql",
+            "HOSPITAL_DB_NAME": "hospital",
+            "HOSPITAL_DB_HOST": "primary.internal",
+            "HOSPITAL_DB_POOL": "2:10",
+            "HOSPITAL_DB_REPLICA_HOST": "replica.internal",
+        }
+        with mock.patch.dict(os.environ, environ, clear=True):
+            config = databases("unused")
+        self.assertEqual(
+            config["default"]["OPTIONS"]["pool"], {"min_size": 2, "max_size": 10}
+        )
+        self.assertEqual(config["default"]["CONN_MAX_AGE"], 0)
+        self.assertEqual(config["replica"]["HOST"], "replica.internal")
+        self.assertEqual(config["replica"]["NAME"], "hospital")
+        with mock.patch.dict(os.environ, {"HOSPITAL_DB_ENGINE": "oracle"}):
+            with self.assertRaises(ValueError):
+                databases("unused")
+
+    def test_session_profile(self):
+        # A per-process cache would keep serving logged-out sessions on the
+        # other workers, so cached_db is only the default for a shared one.
+        with mock.patch.dict(os.environ, {}, clear=True):
+            self.assertEqual(session_engine(), "django.contrib.sessions.backends.db")
+            self.assertIn("LocMemCache", session_cache()["BACKEND"])
+        environ = {
+            "HOSPITAL_SESSION_CACHE_BACKEND": (
+                "django.core.cache.backends.redis.RedisCache"
+            ),
+            "HOSPITAL_SESSION_CACHE_LOCATION": "redis://cache:6379/1",
+        }
+        with mock.patch.dict(os.environ, environ, clear=True):
+            self.assertEqual(
+                session_engine(), "django.contrib.sessions.backends.cached_db"
+            )
+            self.assertEqual(session_cache()["LOCATION"], "redis://cache:6379/1")
+        environ = {
+            "HOSPITAL_SESSION_PROFILE": "cache",
+            "HOSPITAL_SESSION_CACHE_DIR": "/var/cache/hospital-sessions",
+        }
+        with mock.patch.dict(os.environ, environ, clear=True):
+            self.assertEqual(session_engine(), "django.contrib.sessions.backends.cache")
+            self.assertEqual(
+                session_cache()["LOCATION"], "/var/cache/hospital-sessions"
+            )
+        with mock.patch.dict(os.environ, {"HOSPITAL_SESSION_PROFILE": "file"}):
+            with self.assertRaises(ValueError):
+                session_engine()
+
+
+class SQLitePragmaTests(TestCase):
+    def test_new_connections_use_profile(self):
+        values = pragmas.current(
+            connection, ["busy_timeout", "synchronous", "temp_store", "cache_size"]
+        )
+        # synchronous NORMAL is 1, temp_store MEMORY is 2.
+        self.assertEqual(
+            values,
+            {
+                "busy_timeout": 5000,
+                "synchronous": 1,
+                "temp_store": 2,
+                "cache_size": -20000,
+            },
+        )
+
+    def test_rejects_malformed_pragmas(self):
+        with self.assertRaises(ValueError):
+            list(pragmas.statements({"journal_mode": "wal; DROP TABLE x"}))
+        with self.assertRaises(ValueError):
+            list(pragmas.statements({"cache size": 10}))
+
+
+class ReportingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user("analyst", password="x", is_staff=True)
+        cls.doctor = Doctor.objects.create(name="Dr. Rollup", specialty="Neurology")
+        patient = Patient.objects.create(name="Rollup Patient")
+        cls.day = timezone.localdate() + timedelta(days=3)
+        cls.appointments = [
+            Appointment.objects.create(
+                patient=patient,
+                doctor=cls.doctor,
+                requested_date=scheduling.slot_start(cls.day, slot),
+                symptoms=f"Slot {slot}",
+            )
+            for slot in range(3)
+        ]
+
+    def refresh(self, **kwargs):
+        return reporting.refresh(until=timezone.now(), **kwargs)
+
+    def test_refresh_is_incremental(self):
+        self.assertEqual(self.refresh(), 1)
+        self.assertEqual(self.refresh(), 0)
+        rollup = DailyAppointmentRollup.objects.get()
+        self.assertEqual(
+            (rollup.day, rollup.status, rollup.appointments, rollup.specialty),
+            (self.day, "pending", 3, "Neurology"),
+        )
+
+        appointment = self.appointments[0]
+        Appointment.objects.filter(pk=appointment.pk).update(
+            status="approved", updated_at=appointment.created_at + timedelta(hours=2)
+        )
+        Appointment.objects.filter(pk=self.appointments[1].pk).update(
+            updated_at=timezone.now()
+        )
+        self.assertEqual(self.refresh(), 1)
+        funnel = {
+            row["status"]: row["total"]
+            for row in reporting.status_funnel(self.day, self.day)
+        }
+        self.assertEqual(funnel["Pending Approval"], 2)
+        self.assertEqual(funnel["Approved"], 1)
+        (specialty,) = reporting.specialty_load(self.day, self.day)
+        self.assertEqual(specialty["average_decision_hours"], 2.0)
+
+    def test_runs_split_gaps_and_long_ranges(self):
+        day = self.day
+        days = [day, day + timedelta(days=1), day + timedelta(days=5)]
+        self.assertEqual(
+            list(reporting.runs(days)),
+            [(day, day + timedelta(days=1)), (days[2], days[2])],
+        )
+        month = [day + timedelta(days=i) for i in range(5)]
+        self.assertEqual(len(list(reporting.runs(month, limit=2))), 3)
+
+    def test_report_pages_read_rollups(self):
+        self.refresh()
+        self.client.force_login(self.staff)
+        params = {"start": self.day, "end": self.day}
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(reverse("reports"), params)
+        self.assertFalse(
+            [q for q in captured if 'FROM "hospital_appointment"' in q["sql"]]
+        )
+        self.assertEqual(response.context["doctors"][0]["total"], 3)
+        response = self.client.get(reverse("report_csv", args=["doctors"]), params)
+        self.assertEqual(
+            response.content.decode().splitlines(),
+            [
+                "Doctor,Appointments,Pending Approval,Approved,Rejected,Completed",
+                "Dr. Rollup,3,3,0,0,0",
+            ],
+        )
+        response = self.client.get(reverse("report_csv", args=["nope"]))
+        self.assertEqual(response.status_code, 404)
+
+
+class ExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_superuser("exporter", password="x")
+        doctor = Doctor.objects.create(name="Dr. Export", specialty="Oncology")
+        cls.patient = Patient.objects.create(
+            name="Export Patient",
+            phone="+1 (555) 010-0100",
+            address="=HYPERLINK(0)",
+            doctor=doctor,
+        )
+        cls.appointment = Appointment.objects.create(
+            patient=cls.patient,
+            doctor=doctor,
+            requested_date=timezone.now(),
+            symptoms="Cough\x01 & <fever>",
+        )
+
+    def setUp(self):
+        self.client.force_login(self.staff)
+
+    def read(self, response):
+        self.assertTrue(response.streaming)
+        return b"".join(response.streaming_content)
+
+    def test_csv_export_joins_names_in_one_query(self):
+        response = self.client.get(reverse("export", args=["patients", "csv"]))
+        self.assertIn("patients-", response["Content-Disposition"])
+        with CaptureQueriesContext(connection) as captured:
+            lines = self.read(response).decode().splitlines()
+        self.assertEqual(len(captured), 1)
+        self.assertEqual(
+            lines,
+            [
+                "ID,Name,Age,Gender,Phone,Address,Admitted,Doctor,Specialty",
+                f"{self.patient.pk},Export Patient,,,+1 (555) 010-0100,"
+                "'=HYPERLINK(0),,Dr. Export,Oncology",
+            ],
+        )
+
+    def test_xlsx_export_is_a_workbook(self):
+        import xml.etree.ElementTree as ET
+        import zipfile
+
+        response = self.client.get(reverse("export", args=["appointments", "xlsx"]))
+        archive = zipfile.ZipFile(BytesIO(self.read(response)))
+        self.assertEqual(archive.testzip(), None)
+        ns = {"s": "http://schemas.openxmlformats.org/spreadsheetml/2006/main"}
+        rows = ET.fromstring(archive.read("xl/worksheets/sheet1.xml")).findall(
+            ".//s:row", ns
+        )
+        self.assertEqual(len(rows), 2)
+        cells = rows[1].findall("s:c", ns)
+        self.assertEqual(cells[0].find("s:v", ns).text, str(self.appointment.pk))
+        self.assertEqual(cells[7].find(".//s:t", ns).text, "Cough & <fever>")
+
+    def test_xlsx_splits_sheets_at_the_row_limit(self):
+        import zipfile
+
+        rows = ([n, f"row {n}"] for n in range(5))
+        data = b"".join(exports.stream_xlsx(["N", "Label"], rows, 2, sheet_rows=3))
+        archive = zipfile.ZipFile(BytesIO(data))
+        sheets = [n for n in archive.namelist() if n.startswith("xl/worksheets/")]
+        self.assertEqual(len(sheets), 3)
+        self.assertEqual(archive.read("xl/workbook.xml").count(b"<sheet "), 3)
+
+    @override_settings(HOSPITAL_EXPORT_CHUNK_SIZE=1)
+    async def test_asgi_exports_stream_asynchronously(self):
+        import zipfile
+
+        def sheet(data):
+            return zipfile.ZipFile(BytesIO(data)).read("xl/worksheets/sheet1.xml")
+
+        await Patient.objects.acreate(name="Second Patient")
+        await self.async_client.aforce_login(self.staff)
+        for fmt, same in [("csv", bytes), ("xlsx", sheet)]:
+            url = reverse("export", args=["patients", fmt])
+            response = await self.async_client.get(url)
+            self.assertTrue(response.is_async, fmt)
+            body = b"".join([chunk async for chunk in response.streaming_content])
+            expected = await sync_to_async(self.read)(
+                await sync_to_async(self.client.get)(url)
+            )
+            self.assertEqual(same(body), same(expected), fmt)
+
+    def test_export_access(self):
+        response = self.client.get(reverse("export", args=["doctors", "csv"]))
+        self.assertEqual(response.status_code, 404)
+        self.client.force_login(User.objects.create_user("visitor", password="x"))
+        response = self.client.get(reverse("export", args=["patients", "csv"]))
+        self.assertEqual(response.status_code, 403)
+
+    def test_admin_action_exports_selection(self):
+        response = self.client.post(
+            reverse("admin:hospital_appointment_changelist"),
+            {"action": "export_csv", "_selected_action": [self.appointment.pk]},
+        )
+        lines = self.read(response).decode().splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(lines[1].startswith(f"{self.appointment.pk},Export Patient,"))
+
+
+class TriageTests(TestCase):
+    # A Monday far enough ahead that "now" never falls inside it.
+    MONDAY = datetime(2030, 1, 7).date()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_superuser("triage", password="x")
+        cls.doctor = Doctor.objects.create(name="Dr. Triage", specialty="ENT")
+        cls.patient = Patient.objects.create(name="Triage Patient")
+        cls.book(0, status="approved")
+        cls.taken = cls.book(0)
+        cls.first, cls.double = cls.book(1), cls.book(1)
+        cls.free = cls.book(2)
+        cls.decided = cls.book(3, status="rejected")
+
+    @classmethod
+    def book(cls, slot, status="pending"):
+        return Appointment.objects.create(
+            patient=cls.patient,
+            doctor=cls.doctor,
+            requested_date=scheduling.slot_start(cls.MONDAY, slot),
+            symptoms="Sore throat",
+            status=status,
+        )
+
+    def selection(self):
+        pks = [self.taken.pk, self.first.pk, self.double.pk, self.free.pk]
+        return Appointment.objects.filter(pk__in=pks + [self.decided.pk])
+
+    def statuses(self):
+        return dict(Appointment.objects.values_list("pk", "status"))
+
+    def test_batch_approval_skips_taken_slots(self):
+        counters.rebuild()
+        with CaptureQueriesContext(connection) as captured:
+            with self.captureOnCommitCallbacks(execute=True):
+                result = triage.apply(self.selection(), "approved", "Confirmed")
+        updates = [q for q in captured if q["sql"].startswith("UPDATE")]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(
+            sorted(a.pk for a in result.updated), [self.first.pk, self.free.pk]
+        )
+        self.assertEqual(result.conflicts, [self.taken, self.double])
+        self.assertEqual(result.skipped, 1)
+        self.assertIn("2 left pending", result.summary())
+
+        statuses = self.statuses()
+        self.assertEqual(statuses[self.double.pk], "pending")
+        self.assertEqual(statuses[self.free.pk], "approved")
+        self.assertEqual(
+            Appointment.objects.get(pk=self.free.pk).receptionist_notes, "Confirmed"
+        )
+        totals = counters.get_counts()
+        self.assertEqual(totals[counters.appointment_key("pending")], 2)
+        self.assertEqual(totals[counters.appointment_key("approved")], 3)
+        self.assertEqual(
+            Notification.objects.filter(appointment__in=result.updated).count(), 4
+        )
+        event = events.get_broker()._backlog[-1]
+        self.assertEqual(event["type"], "bulk_status_changed")
+        self.assertEqual(sorted(event["appointments"]), [self.first.pk, self.free.pk])
+
+    def test_view_rejects_selection(self):
+        self.client.force_login(self.staff)
+        response = self.client.post(
+            reverse("bulk_triage"),
+            {
+                "appointments": [self.taken.pk, self.double.pk],
+                "status": "rejected",
+                "receptionist_notes": "",
+            },
+            follow=True,
+        )
+        self.assertContains(response, "Rejected 2 appointment(s).")
+        statuses = self.statuses()
+        self.assertEqual(statuses[self.taken.pk], "rejected")
+        self.assertEqual(statuses[self.first.pk], "pending")
+
+        response = self.client.post(reverse("bulk_triage"), {"status": "approved"})
+        self.assertContains(response, "Select at least one appointment.")
+
+    def test_admin_action_approves_selection(self):
+        self.client.force_login(self.staff)
+        self.client.post(
+            reverse("admin:hospital_appointment_changelist"),
+            {"action": "approve_selected", "_selected_action": [self.free.pk]},
+        )
+        self.assertEqual(self.statuses()[self.free.pk], "approved")
+
+
+class NotificationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = Doctor.objects.create(
+            name="Dr. Mail", specialty="ENT", email="mail@example.com"
+        )
+        user = User.objects.create_user("mailpatient", email="patient@example.com")
+        cls.patient = Patient.objects.create(name="Mail Patient", user=user)
+        cls.appointment = Appointment.objects.create(
+            patient=cls.patient,
+            doctor=cls.doctor,
+            requested_date=timezone.now() + timedelta(days=2),
+            symptoms="Ear ache",
+        )
+
+    def decide(self, status):
+        appointment = Appointment.objects.get(pk=self.appointment.pk)
+        appointment.status = status
+        appointment.save()
+        return appointment
+
+    def test_status_change_costs_one_insert(self):
+        self.assertFalse(Notification.objects.exists())
+        with CaptureQueriesContext(connection) as captured:
+            appointment = self.decide("approved")
+        inserts = [
+            q
+            for q in captured
+            if 'INTO "hospital_notification"' in q["sql"]
+            and q["sql"].startswith("INSERT")
+        ]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(
+            sorted(Notification.objects.values_list("recipient", flat=True)),
+            ["doctor", "patient"],
+        )
+        notifications.enqueue([appointment])
+        self.assertEqual(Notification.objects.count(), 2)
+
+    def test_drain_sends_only_the_latest_status(self):
+        self.decide("approved")
+        self.decide("rejected")
+        totals = notifications.drain()
+        self.assertEqual(totals["sent"], 1)
+        self.assertEqual(totals["superseded"], 2)
+        (message,) = mail.outbox
+        self.assertEqual(message.to, ["patient@example.com"])
+        self.assertIn("has been rejected", message.body)
+        self.assertEqual(notifications.drain()["sent"], 0)
+
+    @override_settings(HOSPITAL_NOTIFICATION_MAX_ATTEMPTS=2)
+    def test_failures_back_off_then_give_up(self):
+        self.decide("approved")
+        transport = mock.Mock()
+        transport.send.side_effect = lambda messages: [OSError("down")] * len(messages)
+        self.assertEqual(notifications.drain(transport=transport)["retry"], 2)
+        self.assertEqual(notifications.drain(transport=transport)["retry"], 0)
+        pending = Notification.objects.get(recipient="patient")
+        self.assertEqual(pending.attempts, 1)
+        self.assertEqual(pending.last_error, "OSError: down")
+        self.assertGreater(pending.available_at, timezone.now() + timedelta(seconds=20))
+
+        Notification.objects.update(available_at=timezone.now())
+        self.assertEqual(notifications.drain(transport=transport)["failed"], 2)
+        self.assertEqual(
+            set(Notification.objects.values_list("state", flat=True)), {"failed"}
+        )
+
+    def test_command_reports_totals(self):
+        self.decide("approved")
+        out = StringIO()
+        call_command("send_notifications", stdout=out)
+        self.assertIn("2 sent", out.getvalue())
+        self.assertEqual(len(mail.outbox), 2)
+
+
+class AsyncViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = Doctor.objects.create(
+            user=User.objects.create_user("asyncdoc", password="x"),
+            name="Dr. Async",
+            specialty="Cardiology",
+        )
+        cls.patient = Patient.objects.create(
+            user=User.objects.create_user("asyncpatient", password="x"),
+            name="Async Patient",
+            doctor=cls.doctor,
+        )
+        cls.staff = User.objects.create_user("asyncdesk", password="x", is_staff=True)
+
+    async def test_public_views_under_asgi(self):
+        for name in ("home", "about", "doctor_list", "patient_list"):
+            response = await self.async_client.get(reverse(name))
+            self.assertEqual(response.status_code, 200, name)
+        self.assertContains(response, "Async Patient")
+        # Queries run on a worker thread are still attributed to the request.
+        response = await self.async_client.get(reverse("doctor_list"))
+        self.assertIn('desc="1 queries"', response["Server-Timing"])
+
+    async def test_dashboards_under_asgi(self):
+        await self.async_client.aforce_login(self.doctor.user)
+        response = await self.async_client.get(reverse("doctor_dashboard"))
+        self.assertContains(response, "Async Patient")
+        await self.async_client.aforce_login(self.patient.user)
+        response = await self.async_client.get(reverse("patient_dashboard"))
+        self.assertEqual(response.context["patient"], self.patient)
+        response = await self.async_client.get(reverse("doctor_dashboard"))
+        self.assertRedirects(response, reverse("login"), fetch_redirect_response=False)
+        await self.async_client.aforce_login(self.staff)
+        response = await self.async_client.get(reverse("receptionist_dashboard"))
+        self.assertEqual(response.status_code, 200)
+
+    async def test_streamed_list_iterates_asynchronously(self):
+        response = await self.async_client.get(reverse("doctor_list"), {"stream": 1})
+        self.assertTrue(response.is_async)
+        content = b"".join([chunk async for chunk in response.streaming_content])
+        self.assertIn(b"Dr. Async", content)
+
+    def test_streamed_list_stays_synchronous_under_wsgi(self):
+        response = self.client.get(reverse("doctor_list"), {"stream": 1})
+        self.assertFalse(response.is_async)
+        self.assertIn(b"Dr. Async", b"".join(response.streaming_content))
+
+    async def test_async_counts_match(self):
+        await sync_to_async(counters.invalidate)()
+        counts = await counters.aget_counts()
+        self.assertEqual(counts, await sync_to_async(counters.get_counts)())
+        self.assertEqual(counts[counters.PATIENTS], 1)
+
+
+class SessionTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("sessionuser", password="x")
+
+    def make_sessions(self, expired, live):
+        now = timezone.now()
+        Session.objects.bulk_create(
+            [
+                Session(
+                    session_key=f"expired{i}",
+                    session_data="",
+                    expire_date=now - timedelta(days=1, minutes=i),
+                )
+                for i in range(expired)
+            ]
+            + [
+                Session(
+                    session_key=f"live{i}",
+                    session_data="",
+                    expire_date=now + timedelta(days=1),
+                )
+                for i in range(live)
+            ]
+        )
+
+    def test_prune_deletes_expired_sessions_in_batches(self):
+        self.make_sessions(expired=5, live=2)
+        with CaptureQueriesContext(connection) as captured:
+            self.assertEqual(sessions.prune(batch_size=2), 5)
+        deletes = [q for q in captured if q["sql"].startswith("DELETE")]
+        self.assertEqual(len(deletes), 3)
+        self.assertEqual(
+            set(Session.objects.values_list("session_key", flat=True)),
+            {"live0", "live1"},
+        )
+        out = StringIO()
+        call_command("prune_sessions", batch_size=2, stdout=out)
+        self.assertIn("Deleted 0 expired session(s).", out.getvalue())
+
+    @override_settings(SESSION_ENGINE="django.contrib.sessions.backends.cache")
+    def test_prune_leaves_cache_sessions_to_expire(self):
+        self.make_sessions(expired=1, live=0)
+        self.assertIsNone(sessions.prune())
+        self.assertEqual(Session.objects.count(), 1)
+
+    @override_settings(SESSION_ENGINE="django.contrib.sessions.backends.cached_db")
+    def test_page_views_read_the_session_from_the_cache(self):
+        self.client.force_login(self.user)
+        self.client.get(reverse("about"))
+        with CaptureQueriesContext(connection) as captured:
+            self.client.get(reverse("about"))
+        self.assertFalse([q for q in captured if "django_session" in q["sql"]])
+
+    def test_messages_are_kept_in_a_cookie(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse("logout"))
+        self.assertIn("messages", response.cookies)
+        response = self.client.get(reverse("home"))
+        self.assertContains(response, "You have been logged out successfully.")
+
+
+class TemplateCacheTests(TestCase):
+    def test_warm_compiles_every_template_into_the_cache(self):
+        results = template_cache.warm()
+        names = {name for name, _, _ in results}
+        self.assertTrue(
+            {"base.html", "patient_list.html", "notifications/appointment_status.txt"}
+            <= names
+        )
+        self.assertEqual([name for name, _, error in results if error], [])
+        loader = engines["django"].engine.template_loaders[0]
+        self.assertIn("patient_list.html", loader.get_template_cache)
+
+    def test_broken_template_fails_the_command(self):
+        with tempfile.TemporaryDirectory() as directory:
+            with open(os.path.join(directory, "broken.html"), "w") as handle:
+                handle.write("{% if %}")
+            templates = [
+                {
+                    "BACKEND": "django.template.backends.django.DjangoTemplates",
+                    "DIRS": [directory],
+                }
+            ]
+            with override_settings(TEMPLATES=templates):
+                results = template_cache.warm()
+                self.assertIsInstance(results[0][2], TemplateSyntaxError)
+                with self.assertRaisesMessage(CommandError, "1 template(s)"):
+                    call_command("warm_templates", stdout=StringIO(), stderr=StringIO())
+
+    def test_render_timer_attributes_rows_to_their_template(self):
+        doctor = Doctor.objects.create(name="Dr. Timer", specialty="Oncology")
+        for i in range(3):
+            Patient.objects.create(name=f"Timed {i}", doctor=doctor)
+        with template_cache.RenderTimer() as timer:
+            self.client.get(reverse("patient_list"))
+        stats = timer.stats()
+        self.assertEqual(stats["patient_row.html"]["renders"], 3)
+        self.assertEqual(stats["patient_list.html"]["renders"], 1)
+        self.assertGreater(stats["patient_list.html"]["self_ms"], 0)
+        self.assertGreaterEqual(
+            stats["patient_list.html"]["total_ms"],
+            stats["patient_row.html"]["total_ms"],
+        )
+
+
+@override_settings(HOSPITAL_ARCHIVE_AFTER_DAYS=90)
+class ArchiveTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.doctor = Doctor.objects.create(name="Dr. Archive", specialty="ENT")
+        self.patient = Patient.objects.create(
+            user=User.objects.create_user("archived", password="x"),
+            name="Archive Patient",
+        )
+        self.old = timezone.now() - timedelta(days=200)
+
+    def appointment(self, status, age_days, slot=0):
+        appointment = Appointment.objects.create(
+            patient=self.patient,
+            doctor=self.doctor,
+            requested_date=self.old + timedelta(hours=slot),
+            symptoms=f"{status} {age_days}",
+            status=status,
+        )
+        changed = timezone.now() - timedelta(days=age_days)
+        Appointment.objects.filter(pk=appointment.pk).update(
+            created_at=changed, updated_at=changed
+        )
+        return appointment
+
+    def test_archives_old_finished_appointments_in_batches(self):
+        completed = self.appointment("completed", 100, slot=1)
+        rejected = self.appointment("rejected", 120, slot=2)
+        recent = self.appointment("completed", 10, slot=3)
+        approved = self.appointment("approved", 150, slot=4)
+        Notification.objects.all().update(state="sent")
+        unsent = self.appointment("rejected", 130, slot=5)
+        self.assertTrue(unsent.notifications.filter(state="pending").exists())
+        counters.rebuild()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            moved = archive.archive(size=1)
+        self.assertEqual(moved, {"completed": 1, "rejected": 1})
+        self.assertEqual(
+            set(Appointment.objects.values_list("pk", flat=True)),
+            {recent.pk, approved.pk, unsent.pk},
+        )
+        archived = ArchivedAppointment.objects.get(pk=completed.pk)
+        self.assertEqual(archived.archive_month, archive.month_of(self.old))
+        self.assertEqual(archived.symptoms, "completed 100")
+        self.assertFalse(Notification.objects.filter(appointment=rejected.pk).exists())
+        self.assertEqual(counters.get_counts()[counters.appointment_key("rejected")], 1)
+        self.assertEqual(archive.archive(), {})
+
+    def test_full_history_includes_the_archive(self):
+        archived = self.appointment("completed", 100, slot=1)
+        live = self.appointment("pending", 0, slot=2)
+        archive.archive()
+        history = list(Appointment.objects.full_history_for_patient(self.patient))
+        self.assertEqual([a.pk for a in history], [live.pk, archived.pk])
+        self.assertEqual([a.archived for a in history], [False, True])
+        self.assertEqual(history[1].doctor.name, "Dr. Archive")
+        self.assertEqual(
+            Appointment.objects.including_archive(doctor=self.doctor).count(), 2
+        )
+        self.client.force_login(self.patient.user)
+        self.assertContains(
+            self.client.get(reverse("patient_dashboard")), "completed 100"
+        )
+
+    def test_rollups_keep_archived_appointments(self):
+        self.appointment("completed", 100, slot=1)
+        self.appointment("rejected", 100, slot=2)
+        Notification.objects.all().update(state="sent")
+        reporting.refresh(until=timezone.now())
+        day = timezone.localdate(self.old)
+        before = reporting.status_funnel(day, day)
+        self.assertEqual(sum(archive.archive().values()), 2)
+        reporting.refresh(rebuild=True, until=timezone.now())
+        self.assertEqual(reporting.status_funnel(day, day), before)
+
+    def test_changes_not_rolled_up_stay_live(self):
+        self.appointment("completed", 100)
+        watermark = timezone.now() - timedelta(days=150)
+        ReportWatermark.objects.create(name=reporting.WATERMARK, value=watermark)
+        self.assertEqual(archive.cutoff(), watermark)
+        out = StringIO()
+        call_command("archive_appointments", dry_run=True, stdout=out)
+        self.assertIn("0 appointment(s)", out.getvalue())
+        ReportWatermark.objects.update(value=timezone.now())
+        call_command("archive_appointments", stdout=out)
+        self.assertIn("Archived 1 appointment(s)", out.getvalue())
+
+
+class AssignmentTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.busy = Doctor.objects.create(name="Busy", specialty="Cardiology")
+        self.free = Doctor.objects.create(name="Free", specialty="cardiology ")
+        self.ent = Doctor.objects.create(name="Ear", specialty="ENT")
+        self.soon = timezone.now() + timedelta(days=3)
+
+    def patient(self, doctor, name="Patient"):
+        return Patient.objects.create(name=name, doctor=doctor)
+
+    def appointment(self, patient, doctor, status="approved", when=None):
+        return Appointment.objects.create(
+            patient=patient,
+            doctor=doctor,
+            requested_date=when or self.soon,
+            symptoms="check-up",
+            status=status,
+        )
+
+    def assertLoadsCurrent(self):
+        self.assertEqual(assignment.snapshot(), assignment._load_from_db())
+
+    def test_loads_count_patients_and_upcoming_approvals(self):
+        first = self.patient(self.busy)
+        self.patient(self.busy)
+        self.appointment(first, self.free)
+        self.appointment(first, self.free, when=timezone.now() - timedelta(days=1))
+        self.appointment(first, self.ent, status="pending")
+        roster, loads = assignment.rebuild()
+        self.assertEqual(loads, {self.busy.pk: 2, self.free.pk: 1, self.ent.pk: 0})
+        table = assignment.LoadTable(roster, loads)
+        self.assertEqual(table.specialties(), ["cardiology", "ent"])
+        self.assertEqual(table.least_loaded("cardiology"), self.free.pk)
+        self.assertEqual(table.least_loaded(), self.ent.pk)
+        table.add(self.free.pk, 2)
+        self.assertEqual(table.least_loaded("cardiology"), self.busy.pk)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.patient(self.free)
+        with self.assertNumQueries(0):
+            _, loads = assignment.snapshot()
+        self.assertEqual(loads[self.free.pk], 2)
+
+    def test_signals_and_triage_keep_loads_current(self):
+        patient = self.patient(self.busy)
+        assignment.rebuild()
+        with self.captureOnCommitCallbacks(execute=True):
+            patient.doctor = self.free
+            patient.save()
+        self.assertLoadsCurrent()
+        with self.captureOnCommitCallbacks(execute=True):
+            appointment = self.appointment(patient, self.busy, status="pending")
+            appointment.status = "approved"
+            appointment.save()
+        self.assertLoadsCurrent()
+        with self.captureOnCommitCallbacks(execute=True):
+            appointment.doctor = self.ent
+            appointment.save()
+        self.assertLoadsCurrent()
+        with self.captureOnCommitCallbacks(execute=True):
+            pending = self.appointment(
+                patient,
+                self.busy,
+                status="pending",
+                when=self.soon + timedelta(hours=1),
+            )
+            triage.apply(Appointment.objects.filter(pk=pending.pk), "approved")
+        self.assertLoadsCurrent()
+        with self.captureOnCommitCallbacks(execute=True):
+            appointment.delete()
+            patient.delete()
+        self.assertLoadsCurrent()
+        with self.captureOnCommitCallbacks(execute=True):
+            Doctor.objects.create(name="New", specialty="Dermatology")
+        self.assertIn("dermatology", assignment.LoadTable.current().specialties())
+
+    def test_patient_create_assigns_the_least_loaded_doctor(self):
+        self.patient(self.busy)
+        response = self.client.get(reverse("patient_create"))
+        self.assertContains(response, "Assign automatically")
+        self.assertContains(response, "<td>Dr. Free</td>")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                reverse("patient_create"),
+                {"name": "Auto", "gender": "F", "specialty": "Cardiology"},
+            )
+        self.assertEqual(Patient.objects.get(name="Auto").doctor, self.free)
+        # Both cardiologists now have one patient; the ENT doctor has none.
+        self.client.post(reverse("patient_create"), {"name": "Any", "gender": "M"})
+        self.assertEqual(Patient.objects.get(name="Any").doctor, self.ent)
+        response = self.client.post(
+            reverse("patient_create"),
+            {"name": "Chosen", "gender": "M", "doctor": self.busy.pk},
+        )
+        self.assertEqual(Patient.objects.get(name="Chosen").doctor, self.busy)
+
+    def test_specialty_choices_skip_the_blank_specialty(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Doctor.objects.create(name="General")
+        self.assertEqual(
+            PatientCreateForm().fields["specialty"].choices,
+            [("", "Any"), ("Cardiology", "Cardiology"), ("ENT", "ENT")],
+        )
+
+    def test_imports_leave_a_missing_doctor_empty(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".jsonl", delete=False) as f:
+            f.write("\n".join(json.dumps({"name": f"Imported {n}"}) for n in range(3)))
+        self.addCleanup(os.remove, f.name)
+        call_command(
+            "import_records", "patient", f.name, stdout=StringIO(), stderr=StringIO()
+        )
+        self.assertEqual(
+            list(Patient.objects.filter(name__startswith="Imported").values("doctor")),
+            [{"doctor": None}] * 3,
+        )
+
+    def test_rebalance_moves_patients_without_upcoming_appointments(self):
+        booked = self.patient(self.busy, "Booked")
+        self.appointment(booked, self.busy)
+        for n in range(5):
+            self.patient(self.busy, f"Movable {n}")
+        self.patient(self.ent, "Elsewhere")
+
+        out = StringIO()
+        call_command("rebalance_patients", dry_run=True, stdout=out)
+        self.assertIn("Cardiology: spread 7 -> 1", out.getvalue())
+        self.assertIn("Would move 3 patient(s).", out.getvalue())
+        self.assertEqual(self.free.patients.count(), 0)
+
+        assignment.rebuild()
+        with self.captureOnCommitCallbacks(execute=True):
+            moves, _, after = assignment.rebalance("cardiology")
+        self.assertEqual(len(moves), 3)
+        self.assertEqual(after.spread("cardiology"), 1)
+        self.assertEqual(self.free.patients.count(), 3)
+        booked.refresh_from_db()
+        self.assertEqual(booked.doctor, self.busy)
+        self.assertLoadsCurrent()
+        self.assertEqual(assignment.rebalance()[0], [])
+
+        with self.assertRaises(CommandError):
+            call_command("rebalance_patients", tolerance=0, stdout=out)
+        with self.assertRaises(CommandError):
+            call_command("rebalance_patients", specialty="Oncology", stdout=out)
+
+
+class RosterTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.doctor = Doctor.objects.create(
+            user=User.objects.create_user("rosterdoc", password="x"),
+            name="Roster",
+            specialty="Cardiology",
+        )
+        self.patient = Patient.objects.create(
+            name="Rosa", phone="555-0100", doctor=self.doctor
+        )
+        self.today = timezone.localdate()
+
+    def appointment(self, days, status="approved", hour=10):
+        when = timezone.make_aware(
+            datetime.combine(self.today + timedelta(days=days), time(hour))
+        )
+        return Appointment.objects.create(
+            patient=self.patient,
+            doctor=self.doctor,
+            requested_date=when,
+            symptoms=f"Day {days} at {hour}",
+            status=status,
+        )
+
+    def test_changes_update_the_roster_incrementally(self):
+        appointment = self.appointment(1, status="pending")
+        self.assertFalse(RosterEntry.objects.exists())
+        appointment.status = "approved"
+        appointment.receptionist_notes = "Bring results"
+        appointment.save()
+        entry = RosterEntry.objects.get()
+        self.assertEqual(entry.day, self.today + timedelta(days=1))
+        self.assertEqual(entry.receptionist_notes, "Bring results")
+
+        self.patient.name = "Rosalind"
+        self.patient.save()
+        self.assertEqual(RosterEntry.objects.get().patient_name, "Rosalind")
+        appointment.status = "rejected"
+        appointment.save()
+        self.assertFalse(RosterEntry.objects.exists())
+
+        pending = self.appointment(2, status="pending")
+        triage.apply(Appointment.objects.filter(pk=pending.pk), "approved", "Fasting")
+        self.assertEqual(RosterEntry.objects.get().receptionist_notes, "Fasting")
+        past = self.appointment(-2)
+        self.assertEqual(roster.stale(), 0)
+        call_command("complete_past_appointments", stdout=StringIO(), stderr=StringIO())
+        self.assertFalse(RosterEntry.objects.filter(pk=past.pk).exists())
+        pending.delete()
+        self.assertFalse(RosterEntry.objects.exists())
+
+    def test_dashboard_shows_this_weeks_roster(self):
+        self.appointment(0, hour=15)
+        self.appointment(0, hour=9)
+        self.appointment(3)
+        self.appointment(30)
+        self.appointment(-1)
+        self.client.force_login(self.doctor.user)
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(reverse("doctor_dashboard"))
+        statements = [query["sql"] for query in captured]
+        # One indexed lookup of the roster; Appointment is not read at all.
+        self.assertEqual(sum('"hospital_rosterentry"' in sql for sql in statements), 1)
+        self.assertFalse(any('"hospital_appointment"' in sql for sql in statements))
+        self.assertEqual(
+            [entry.summary for entry in response.context["roster"]],
+            ["Day 0 at 9", "Day 0 at 15", "Day 3 at 10"],
+        )
+        self.assertContains(response, "This Week (3)")
+        self.assertNotContains(response, "Day 30")
+
+    def test_daily_roster_endpoint(self):
+        self.appointment(1, hour=11)
+        self.appointment(1, hour=8)
+        self.appointment(2)
+        self.client.force_login(self.doctor.user)
+        day = self.today + timedelta(days=1)
+        response = self.client.get(
+            reverse("doctor_roster"), {"date": day.isoformat(), "format": "json"}
+        )
+        data = response.json()
+        self.assertEqual(data["date"], day.isoformat())
+        self.assertEqual(
+            [(a["summary"], a["patient"], a["phone"]) for a in data["appointments"]],
+            [("Day 1 at 8", "Rosa", "555-0100"), ("Day 1 at 11", "Rosa", "555-0100")],
+        )
+        response = self.client.get(reverse("doctor_roster"), {"date": "not a date"})
+        self.assertEqual(response.context["day"], self.today)
+        self.assertContains(response, "window.print()")
+        self.assertContains(response, "Nothing is approved for this day.")
+
+    def test_refresh_roster_rebuilds_and_checks(self):
+        self.appointment(1)
+        self.appointment(2)
+        RosterEntry.objects.all().delete()
+        out = StringIO()
+        with self.assertRaises(CommandError):
+            call_command("refresh_roster", check=True, stdout=out)
+        call_command("refresh_roster", doctor=self.doctor.pk, stdout=out)
+        self.assertIn("Rebuilt 2 roster entries over 2 doctor-days.", out.getvalue())
+        call_command("refresh_roster", check=True, stdout=out)
+        self.assertIn("up to date", out.getvalue())
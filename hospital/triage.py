@@ -0,0 +1,165 @@
+"""
+Approve or reject many pending appointments at once.
+
+:func:`apply` does in one transaction what ``approve_appointment`` does per
+request: it locks the doctors involved, checks every approval for a double
+booking against one :class:`~hospital.scheduling.BookingIndex` (so a batch
+cannot book the same slot twice either) and writes the new status and notes
+with a single ``UPDATE ... WHERE id IN``. The UPDATE bypasses the model
+signals, so the counters, doctor loads and rosters, cached dashboards,
+receptionist event stream and notification outbox are updated here once for
+the whole batch.
+"""
+
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from . import (
+    assignment,
+    counters,
+    events,
+    fragments,
+    notifications,
+    roster,
+    scheduling,
+)
+from .models import Appointment, Doctor
+
+DECISIONS = ("approved", "rejected")
+DEFAULT_BATCH_SIZE = 200
+
+
+def batch_size():
+    """Pending appointments listed, and selectable, per triage page."""
+    return getattr(settings, "HOSPITAL_TRIAGE_BATCH_SIZE", DEFAULT_BATCH_SIZE)
+
+
+class Result:
+    def __init__(self, status):
+        self.status = status
+        self.updated = []
+        # Approvals left pending because their slot is taken.
+        self.conflicts = []
+        # Selected appointments that were no longer pending.
+        self.skipped = 0
+
+    def summary(self):
+        verb = "Approved" if self.status == "approved" else "Rejected"
+        parts = [f"{verb} {len(self.updated)} appointment(s)."]
+        if self.conflicts:
+            held = "; ".join(
+                f"{appointment.patient.name} with Dr. {appointment.doctor.name} at "
+                f"{timezone.localtime(appointment.requested_date):%b %d, %Y %I:%M %p}"
+                for appointment in self.conflicts
+            )
+            parts.append(f"{len(self.conflicts)} left pending, slot taken: {held}.")
+        if self.skipped:
+            parts.append(f"{self.skipped} already decided.")
+        return " ".join(parts)
+
+
+def _booking_index(appointments):
+    # An approved appointment in the same slot starts less than one slot
+    # away from the one being checked.
+    margin = timedelta(minutes=scheduling.slot_minutes())
+    dates = [appointment.requested_date for appointment in appointments]
+    return scheduling.BookingIndex.load(
+        {appointment.doctor_id for appointment in appointments},
+        min(dates) - margin,
+        max(dates) + margin,
+    )
+
+
+def _approvable(appointments, result):
+    index = _booking_index(appointments)
+    approvable = []
+    for appointment in sorted(appointments, key=lambda a: (a.requested_date, a.pk)):
+        position = scheduling.slot_of(appointment.requested_date)
+        if position is not None:
+            if index.is_booked(appointment.doctor_id, *position):
+                result.conflicts.append(appointment)
+                continue
+            index.add(appointment.doctor_id, appointment.requested_date)
+        approvable.append(appointment)
+    return approvable
+
+
+def apply(queryset, status, notes=""):
+    """
+    Set ``status`` (and ``notes``, if given) on the pending appointments in
+    ``queryset``. Returns a :class:`Result`.
+    """
+    if status not in DECISIONS:
+        raise ValueError(f"Cannot triage appointments to {status!r}.")
+    result = Result(status)
+    with transaction.atomic():
+        selected = list(queryset.order_by().values_list("pk", "doctor_id"))
+        pks = {pk for pk, _ in selected}
+        # Lock in a fixed order so concurrent batches cannot deadlock.
+        list(
+            Doctor.objects.select_for_update()
+            .filter(pk__in={doctor_id for _, doctor_id in selected})
+            .order_by("pk")
+            .values_list("pk", flat=True)
+        )
+        appointments = list(
+            Appointment.objects.select_for_update(of=("self",))
+            .filter(pk__in=pks, status="pending")
+            .select_related("patient", "doctor")
+        )
+        result.skipped = len(pks) - len(appointments)
+        if status == "approved" and appointments:
+            appointments = _approvable(appointments, result)
+        if not appointments:
+            return result
+
+        changes = {"status": status, "updated_at": timezone.now()}
+        if notes:
+            changes["receptionist_notes"] = notes
+        Appointment.objects.filter(
+            pk__in=[appointment.pk for appointment in appointments]
+        ).update(**changes)
+        for appointment in appointments:
+            appointment.status = status
+            appointment._loaded_status = status
+            if notes:
+                appointment.receptionist_notes = notes
+        result.updated = appointments
+        notifications.enqueue(appointments)
+        counters.adjust(
+            {
+                counters.appointment_key("pending"): -len(appointments),
+                counters.appointment_key(status): len(appointments),
+            }
+        )
+        if status == "approved":
+            roster.sync(appointments)
+            assignment.adjust(_upcoming_by_doctor(appointments))
+        transaction.on_commit(lambda: _notify(appointments, status))
+    return result
+
+
+def _upcoming_by_doctor(appointments):
+    now = timezone.now()
+    return Counter(
+        appointment.doctor_id
+        for appointment in appointments
+        if assignment.counts_toward_load("approved", appointment.requested_date, now)
+    )
+
+
+def _notify(appointments, status):
+    fragments.bump("doctor", *{appointment.doctor_id for appointment in appointments})
+    fragments.bump("patient", *{appointment.patient_id for appointment in appointments})
+    events.get_broker().publish(
+        {
+            "type": "bulk_status_changed",
+            "status": status,
+            "previous_status": "pending",
+            "appointments": [appointment.pk for appointment in appointments],
+        }
+    )
@@ -10,11 +10,20 @@ from hospital.views import (
     patient_login,
     unified_login,
     doctor_dashboard,
+    doctor_roster,
     patient_dashboard,
     logout_view,
     appointment_request,
     receptionist_dashboard,
+    appointment_events,
     approve_appointment,
+    bulk_triage,
+    available_slots,
+    query_stats,
+    search_records,
+    reports,
+    report_csv,
+    export_records,
 )
 
 urlpatterns = [
@@ -23,6 +32,7 @@ urlpatterns = [
     # Authentication
     path("login/", unified_login, name="login"),
     path("doctor/dashboard/", doctor_dashboard, name="doctor_dashboard"),
+    path("doctor/roster/", doctor_roster, name="doctor_roster"),
     path("patient/dashboard/", patient_dashboard, name="patient_dashboard"),
     path("logout/", logout_view, name="logout"),
     # Appointments
@@ -30,11 +40,20 @@ urlpatterns = [
     path(
         "receptionist/dashboard/", receptionist_dashboard, name="receptionist_dashboard"
     ),
+    path("receptionist/events/", appointment_events, name="appointment_events"),
     path(
         "appointment/<int:appointment_id>/approve/",
         approve_appointment,
         name="approve_appointment",
     ),
+    path("receptionist/triage/", bulk_triage, name="bulk_triage"),
+    path("appointment/slots/", available_slots, name="available_slots"),
+    path("metrics/queries/", query_stats, name="query_stats"),
+    path("search/", search_records, name="search"),
+    # Reports
+    path("reports/", reports, name="reports"),
+    path("reports/<slug:report>.csv", report_csv, name="report_csv"),
+    path("export/<slug:dataset>.<slug:fmt>", export_records, name="export"),
     # Doctor
     path("doctors/", doctor_list, name="doctor_list"),
     path("doctors/new/", doctor_create, name="doctor_create"),
@@ -1,27 +1,73 @@
+import asyncio
+import csv
+import json
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, redirect, get_object_or_404
-from django.contrib.auth import authenticate, login, logout
+from django.http import (
+    Http404,
+    HttpResponse,
+    HttpResponseForbidden,
+    JsonResponse,
+    StreamingHttpResponse,
+)
+from django.contrib.auth import login, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from .models import Doctor, Patient, Appointment
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from . import (
+    assignment,
+    counters,
+    events,
+    exports,
+    fragments,
+    instrumentation,
+    reporting,
+    roles,
+    roster,
+    scheduling,
+    search,
+    triage,
+)
+from .models import Doctor, Patient, Appointment, ReportWatermark
+from .pagination import akeyset_page, keyset_page, streaming_list_response
+from .routers import replica_reads
 from .forms import (
     DoctorForm,
-    PatientForm,
+    PatientCreateForm,
     DoctorLoginForm,
     PatientLoginForm,
     AppointmentRequestForm,
     AppointmentApprovalForm,
+    BulkTriageForm,
+    DateWindowForm,
+    ReportRangeForm,
+    RosterDayForm,
 )
 
 
-def About(request):
-    return render(request, "about.html")
+async def _render(request, template_name, context=None):
+    """
+    render() for async views: load the user first, as {{ user }} in the
+    templates would otherwise query the database on the event loop.
+    """
+    request.user = await request.auser()
+    return render(request, template_name, context)
+
 
+async def About(request):
+    return await _render(request, "about.html")
 
-def Home(request):
-    doctors_count = Doctor.objects.count()
-    patients_count = Patient.objects.count()
+
+async def Home(request):
+    totals = await counters.aget_counts()
+    doctors_count = totals[counters.DOCTORS]
+    patients_count = totals[counters.PATIENTS]
     context = {"doctors_count": doctors_count, "patients_count": patients_count}
-    return render(request, "home.html", context)
+    return await _render(request, "home.html", context)
 
 
 # Authentication Views
@@ -29,17 +75,17 @@ def doctor_login(request):
     if request.method == "POST":
         form = DoctorLoginForm(data=request.POST)
         if form.is_valid():
-            username = form.cleaned_data["username"]
-            password = form.cleaned_data["password"]
-            user = authenticate(request, username=username, password=password)
+            # The form has already authenticated the credentials.
+            user = form.get_user()
             if user is not None:
                 # Check if user is associated with a doctor
-                try:
-                    doctor = Doctor.objects.get(user=user)
+                doctor = roles.Role(user).doctor
+                if doctor is not None:
                     login(request, user)
+                    roles.remember(request, roles.DOCTOR)
                     messages.success(request, f"Welcome back, Dr. {doctor.name}!")
                     return redirect("doctor_dashboard")
-                except Doctor.DoesNotExist:
+                else:
                     messages.error(request, "You are not registered as a doctor.")
             else:
                 messages.error(request, "Invalid username or password.")
@@ -53,17 +99,17 @@ def patient_login(request):
     if request.method == "POST":
         form = PatientLoginForm(data=request.POST)
         if form.is_valid():
-            username = form.cleaned_data["username"]
-            password = form.cleaned_data["password"]
-            user = authenticate(request, username=username, password=password)
+            # The form has already authenticated the credentials.
+            user = form.get_user()
             if user is not None:
                 # Check if user is associated with a patient
-                try:
-                    patient = Patient.objects.get(user=user)
+                patient = roles.Role(user).patient
+                if patient is not None:
                     login(request, user)
+                    roles.remember(request, roles.PATIENT)
                     messages.success(request, f"Welcome back, {patient.name}!")
                     return redirect("patient_dashboard")
-                except Patient.DoesNotExist:
+                else:
                     messages.error(request, "You are not registered as a patient.")
             else:
                 messages.error(request, "Invalid username or password.")
@@ -80,22 +126,23 @@ def unified_login(request):
     if request.method == "POST":
         form = UnifiedLoginForm(data=request.POST)
         if form.is_valid():
-            username = form.cleaned_data["username"]
-            password = form.cleaned_data["password"]
             role = form.cleaned_data.get("role")
-            user = authenticate(request, username=username, password=password)
+            # The form has already authenticated the credentials.
+            user = form.get_user()
             if user is not None:
-                # Role-based checks
+                # Role-based checks; the profiles came with the user.
                 if role == "doctor":
-                    if Doctor.objects.filter(user=user).exists():
+                    if roles.Role(user).has(roles.DOCTOR):
                         login(request, user)
+                        roles.remember(request, roles.DOCTOR)
                         messages.success(request, f"Welcome back, Dr. {user.username}!")
                         return redirect("doctor_dashboard")
                     else:
                         messages.error(request, "You are not registered as a doctor.")
                 elif role == "patient":
-                    if Patient.objects.filter(user=user).exists():
+                    if roles.Role(user).has(roles.PATIENT):
                         login(request, user)
+                        roles.remember(request, roles.PATIENT)
                         messages.success(request, f"Welcome back, {user.username}!")
                         return redirect("patient_dashboard")
                     else:
@@ -104,6 +151,7 @@ def unified_login(request):
                     # Receptionist requires staff flag for now
                     if user.is_staff:
                         login(request, user)
+                        roles.remember(request, roles.RECEPTIONIST)
                         messages.success(request, "Welcome, Receptionist!")
                         return redirect("receptionist_dashboard")
                     else:
@@ -120,41 +168,26 @@ def unified_login(request):
     return render(request, "login.html", {"form": form})
 
 
+@replica_reads
 @login_required
-def doctor_dashboard(request):
-    try:
-        doctor = Doctor.objects.get(user=request.user)
-        patients = Patient.objects.filter(doctor=doctor)
-        context = {
-            "doctor": doctor,
-            "patients": patients,
-            "patient_count": patients.count(),
-        }
-        return render(request, "doctor_dashboard.html", context)
-    except Doctor.DoesNotExist:
-        messages.error(request, "Doctor profile not found.")
-        return redirect("doctor_login")
-
+async def patient_dashboard(request):
+    patient = (await request.arole()).patient
+    if patient is None:
+        messages.error(request, "Patient profile not found.")
+        return redirect("login")
 
-@login_required
-def patient_dashboard(request):
-    try:
-        patient = Patient.objects.get(user=request.user)
-        # Get patient's appointments
-        appointments = (
-            Appointment.objects.filter(patient=patient)
-            .select_related("doctor")
-            .order_by("-created_at")
-        )
+    # Get patient's appointments, archived ones included; only evaluated if
+    # the cached fragment has been invalidated.
+    appointments = Appointment.objects.full_history_for_patient(patient)
 
-        context = {
-            "patient": patient,
-            "appointments": appointments,
-        }
-        return render(request, "patient_dashboard.html", context)
-    except Patient.DoesNotExist:
-        messages.error(request, "Patient profile not found.")
-        return redirect("patient_login")
+    context = {
+        "patient": patient,
+        "appointments": appointments,
+        "fragment_version": await fragments.aversion("patient", patient.pk),
+        "fragment_timeout": fragments.timeout(),
+    }
+    # Rendering may evaluate the queryset, so it runs off the event loop.
+    return await sync_to_async(render)(request, "patient_dashboard.html", context)
 
 
 def logout_view(request):
@@ -164,9 +197,18 @@ def logout_view(request):
 
 
 # Existing views
-def doctor_list(request):
-    doctors = Doctor.objects.all().order_by("name")
-    return render(request, "doctor_list.html", {"doctors": doctors})
+@replica_reads
+async def doctor_list(request):
+    doctors = Doctor.objects.all()
+    if request.GET.get("stream"):
+        request.user = await request.auser()
+        return streaming_list_response(
+            request, doctors, "doctor_list.html", "doctor_row.html", "doctor"
+        )
+    cursor = request.GET.get("cursor")
+    doctors, next_cursor = await akeyset_page(doctors, cursor)
+    context = {"doctors": doctors, "cursor": cursor, "next_cursor": next_cursor}
+    return await _render(request, "doctor_list.html", context)
 
 
 def doctor_create(request):
@@ -180,31 +222,43 @@ def doctor_create(request):
     return render(request, "doctor_form.html", {"form": form})
 
 
-def patient_list(request):
-    patients = Patient.objects.select_related("doctor").all().order_by("name")
-    return render(request, "patient_list.html", {"patients": patients})
+@replica_reads
+async def patient_list(request):
+    patients = Patient.objects.select_related("doctor").all()
+    if request.GET.get("stream"):
+        request.user = await request.auser()
+        return streaming_list_response(
+            request, patients, "patient_list.html", "patient_row.html", "patient"
+        )
+    cursor = request.GET.get("cursor")
+    patients, next_cursor = await akeyset_page(patients, cursor)
+    context = {"patients": patients, "cursor": cursor, "next_cursor": next_cursor}
+    return await _render(request, "patient_list.html", context)
 
 
 def patient_create(request):
     if request.method == "POST":
-        form = PatientForm(request.POST)
+        form = PatientCreateForm(request.POST)
         if form.is_valid():
             form.save()
             return redirect("patient_list")
     else:
-        form = PatientForm()
-    return render(request, "patient_form.html", {"form": form})
+        form = PatientCreateForm()
+    return render(
+        request,
+        "patient_form.html",
+        {"form": form, "suggestions": assignment.suggestions()},
+    )
 
 
 # Appointment Views
 @login_required
 def appointment_request(request):
     """Patient requests a new appointment"""
-    try:
-        patient = Patient.objects.get(user=request.user)
-    except Patient.DoesNotExist:
+    patient = request.role.patient
+    if patient is None:
         messages.error(request, "Patient profile not found.")
-        return redirect("patient_login")
+        return redirect("login")
 
     if request.method == "POST":
         form = AppointmentRequestForm(request.POST)
@@ -223,26 +277,213 @@ def appointment_request(request):
     return render(request, "appointment_request.html", {"form": form})
 
 
+def available_slots(request):
+    """Next free appointment slots across every doctor of a specialty"""
+    specialty = request.GET.get("specialty", "")
+    try:
+        count = max(1, min(int(request.GET.get("count", 10)), 100))
+    except ValueError:
+        count = 10
+    slots = scheduling.next_free_slots(specialty, count)
+    return JsonResponse(
+        {
+            "specialty": specialty,
+            "slots": [
+                {
+                    "start": start.isoformat(),
+                    "doctor_id": doctor.pk,
+                    "doctor": doctor.name,
+                }
+                for start, doctor in slots
+            ],
+        }
+    )
+
+
 @login_required
-def receptionist_dashboard(request):
-    """Receptionist manages appointment requests"""
-    # For now, using admin check - in production, you'd have a receptionist role
+def query_stats(request):
+    """Rolling per-view query histogram from the instrumentation middleware"""
+    if not request.user.is_staff:
+        messages.error(request, "Access denied.")
+        return redirect("home")
+    return JsonResponse(instrumentation.stats.snapshot())
+
+
+@replica_reads
+@login_required
+def search_records(request):
+    """Ranked full-text search over doctors, patients and appointment notes"""
     if not request.user.is_staff:
         messages.error(request, "Access denied. Receptionist privileges required.")
         return redirect("home")
 
-    pending_appointments = Appointment.objects.filter(status="pending").select_related(
-        "patient", "doctor"
+    query = request.GET.get("q", "").strip()
+    limit = getattr(settings, "HOSPITAL_SEARCH_RESULTS", 20)
+    context = {"query": query}
+    if query:
+        context.update(
+            doctors=search.ranked(Doctor.objects.all(), query, limit),
+            patients=search.ranked(
+                Patient.objects.select_related("doctor"), query, limit
+            ),
+            appointments=search.ranked(
+                Appointment.objects.select_related("patient", "doctor"), query, limit
+            ),
+        )
+    return render(request, "search.html", context)
+
+
+@replica_reads
+@login_required
+def reports(request):
+    """Appointment analytics for a date range, read from the daily rollups"""
+    if not request.user.is_staff:
+        messages.error(request, "Access denied. Receptionist privileges required.")
+        return redirect("home")
+
+    form = ReportRangeForm(request.GET or None)
+    first, last = form.days()
+    context = {
+        "form": form,
+        "first": first,
+        "last": last,
+        "query": request.GET.urlencode(),
+        "watermark": ReportWatermark.objects.filter(name=reporting.WATERMARK).first(),
+        "funnel": reporting.status_funnel(first, last),
+        "specialties": reporting.specialty_load(first, last),
+        "doctors": reporting.doctor_load(first, last),
+        "days": reporting.daily_volume(first, last),
+    }
+    return render(request, "reports.html", context)
+
+
+@replica_reads
+@login_required
+def report_csv(request, report):
+    """One report from the reports page as CSV"""
+    if not request.user.is_staff:
+        return HttpResponseForbidden()
+    if report not in reporting.REPORTS:
+        raise Http404("No such report.")
+
+    build, columns = reporting.REPORTS[report]
+    first, last = ReportRangeForm(request.GET or None).days()
+    response = HttpResponse(content_type="text/csv")
+    response["Content-Disposition"] = (
+        f'attachment; filename="{report}-{first:%Y%m%d}-{last:%Y%m%d}.csv"'
     )
-    approved_appointments = Appointment.objects.filter(
-        status="approved"
-    ).select_related("patient", "doctor")
+    writer = csv.writer(response)
+    writer.writerow([header for _, header in columns])
+    for row in build(first, last):
+        writer.writerow([row[key] for key, _ in columns])
+    return response
+
 
+@replica_reads
+@login_required
+def export_records(request, dataset, fmt):
+    """Every patient or appointment as a streamed CSV or XLSX download"""
+    if not request.user.is_staff:
+        return HttpResponseForbidden()
+    if dataset not in exports.EXPORTS or fmt not in exports.FORMATS:
+        raise Http404("No such export.")
+
+    queryset = exports.EXPORTS[dataset].model.objects.all()
+    filename = f"{dataset}-{timezone.localdate():%Y%m%d}"
+    return exports.response(request, queryset, fmt, filename)
+
+
+PENDING_ORDERING = ("-created_at", "id")
+APPROVED_ORDERING = ("requested_date", "id")
+
+
+def _page_url(request, param, cursor):
+    """The current URL with ``param`` set to ``cursor``, or None without one."""
+    if not cursor:
+        return None
+    query = request.GET.copy()
+    query[param] = cursor
+    return f"{request.path}?{query.urlencode()}"
+
+
+@replica_reads
+@login_required
+async def receptionist_dashboard(request):
+    """Receptionist manages appointment requests"""
+    # For now, using admin check - in production, you'd have a receptionist role
+    if not (await request.auser()).is_staff:
+        messages.error(request, "Access denied. Receptionist privileges required.")
+        return redirect("home")
+
+    window_form = DateWindowForm(request.GET or None)
+    start, end = window_form.bounds()
+    (
+        (pending_appointments, next_pending),
+        (approved_appointments, next_approved),
+        totals,
+    ) = await asyncio.gather(
+        akeyset_page(
+            Appointment.objects.pending_queue(),
+            request.GET.get("pending"),
+            ordering=PENDING_ORDERING,
+        ),
+        akeyset_page(
+            Appointment.objects.approved_between(start, end),
+            request.GET.get("approved"),
+            ordering=APPROVED_ORDERING,
+        ),
+        counters.aget_counts(),
+    )
     context = {
         "pending_appointments": pending_appointments,
         "approved_appointments": approved_appointments,
+        "pending_count": totals[counters.appointment_key("pending")],
+        "approved_count": totals[counters.appointment_key("approved")],
+        "window_form": window_form,
+        "window_start": start,
+        "window_end": end - timedelta(days=1),
+        "next_pending_url": _page_url(request, "pending", next_pending),
+        "next_approved_url": _page_url(request, "approved", next_approved),
     }
-    return render(request, "receptionist_dashboard.html", context)
+    return await _render(request, "receptionist_dashboard.html", context)
+
+
+async def appointment_events(request):
+    """Server-sent stream of appointment changes for receptionist terminals"""
+    user = await request.auser()
+    if not user.is_staff:
+        return HttpResponseForbidden("Receptionist privileges required.")
+    try:
+        last_event_id = int(request.headers.get("Last-Event-ID", ""))
+    except ValueError:
+        last_event_id = None
+    heartbeat = getattr(settings, "HOSPITAL_SSE_HEARTBEAT", 15)
+
+    def frame(event):
+        return (
+            f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event)}\n\n"
+        )
+
+    async def stream():
+        subscription, missed = events.get_broker().subscribe(last_event_id)
+        try:
+            yield "retry: 3000\n\n"
+            for event in missed:
+                yield frame(event)
+            while not subscription.overflowed:
+                try:
+                    event = await subscription.get(heartbeat)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield frame(event)
+        finally:
+            subscription.close()
+
+    response = StreamingHttpResponse(stream(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
 
 
 @login_required
@@ -256,8 +497,18 @@ def approve_appointment(request, appointment_id):
 
     if request.method == "POST":
         form = AppointmentApprovalForm(request.POST, instance=appointment)
-        if form.is_valid():
-            form.save()
+        with transaction.atomic():
+            # Serialize approvals per doctor so two receptionists cannot both
+            # pass the double-booking check for the same slot. The row lock
+            # does this on PostgreSQL; SQLite ignores select_for_update(),
+            # and there the IMMEDIATE transaction mode (see
+            # hospitalmngmt/database.py) takes the database write lock when
+            # the transaction starts, serializing every approval.
+            Doctor.objects.select_for_update().filter(pk=appointment.doctor_id).first()
+            approved = form.is_valid()
+            if approved:
+                form.save()
+        if approved:
             status = form.cleaned_data["status"]
             if status == "approved":
                 messages.success(
@@ -279,25 +530,102 @@ def approve_appointment(request, appointment_id):
 
 
 @login_required
-def doctor_dashboard(request):
-    try:
-        doctor = Doctor.objects.get(user=request.user)
-        patients = Patient.objects.filter(doctor=doctor)
-        # Get approved appointments for this doctor
-        approved_appointments = (
-            Appointment.objects.filter(doctor=doctor, status="approved")
-            .select_related("patient")
-            .order_by("requested_date")
-        )
+def bulk_triage(request):
+    """Receptionist approves or rejects many pending appointments at once"""
+    if not request.user.is_staff:
+        messages.error(request, "Access denied. Receptionist privileges required.")
+        return redirect("home")
 
-        context = {
-            "doctor": doctor,
-            "patients": patients,
-            "patient_count": patients.count(),
-            "approved_appointments": approved_appointments,
-            "appointment_count": approved_appointments.count(),
-        }
-        return render(request, "doctor_dashboard.html", context)
-    except Doctor.DoesNotExist:
+    if request.method == "POST":
+        form = BulkTriageForm(request.POST)
+        if form.is_valid():
+            result = triage.apply(
+                form.cleaned_data["appointments"],
+                form.cleaned_data["status"],
+                form.cleaned_data["receptionist_notes"],
+            )
+            if result.conflicts:
+                messages.warning(request, result.summary())
+            else:
+                messages.success(request, result.summary())
+            return redirect("bulk_triage")
+    else:
+        form = BulkTriageForm()
+
+    pending_appointments, next_pending = keyset_page(
+        Appointment.objects.pending_queue(),
+        request.GET.get("pending"),
+        per_page=triage.batch_size(),
+        ordering=PENDING_ORDERING,
+    )
+    context = {
+        "form": form,
+        "pending_appointments": pending_appointments,
+        "next_pending_url": _page_url(request, "pending", next_pending),
+    }
+    return render(request, "triage.html", context)
+
+
+@replica_reads
+@login_required
+async def doctor_dashboard(request):
+    doctor = (await request.arole()).doctor
+    if doctor is None:
         messages.error(request, "Doctor profile not found.")
-        return redirect("doctor_login")
+        return redirect("login")
+
+    patients = Patient.objects.filter(doctor=doctor)
+    today = timezone.localdate()
+
+    # The querysets stay lazy: the template only evaluates them when its
+    # cached fragments are missing or out of date.
+    context = {
+        "doctor": doctor,
+        "patients": patients,
+        "today": today,
+        "roster": roster.week(doctor, today),
+        "fragment_version": await fragments.aversion("doctor", doctor.pk),
+        "fragment_timeout": fragments.timeout(),
+    }
+    return await sync_to_async(render)(request, "doctor_dashboard.html", context)
+
+
+@replica_reads
+@login_required
+async def doctor_roster(request):
+    """A doctor's appointments for one day, printable or as JSON"""
+    doctor = (await request.arole()).doctor
+    if doctor is None:
+        messages.error(request, "Doctor profile not found.")
+        return redirect("login")
+
+    form = RosterDayForm(request.GET or None)
+    day = form.day()
+    entries = [entry async for entry in roster.days(doctor, day, day)]
+    if request.GET.get("format") == "json":
+        return JsonResponse(
+            {
+                "doctor": doctor.name,
+                "date": day.isoformat(),
+                "appointments": [
+                    {
+                        "id": entry.appointment_id,
+                        "time": timezone.localtime(entry.requested_date).isoformat(),
+                        "patient": entry.patient_name,
+                        "phone": entry.patient_phone,
+                        "summary": entry.summary,
+                        "notes": entry.receptionist_notes,
+                    }
+                    for entry in entries
+                ],
+            }
+        )
+    context = {
+        "doctor": doctor,
+        "form": form,
+        "day": day,
+        "previous_day": day - timedelta(days=1),
+        "next_day": day + timedelta(days=1),
+        "entries": entries,
+    }
+    return await _render(request, "doctor_roster.html", context)
@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'hospitalmngmt.settings')
 
 application = get_asgi_application()
+
+# Compile every template now rather than on the first request that uses it.
+from hospital.template_cache import warm_on_startup  # noqa: E402
+
+warm_on_startup()
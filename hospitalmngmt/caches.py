@@ -0,0 +1,52 @@
+"""
+Cache settings read from the environment.
+
+HOSPITAL_CACHE_BACKEND      the "default" cache's backend (e.g.
+                            django.core.cache.backends.redis.RedisCache)
+HOSPITAL_CACHE_LOCATION     and its location
+
+The "default" cache holds the home page and dashboard counters, the doctor
+loads and rendered dashboard fragments. Without HOSPITAL_CACHE_BACKEND it is
+local memory, private to each process: a management command that rebuilds
+or invalidates the counters then only changes its own copy, and each web
+worker corrects its counters only when they expire
+(HOSPITAL_COUNTER_TIMEOUT in settings).
+
+The "versions" cache holds the dashboard fragment versions, which every web
+worker and management command must agree on: a command that bumps a version
+has to reach the worker serving that dashboard. It is the "default" cache
+when HOSPITAL_CACHE_BACKEND is set, and otherwise the
+hospital_fragment_versions table in the default database (created by the
+hospital migrations).
+"""
+
+import os
+
+
+def default_cache():
+    """The "default" entry for CACHES."""
+    backend = os.environ.get('HOSPITAL_CACHE_BACKEND', '')
+    if backend:
+        return {
+            'BACKEND': backend,
+            'LOCATION': os.environ.get('HOSPITAL_CACHE_LOCATION', ''),
+        }
+    return {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'hospital',
+    }
+
+
+def versions_cache():
+    """The "versions" entry for CACHES."""
+    if os.environ.get('HOSPITAL_CACHE_BACKEND'):
+        config = default_cache()
+    else:
+        config = {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'hospital_fragment_versions',
+            # One row per doctor and patient; culling would only cost renders.
+            'OPTIONS': {'MAX_ENTRIES': 1000000},
+        }
+    # Versions are bumped with incr(), which keeps the entry's timeout.
+    return dict(config, TIMEOUT=None)
@@ -0,0 +1,80 @@
+"""
+Database settings read from the environment.
+
+HOSPITAL_DB_ENGINE         "sqlite" (default) or "postgresql"
+HOSPITAL_DB_NAME           database name, or the file path for SQLite
+HOSPITAL_DB_USER, HOSPITAL_DB_PASSWORD, HOSPITAL_DB_HOST, HOSPITAL_DB_PORT
+HOSPITAL_DB_CONN_MAX_AGE   seconds to keep a connection open (default 60)
+HOSPITAL_DB_POOL           "min:max" to use psycopg's connection pool instead
+                           of persistent connections (PostgreSQL only)
+
+Setting HOSPITAL_DB_REPLICA_NAME or HOSPITAL_DB_REPLICA_HOST adds a "replica"
+alias. Any HOSPITAL_DB_REPLICA_* variable left unset is taken from the
+primary's, so two SQLite files need only HOSPITAL_DB_REPLICA_NAME.
+"""
+
+import os
+
+ENGINES = {
+    'sqlite': 'django.db.backends.sqlite3',
+    'postgresql': 'django.db.backends.postgresql',
+}
+
+
+def _env(prefix, name, default=''):
+    return os.environ.get(f'{prefix}{name}', default)
+
+
+def database(prefix='HOSPITAL_DB_', default_name='', fallback_prefix=None):
+    def env(name, default=''):
+        if fallback_prefix:
+            default = _env(fallback_prefix, name, default)
+        return _env(prefix, name, default)
+
+    engine = env('ENGINE', 'sqlite')
+    if engine not in ENGINES:
+        raise ValueError(
+            f'{prefix}ENGINE must be one of {", ".join(ENGINES)}, not {engine!r}'
+        )
+    config = {
+        'ENGINE': ENGINES[engine],
+        'NAME': env('NAME', str(default_name)),
+        'CONN_MAX_AGE': int(env('CONN_MAX_AGE', '60')),
+        # Check a persistent connection still works before reusing it.
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {},
+    }
+    if engine == 'sqlite':
+        # Take the write lock when a transaction starts, so a transaction
+        # that reads and then writes waits for busy_timeout instead of
+        # failing to upgrade its lock.
+        config['OPTIONS']['transaction_mode'] = 'IMMEDIATE'
+    elif engine == 'postgresql':
+        config.update(
+            USER=env('USER'),
+            PASSWORD=env('PASSWORD'),
+            HOST=env('HOST'),
+            PORT=env('PORT'),
+        )
+        pool = env('POOL')
+        if pool:
+            min_size, _, max_size = pool.partition(':')
+            config['OPTIONS']['pool'] = {
+                'min_size': int(min_size),
+                'max_size': int(max_size or min_size),
+            }
+            # The pool keeps connections open; Django must not as well.
+            config['CONN_MAX_AGE'] = 0
+    return config
+
+
+def databases(default_name):
+    """DATABASES with "default" and, if configured, "replica"."""
+    configured = {'default': database(default_name=default_name)}
+    prefix = 'HOSPITAL_DB_REPLICA_'
+    if _env(prefix, 'NAME') or _env(prefix, 'HOST'):
+        replica = database(prefix, default_name, fallback_prefix='HOSPITAL_DB_')
+        # Tests read through the primary's test database.
+        replica['TEST'] = {'MIRROR': 'default'}
+        configured['replica'] = replica
+    return configured
@@ -0,0 +1,80 @@
+"""
+Session storage read from the environment.
+
+HOSPITAL_SESSION_PROFILE     where sessions live:
+    "cached_db"              the database, read through the "sessions" cache;
+                             a page view reads the database only on a miss
+                             (the default when the cache is shared)
+    "db"                     the database on every request (the default
+                             otherwise)
+    "cache"                  the "sessions" cache only; no database at all,
+                             but sessions vanish if the cache loses them
+    "signed_cookies"         the client, signed with SECRET_KEY
+HOSPITAL_SESSION_CACHE_DIR   keep the "sessions" cache in files under this
+                             directory, so it is shared by every worker on
+                             the host and survives restarts
+HOSPITAL_SESSION_CACHE_BACKEND, HOSPITAL_SESSION_CACHE_LOCATION
+                             or use this cache backend (e.g.
+                             django.core.cache.backends.redis.RedisCache) at
+                             this location, shared by every host
+
+Without either, the "sessions" cache is local memory, private to each
+process. "cached_db" and "cache" then only suit a single process: a session
+flushed at logout or rewritten by one worker is still served, stale, from
+another worker's copy until it expires, so a logged-out cookie keeps working
+there. The default is therefore "db" unless a shared cache is configured.
+
+Flash messages are kept in a signed cookie (MESSAGE_STORAGE in settings),
+so they never touch the session either.
+"""
+
+import os
+
+PROFILES = {
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'db': 'django.contrib.sessions.backends.db',
+    'cache': 'django.contrib.sessions.backends.cache',
+    'signed_cookies': 'django.contrib.sessions.backends.signed_cookies',
+}
+
+
+def shared_cache():
+    """Whether the "sessions" cache is shared between worker processes."""
+    return bool(
+        os.environ.get('HOSPITAL_SESSION_CACHE_DIR')
+        or os.environ.get('HOSPITAL_SESSION_CACHE_BACKEND')
+    )
+
+
+def session_engine():
+    default = 'cached_db' if shared_cache() else 'db'
+    profile = os.environ.get('HOSPITAL_SESSION_PROFILE', default)
+    if profile not in PROFILES:
+        raise ValueError(
+            'HOSPITAL_SESSION_PROFILE must be one of '
+            f'{", ".join(PROFILES)}, not {profile!r}'
+        )
+    return PROFILES[profile]
+
+
+def session_cache():
+    """The "sessions" entry for CACHES."""
+    backend = os.environ.get('HOSPITAL_SESSION_CACHE_BACKEND', '')
+    if backend:
+        return {
+            'BACKEND': backend,
+            'LOCATION': os.environ.get('HOSPITAL_SESSION_CACHE_LOCATION', ''),
+        }
+    directory = os.environ.get('HOSPITAL_SESSION_CACHE_DIR', '')
+    if directory:
+        return {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': directory,
+            # Sessions set their own expiry; never cull live ones early.
+            'OPTIONS': {'MAX_ENTRIES': 1000000},
+        }
+    return {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'hospital-sessions',
+        'OPTIONS': {'MAX_ENTRIES': 100000},
+    }
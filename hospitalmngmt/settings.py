@@ -12,6 +12,10 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 
+from hospitalmngmt.caches import default_cache, versions_cache
+from hospitalmngmt.database import databases
+from hospitalmngmt.sessions import session_cache, session_engine
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -42,22 +46,40 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'hospital.instrumentation.QueryInstrumentationMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'hospital.roles.RoleMiddleware',
+    'hospital.routers.ReplicaRoutingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
 ROOT_URLCONF = 'hospitalmngmt.urls'
 
+# Loads each user's doctor/patient profile in the same query as the user.
+AUTHENTICATION_BACKENDS = ['hospital.roles.ProfileBackend']
+
+# Templates are compiled once per process by the cached loader and kept for
+# its lifetime (runserver's autoreloader still picks up edits). wsgi.py and
+# asgi.py compile them all at startup; warm_templates checks they compile.
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
-        'DIRS': [BASE_DIR,'templates'],
-        'APP_DIRS': True,
+        'DIRS': [BASE_DIR / 'templates'],
         'OPTIONS': {
+            'loaders': [
+                (
+                    'django.template.loaders.cached.Loader',
+                    [
+                        'django.template.loaders.filesystem.Loader',
+                        'django.template.loaders.app_directories.Loader',
+                    ],
+                ),
+            ],
             'context_processors': [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
@@ -73,13 +95,54 @@ WSGI_APPLICATION = 'hospitalmngmt.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+# Configured from HOSPITAL_DB_* environment variables (see
+# hospitalmngmt/database.py); SQLite at BASE_DIR / 'db.sqlite3' by default.
+
+DATABASES = databases(BASE_DIR / 'db.sqlite3')
+
+# Views marked @replica_reads read from the "replica" alias when there is one;
+# a client that has just written reads from the primary for this many
+# seconds (see hospital/routers.py).
+
+DATABASE_ROUTERS = ['hospital.routers.PrimaryReplicaRouter']
+
+HOSPITAL_REPLICA_DATABASE = 'replica'
+
+HOSPITAL_REPLICA_STICKY_SECONDS = 5
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Home page and dashboard counters live in "default" (see
+# hospital/counters.py). It is configured from HOSPITAL_CACHE_* environment
+# variables (see hospitalmngmt/caches.py) and is local memory, private to
+# each process, unless HOSPITAL_CACHE_BACKEND names a shared backend such as
+# Redis. Counters are recounted after HOSPITAL_COUNTER_TIMEOUT seconds, so a
+# worker's totals drift from changes it did not see for at most that long.
+# Dashboard fragment versions live in "versions", shared by every process.
+
+CACHES = {
+    'default': default_cache(),
+    'sessions': session_cache(),
+    'versions': versions_cache(),
 }
 
+HOSPITAL_COUNTER_TIMEOUT = 60
+
+
+# Sessions and messages
+# https://docs.djangoproject.com/en/5.2/topics/http/sessions/
+# Configured from HOSPITAL_SESSION_* environment variables (see
+# hospitalmngmt/sessions.py): cached_db when the "sessions" cache is shared
+# between workers, db otherwise, with flash messages in a cookie.
+# prune_sessions deletes expired database sessions in batches.
+
+SESSION_ENGINE = session_engine()
+
+SESSION_CACHE_ALIAS = 'sessions'
+
+MESSAGE_STORAGE = 'django.contrib.messages.storage.cookie.CookieStorage'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -121,3 +184,104 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# Hospital app
+# Page size for the keyset-paginated doctor/patient lists and the number of
+# rows fetched (and rendered) per chunk in their ?stream=1 mode.
+
+HOSPITAL_LIST_PAGE_SIZE = 50
+
+HOSPITAL_LIST_STREAM_CHUNK_SIZE = 2000
+
+# Appointment scheduling (hospital/scheduling.py): every doctor works these
+# hours, in TIME_ZONE, on these weekdays (Monday is 0), in fixed-length slots.
+
+HOSPITAL_SLOT_MINUTES = 30
+
+HOSPITAL_WORKING_HOURS = (9, 17)
+
+HOSPITAL_WORKING_DAYS = (0, 1, 2, 3, 4)
+
+# SQL instrumentation (hospital/instrumentation.py): views running more
+# queries than their budget are logged as warnings on "hospital.queries".
+# HOSPITAL_QUERY_BUDGETS maps view names to per-view overrides.
+
+HOSPITAL_QUERY_BUDGET = 20
+
+HOSPITAL_QUERY_BUDGETS = {}
+
+HOSPITAL_QUERY_STATS_WINDOW = 500
+
+# Receptionist live updates (hospital/events.py): the pub/sub class behind the
+# server-sent event stream, and seconds between keep-alive comments on it.
+# LocalBroker only reaches clients connected to the same process.
+
+HOSPITAL_EVENT_BROKER = 'hospital.events.LocalBroker'
+
+HOSPITAL_SSE_HEARTBEAT = 15
+
+# Dashboard fragment caching (hospital/fragments.py): seconds a rendered
+# doctor/patient dashboard fragment may stay in the cache. Edits invalidate
+# fragments immediately; this only bounds how long unused ones linger.
+
+HOSPITAL_FRAGMENT_CACHE_TIMEOUT = 3600
+
+# Full-text search (hospital/search.py): results shown per section on the
+# search page.
+
+HOSPITAL_SEARCH_RESULTS = 20
+
+# SQLite tuning (hospital/pragmas.py): PRAGMAs run, in order, on every new
+# SQLite connection. Set to {} to keep SQLite's defaults.
+
+HOSPITAL_SQLITE_PRAGMAS = {
+    'busy_timeout': 5000,
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'mmap_size': 134217728,
+    'cache_size': -20000,
+    'temp_store': 'memory',
+}
+
+# Reporting (hospital/reporting.py): refresh_rollups stops this many seconds
+# short of now, so appointments committed late are caught by the next run.
+
+HOSPITAL_REPORTING_LAG_SECONDS = 60
+
+# Exports (hospital/exports.py): rows fetched and written per chunk of a
+# streamed CSV or XLSX download.
+
+HOSPITAL_EXPORT_CHUNK_SIZE = 2000
+
+# Bulk triage (hospital/triage.py): pending appointments listed, and the most
+# that can be approved or rejected, per submission.
+
+HOSPITAL_TRIAGE_BATCH_SIZE = 200
+
+# Notifications (hospital/notifications.py): send_notifications delivers the
+# outbox through this transport, retrying failures with exponential backoff
+# from the first to the longest delay (in seconds) up to MAX_ATTEMPTS times.
+
+HOSPITAL_NOTIFICATION_TRANSPORT = 'hospital.notifications.EmailTransport'
+HOSPITAL_NOTIFICATION_MAX_ATTEMPTS = 8
+HOSPITAL_NOTIFICATION_RETRY_SECONDS = (30, 3600)
+HOSPITAL_NOTIFICATION_LEASE_SECONDS = 300
+
+# Archival (hospital/archive.py): archive_appointments moves completed and
+# rejected appointments unchanged for this many days into the archive table,
+# this many rows per transaction.
+
+HOSPITAL_ARCHIVE_AFTER_DAYS = 180
+HOSPITAL_ARCHIVE_BATCH_SIZE = 1000
+
+# Assignment (hospital/assignment.py): doctor loads (patients plus upcoming
+# approved appointments) are cached for this many seconds, so appointments
+# that have taken place drop out when the table is next rebuilt.
+
+HOSPITAL_ASSIGNMENT_LOAD_SECONDS = 300
+
+# Doctor rosters (hospital/roster.py): days of approved appointments, from
+# today, shown on the doctor dashboard.
+
+HOSPITAL_ROSTER_WEEK_DAYS = 7